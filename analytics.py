@@ -0,0 +1,391 @@
+# analytics.py
+"""Agregaty raportowe na kolumnach: telemetria (min/max/średnia/percentyle,
+zużycie z liczników) i historia ruchów magazynowych.
+
+Wiersze z SQLite są zamieniane raz na kolumny (tablice NumPy, a bez NumPy -
+array('d')) i liczone hurtowo: granice grup to wyszukiwanie binarne w
+posortowanej kolumnie czasu, a min/max/sumy grup to redukcje na wycinkach
+zamiast pętli po słownikach wierszy. Grupy to godziny, dni, tygodnie i
+miesiące czasu lokalnego. Backend można wymusić zmienną
+DASHBOARD_ANALYTICS=array (np. do porównań).
+
+    python analytics.py bench [liczba_próbek]
+"""
+import os
+import sys
+import math
+import time
+from array import array
+from bisect import bisect_left
+from itertools import chain
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Sequence, Tuple, Any
+import logging
+
+try:
+    import numpy as np
+except ImportError:  # NumPy jest opcjonalny - bez niego kolumny array i redukcje na wycinkach
+    np = None
+
+logger = logging.getLogger(__name__)
+
+if os.environ.get('DASHBOARD_ANALYTICS', '').lower() == 'array':
+    np = None
+
+BACKEND = 'numpy' if np is not None else 'array'
+
+GROUPS = ('none', 'hour', 'day', 'week', 'month')
+# Limit liczby grup w jednym raporcie (np. godziny z kilku lat)
+MAX_GROUPS = 20000
+# Źródło agregatów bez percentyli - agregaty godzinowe telemetrii
+ROLLUP_RESOLUTION = 3600
+
+def group_edges(start: int, end: int, group: str) -> List[int]:
+    """Granice grup [e0, e1, ..., end] - pierwsza wyrównana w dół do początku grupy"""
+    if group not in GROUPS:
+        raise ValueError(f"Nieznane grupowanie: {group}")
+    if group == 'none':
+        return [start, end]
+    if group == 'hour':
+        # Strefy o pełnych godzinach - godzina lokalna zaczyna się razem z godziną UTC
+        edges = list(range(start - start % 3600, end, 3600))
+    else:
+        moment = datetime.fromtimestamp(start).replace(hour=0, minute=0, second=0, microsecond=0)
+        if group == 'week':
+            moment -= timedelta(days=moment.weekday())
+        elif group == 'month':
+            moment = moment.replace(day=1)
+        edges = []
+        # Doby liczone na czasie lokalnym - zmiana czasu daje dobę 23 h lub 25 h
+        while (edge := int(moment.timestamp())) < end:
+            edges.append(edge)
+            if len(edges) > MAX_GROUPS:
+                break
+            if group == 'month':
+                moment = moment.replace(year=moment.year + moment.month // 12, month=moment.month % 12 + 1)
+            else:
+                moment += timedelta(days=7 if group == 'week' else 1)
+    if len(edges) > MAX_GROUPS:
+        raise ValueError(f"Zbyt wiele grup ({group}) w zakresie - maksymalnie {MAX_GROUPS}")
+    edges.append(end)
+    return edges
+
+def columns(rows: List[tuple], width: int) -> List[Sequence[float]]:
+    """Kolumny z listy krotek (jedna konwersja zamiast dostępu do pól wiersz po wierszu)"""
+    # Spłaszczenie krotek w C (chain) jest kilka razy szybsze niż zip(*rows)
+    flat = chain.from_iterable(rows)
+    if np is not None:
+        data = np.fromiter(flat, dtype=np.float64, count=len(rows) * width).reshape(len(rows), width)
+        return [data[:, i] for i in range(width)]
+    data = array('d', flat)
+    return [data[i::width] for i in range(width)]
+
+def _positions(ts: Sequence[float], edges: List[int]) -> List[int]:
+    """Indeksy początków grup w posortowanej kolumnie czasu"""
+    if np is not None:
+        return np.searchsorted(ts, edges, side='left')
+    return [bisect_left(ts, edge) for edge in edges]
+
+def _percentile(ordered: Sequence[float], p: float) -> float:
+    """Percentyl z interpolacją liniową (jak domyślnie numpy.percentile)"""
+    k = (len(ordered) - 1) * p / 100
+    f = math.floor(k)
+    c = min(f + 1, len(ordered) - 1)
+    return ordered[f] + (ordered[c] - ordered[f]) * (k - f)
+
+def aggregate_samples(ts: Sequence[float], values: Sequence[float], edges: List[int],
+                      percentiles: Sequence[float] = ()) -> List[Dict[str, Any]]:
+    """count/min/max/mean (i percentyle) próbek w grupach; puste grupy są pomijane"""
+    pos = _positions(ts, edges)
+    if np is not None:
+        starts, ends = pos[:-1], pos[1:]
+        nonempty = ends > starts
+        if not nonempty.any():
+            return []
+        # Niepuste grupy leżą w kolumnie jedna za drugą - redukcja wszystkich jednym wywołaniem
+        index = starts[nonempty]
+        counts = (ends - starts)[nonempty]
+        result = {
+            't': np.asarray(edges[:-1])[nonempty].tolist(),
+            'count': counts.tolist(),
+            'min': np.minimum.reduceat(values, index).tolist(),
+            'max': np.maximum.reduceat(values, index).tolist(),
+            'mean': (np.add.reduceat(values, index) / counts).tolist(),
+        }
+        if percentiles:
+            # Sortowanie osobno w każdej grupie - tańsze niż lexsort całej kolumny po (grupa, wartość)
+            ordered = np.concatenate([np.sort(values[a:a + n]) for a, n in zip(index.tolist(), counts.tolist())])
+            offsets = np.cumsum(counts) - counts
+            for p in percentiles:
+                k = (counts - 1) * p / 100
+                f = np.floor(k).astype(np.int64)
+                c = np.minimum(f + 1, counts - 1)
+                low, high = ordered[offsets + f], ordered[offsets + c]
+                result[f'p{p:g}'] = (low + (high - low) * (k - f)).tolist()
+        return [dict(zip(result, row)) for row in zip(*result.values())]
+
+    groups = []
+    for i in range(len(edges) - 1):
+        a, b = pos[i], pos[i + 1]
+        if a == b:
+            continue
+        chunk = values[a:b]
+        group = {'t': edges[i], 'count': b - a, 'min': min(chunk), 'max': max(chunk),
+                 'mean': math.fsum(chunk) / (b - a)}
+        if percentiles:
+            ordered = sorted(chunk)
+            for p in percentiles:
+                group[f'p{p:g}'] = _percentile(ordered, p)
+        groups.append(group)
+    return groups
+
+def aggregate_rollups(buckets: Sequence[float], counts: Sequence[float], sums: Sequence[float],
+                      mins: Sequence[float], maxs: Sequence[float], edges: List[int]) -> List[Dict[str, Any]]:
+    """Łączenie agregatów (np. godzinowych) w grupy - wynik jak aggregate_samples bez percentyli"""
+    pos = _positions(buckets, edges)
+    if np is not None:
+        starts, ends = pos[:-1], pos[1:]
+        nonempty = ends > starts
+        if not nonempty.any():
+            return []
+        index = starts[nonempty]
+        count = np.add.reduceat(counts, index)
+        result = {
+            't': np.asarray(edges[:-1])[nonempty].tolist(),
+            'count': count.astype(np.int64).tolist(),
+            'min': np.minimum.reduceat(mins, index).tolist(),
+            'max': np.maximum.reduceat(maxs, index).tolist(),
+            'mean': (np.add.reduceat(sums, index) / count).tolist(),
+        }
+        return [dict(zip(result, row)) for row in zip(*result.values())]
+
+    groups = []
+    for i in range(len(edges) - 1):
+        a, b = pos[i], pos[i + 1]
+        if a == b:
+            continue
+        count = math.fsum(counts[a:b])
+        groups.append({'t': edges[i], 'count': int(count), 'min': min(mins[a:b]),
+                       'max': max(maxs[a:b]), 'mean': math.fsum(sums[a:b]) / count})
+    return groups
+
+def _counter_delta(new: float, old: float) -> float:
+    # Spadek wskazania = licznik wyzerowany (restart urządzenia) - zużycie od zera
+    return new - old if new >= old else new
+
+def counter_consumption(ts: Sequence[float], readings: Sequence[float],
+                        edges: List[int]) -> List[Dict[str, Any]]:
+    """Zużycie z narastającego licznika w grupach (przyrost przypisany grupie późniejszego odczytu)"""
+    if len(readings) < 2:
+        return []
+    if np is not None:
+        deltas = np.diff(readings)
+        resets = deltas < 0
+        deltas[resets] = readings[1:][resets]
+        pos = np.searchsorted(ts[1:], edges, side='left')
+        sums = np.add.reduceat(np.append(deltas, 0.0), np.minimum(pos[:-1], len(deltas)))
+        counts = pos[1:] - pos[:-1]
+        nonempty = counts > 0
+        return [{'t': t, 'consumption': value} for t, value in
+                zip(np.asarray(edges[:-1])[nonempty].tolist(), sums[nonempty].tolist())]
+
+    deltas = array('d', map(_counter_delta, readings[1:], readings[:-1]))
+    pos = [bisect_left(ts, edge, 1) - 1 for edge in edges]
+    return [{'t': edges[i], 'consumption': math.fsum(deltas[pos[i]:pos[i + 1]])}
+            for i in range(len(edges) - 1) if pos[i + 1] > pos[i]]
+
+def rollup_readings(buckets: Sequence[float], mins: Sequence[float], maxs: Sequence[float],
+                    resolution: int) -> Tuple[Sequence[float], Sequence[float]]:
+    """Odczyty licznika z agregatów: min na początku i max na końcu każdego przedziału"""
+    if np is not None:
+        ts = np.empty(len(buckets) * 2)
+        ts[0::2], ts[1::2] = buckets, buckets + (resolution - 1)
+        readings = np.empty(len(buckets) * 2)
+        readings[0::2], readings[1::2] = mins, maxs
+        return ts, readings
+    ts, readings = array('d', bytes(16 * len(buckets))), array('d', bytes(16 * len(buckets)))
+    ts[0::2], ts[1::2] = buckets, array('d', (bucket + resolution - 1 for bucket in buckets))
+    readings[0::2], readings[1::2] = mins, maxs
+    return ts, readings
+
+def movement_groups(ts: Sequence[float], deltas: Sequence[float], quantities: Sequence[float],
+                    edges: List[int], closing: bool = True) -> List[Dict[str, Any]]:
+    """Przychody, rozchody, saldo i liczba ruchów w grupach; closing - stan po ostatnim ruchu grupy"""
+    pos = _positions(ts, edges)
+    if np is not None:
+        starts, ends = pos[:-1], pos[1:]
+        nonempty = ends > starts
+        if not nonempty.any():
+            return []
+        index = starts[nonempty]
+        net = np.add.reduceat(deltas, index)
+        inflow = np.add.reduceat(np.where(deltas > 0, deltas, 0), index)
+        result = {
+            't': np.asarray(edges[:-1])[nonempty].tolist(),
+            'movements': (ends - starts)[nonempty].tolist(),
+            'inflow': inflow.astype(np.int64).tolist(),
+            'outflow': (inflow - net).astype(np.int64).tolist(),
+            'net': net.astype(np.int64).tolist(),
+        }
+        if closing:
+            result['closing'] = quantities[ends[nonempty] - 1].astype(np.int64).tolist()
+        return [dict(zip(result, row)) for row in zip(*result.values())]
+
+    groups = []
+    # Kolumny są typu float - int.__lt__(float) zwraca NotImplemented
+    positive = (0.0).__lt__
+    for i in range(len(edges) - 1):
+        a, b = pos[i], pos[i + 1]
+        if a == b:
+            continue
+        chunk = deltas[a:b]
+        net = int(sum(chunk))
+        inflow = int(sum(filter(positive, chunk)))
+        group = {'t': edges[i], 'movements': b - a, 'inflow': inflow, 'outflow': inflow - net, 'net': net}
+        if closing:
+            group['closing'] = int(quantities[b - 1])
+        groups.append(group)
+    return groups
+
+# --- raporty dla API ---
+
+def telemetry_report(store, name: str, start: int, end: int, group: str = 'day',
+                     percentiles: Sequence[float] = (), source: str = 'auto') -> Optional[Dict[str, Any]]:
+    """Statystyki serii w grupach i dla całego zakresu; None gdy seria nie istnieje.
+
+    Bez percentyli liczone z agregatów godzinowych (zakres wyrównany do pełnych
+    godzin, działa też poza retencją próbek), z percentylami - z próbek.
+    """
+    if source == 'auto':
+        source = 'raw' if percentiles else '1h'
+    if source not in ('raw', '1h'):
+        raise ValueError(f"Nieznane źródło: {source}")
+    if percentiles and source != 'raw':
+        raise ValueError("Percentyle wymagają źródła raw")
+    edges = group_edges(start, end, group)
+
+    started = time.perf_counter()
+    if source == 'raw':
+        series, rows = store.get_rows(name, start, end)
+        if series is None:
+            return None
+        ts, values = columns(rows, 2)
+        groups = aggregate_samples(ts, values, edges, percentiles)
+        summary = aggregate_samples(ts, values, [start, end], percentiles)
+    else:
+        series, rows = store.get_rows(name, start, end, ROLLUP_RESOLUTION)
+        if series is None:
+            return None
+        buckets, counts, sums, mins, maxs = columns(rows, 5)
+        groups = aggregate_rollups(buckets, counts, sums, mins, maxs, edges)
+        summary = aggregate_rollups(buckets, counts, sums, mins, maxs, [start - start % ROLLUP_RESOLUTION, end])
+
+    return {
+        'series': series['name'],
+        'unit': series['unit'],
+        'source': source,
+        'group': group,
+        'from': start,
+        'to': end,
+        'summary': summary[0] if summary else None,
+        'groups': groups,
+        'rows': len(rows),
+        'backend': BACKEND,
+        'elapsed_ms': round((time.perf_counter() - started) * 1000, 2),
+    }
+
+def consumption_report(store, name: str, start: int, end: int, group: str = 'day') -> Optional[Dict[str, Any]]:
+    """Zużycie z licznika (np. energii) w grupach, z agregatów godzinowych"""
+    # Odczyty z agregatów mają czas początku godziny - zakres od pełnej godziny
+    start -= start % ROLLUP_RESOLUTION
+    edges = group_edges(start, end, group)
+    started = time.perf_counter()
+    series, rows = store.get_rows(name, start, end, ROLLUP_RESOLUTION)
+    if series is None:
+        return None
+    buckets, _, _, mins, maxs = columns(rows, 5)
+    ts, readings = rollup_readings(buckets, mins, maxs, ROLLUP_RESOLUTION)
+    groups = counter_consumption(ts, readings, edges)
+    return {
+        'series': series['name'],
+        'unit': series['unit'],
+        'group': group,
+        'from': start,
+        'to': end,
+        'total': math.fsum(group['consumption'] for group in groups),
+        'groups': groups,
+        'backend': BACKEND,
+        'elapsed_ms': round((time.perf_counter() - started) * 1000, 2),
+    }
+
+def warehouse_report(db, start: int, end: int, group: str = 'day',
+                     item_id: Optional[int] = None) -> Dict[str, Any]:
+    """Ruchy magazynowe w grupach (stan zamknięcia tylko dla jednego elementu)"""
+    edges = group_edges(start, end, group)
+    started = time.perf_counter()
+    rows = db.get_movement_rows(start, end, item_id)
+    ts, deltas, quantities = columns(rows, 3)
+    groups = movement_groups(ts, deltas, quantities, edges, closing=item_id is not None)
+    summary = movement_groups(ts, deltas, quantities, [start, end], closing=item_id is not None)
+    return {
+        'item_id': item_id,
+        'group': group,
+        'from': start,
+        'to': end,
+        'summary': summary[0] if summary else None,
+        'groups': groups,
+        'backend': BACKEND,
+        'elapsed_ms': round((time.perf_counter() - started) * 1000, 2),
+    }
+
+# --- benchmark ---
+
+def benchmark(samples: int = 2_000_000, interval: int = 10) -> List[Tuple[str, float, float]]:
+    """Czas i przepustowość (próbek/s) obliczeń na syntetycznej serii; bez odczytu z bazy"""
+    end = int(time.time())
+    start = end - samples * interval
+    rows = [(start + i * interval, 20 + 5 * math.sin(i / 360) + (i % 7) * 0.1) for i in range(samples)]
+    meter = [(ts, i * 0.01) for i, (ts, _) in enumerate(rows)]
+    results = []
+
+    def measure(label: str, function):
+        started = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - started
+        results.append((label, elapsed, samples / elapsed))
+
+    days = group_edges(start, end, 'day')
+
+    def per_row():
+        # Dotychczasowy wzorzec: pętla Pythona po wierszach z akumulatorami grup
+        groups = {}
+        for ts, value in rows:
+            day = days[bisect_left(days, ts + 1) - 1]
+            group = groups.get(day)
+            if group is None:
+                groups[day] = [1, value, value, value]
+            else:
+                group[0] += 1
+                group[1] = min(group[1], value)
+                group[2] = max(group[2], value)
+                group[3] += value
+        return groups
+
+    measure('pętla po wierszach (porównanie)', per_row)
+    measure('kolumny z krotek', lambda: columns(rows, 2))
+    ts, values = columns(rows, 2)
+    measure('statystyki dzienne', lambda: aggregate_samples(ts, values, days))
+    measure('statystyki dzienne + p50/p95/p99', lambda: aggregate_samples(ts, values, days, (50, 95, 99)))
+    measure('statystyki godzinowe', lambda: aggregate_samples(ts, values, group_edges(start, end, 'hour')))
+    meter_ts, readings = columns(meter, 2)
+    measure('zużycie dzienne z licznika', lambda: counter_consumption(meter_ts, readings, days))
+    return results
+
+if __name__ == '__main__':
+    if len(sys.argv) >= 2 and sys.argv[1] == 'bench':
+        count = int(sys.argv[2]) if len(sys.argv) > 2 else 2_000_000
+        print(f"Backend: {BACKEND}, próbek: {count:,}")
+        for label, elapsed, throughput in benchmark(count):
+            print(f"  {label:<36} {elapsed * 1000:9.1f} ms  {throughput / 1e6:7.1f} M próbek/s")
+    else:
+        print("Użycie: python analytics.py bench [liczba_próbek]")
@@ -0,0 +1,124 @@
+# bundles.py
+"""Paczki fragmentów zakładek (data/app/*/app.html + app.js) w jednej odpowiedzi.
+
+Lista zakładek i ich fragmentów jest w data/app/manifest.json. Treść wszystkich
+fragmentów jest wczytywana do pamięci przy starcie, więc obsługa żądania nie
+dotyka systemu plików.
+"""
+import os
+import gzip
+import json
+import hashlib
+import threading
+from typing import Dict, List, Optional, Any
+import logging
+
+logger = logging.getLogger(__name__)
+
+APP_DIRECTORY = 'data/app'
+BUNDLE_MANIFEST = os.path.join(APP_DIRECTORY, 'manifest.json')
+FRAGMENT_FILES = ('app.html', 'app.js')
+
+class FragmentIndex:
+    """Indeks fragmentów zakładek zbudowany przy starcie serwera.
+
+    Z auto_reload=True (tryb deweloperski) indeks jest przebudowywany, gdy zmieni
+    się czas modyfikacji któregoś z plików - kosztem kilkunastu stat() na żądanie.
+    """
+
+    def __init__(self, root: str = '.', auto_reload: bool = False):
+        self.root = root
+        self.auto_reload = auto_reload
+        self.tabs: Dict[str, List[str]] = {}
+        self.fragments: Dict[str, Dict[str, Any]] = {}
+        self._bundles: Dict[Optional[str], Dict[str, Any]] = {}
+        self._mtimes: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self.load()
+
+    def _path(self, *parts: str) -> str:
+        return os.path.join(self.root, *parts)
+
+    def load(self):
+        """Wczytaj manifest i treść wszystkich fragmentów"""
+        try:
+            with open(self._path(BUNDLE_MANIFEST), encoding='utf-8') as f:
+                tabs = json.load(f).get('tabs', {})
+        except (OSError, ValueError) as e:
+            logger.error(f"❌ Błąd wczytywania manifestu zakładek: {e}")
+            tabs = {}
+
+        fragments = {}
+        mtimes = {}
+        for fragment_ids in tabs.values():
+            for fragment_id in fragment_ids:
+                if fragment_id in fragments:
+                    continue
+                fragment = {}
+                for filename in FRAGMENT_FILES:
+                    path = self._path(APP_DIRECTORY, fragment_id, filename)
+                    try:
+                        with open(path, encoding='utf-8') as f:
+                            fragment[filename.split('.')[1]] = f.read()
+                        mtimes[path] = os.path.getmtime(path)
+                    except OSError:
+                        logger.warning(f"⚠️ Brak pliku fragmentu: {APP_DIRECTORY}/{fragment_id}/{filename}")
+                        fragment[filename.split('.')[1]] = ''
+                        mtimes[path] = None
+                fragments[fragment_id] = fragment
+
+        with self._lock:
+            self.tabs = tabs
+            self.fragments = fragments
+            self._mtimes = mtimes
+            self._bundles = {}
+        logger.info(f"✅ Wczytano {len(fragments)} fragmentów dla {len(tabs)} zakładek")
+
+    def _modified(self) -> bool:
+        for path, mtime in self._mtimes.items():
+            try:
+                current = os.path.getmtime(path)
+            except OSError:
+                current = None
+            if current != mtime:
+                return True
+        return False
+
+    def bundle(self, tab: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Paczka jednej zakładki lub (tab=None) całej powłoki; None gdy brak zakładki"""
+        if self.auto_reload and self._modified():
+            self.load()
+
+        with self._lock:
+            cached = self._bundles.get(tab)
+            if cached is not None:
+                return cached
+            if tab is None:
+                fragment_ids = list(self.fragments)
+            elif tab in self.tabs:
+                fragment_ids = self.tabs[tab]
+            else:
+                return None
+
+            fragments = {fragment_id: self.fragments[fragment_id] for fragment_id in fragment_ids}
+            data = json.dumps({'tab': tab, 'tabs': self.tabs, 'fragments': fragments},
+                              ensure_ascii=False, sort_keys=True)
+            version = hashlib.sha256(data.encode('utf-8')).hexdigest()[:16]
+            # Gotowa odpowiedź i jej wariant gzip liczone raz na wersję paczki
+            body = f'{{"success": true, "version": "{version}", "data": {data}}}'.encode('utf-8')
+            bundle = {
+                'body': body,
+                'gzip': gzip.compress(body, compresslevel=9),
+                'version': version,
+            }
+            self._bundles[tab] = bundle
+            return bundle
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'tabs': len(self.tabs),
+            'fragments': len(self.fragments),
+            'cached_bundles': len(self._bundles),
+            'bytes': sum(len(f['html']) + len(f['js']) for f in self.fragments.values()),
+            'auto_reload': self.auto_reload,
+        }
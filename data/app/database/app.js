@@ -14,12 +14,19 @@ app = {
         this.warehouseEditedRows = new Set();
 
         try {
-            getEndpointData("api/warehouse").then(data => {
-                this.warehouseOriginalData = data.data || [];
-                this.warehouseCurrentData = this.warehouseOriginalData.map(row => ({
+            // Dane ładowane stronami - tabela powstaje po pierwszej stronie, kolejne są dokładane
+            getEndpointPages("api/warehouse", async (rows, pageIndex) => {
+                const pageData = rows.map(row => ({
                     ...row,
                     _original: { ...row }
                 }));
+                this.warehouseOriginalData.push(...rows);
+                this.warehouseCurrentData.push(...pageData);
+
+                if (pageIndex > 0) {
+                    await this.warehouseTable.addData(pageData);
+                    return;
+                }
 
                 this.warehouseTable = new Tabulator("#ware-table", {
                     height: "800px",
@@ -74,11 +81,13 @@ app = {
                             cellClick: this.handleWarehouseActionClick.bind(this)
                         }
                     ],
-                    data: this.warehouseCurrentData,
+                    data: pageData,
                 });
+                await new Promise(resolve => this.warehouseTable.on("tableBuilt", resolve));
 
-                console.log("Tabela magazynu zainicjalizowana z danymi:", this.warehouseCurrentData.length);
                 this.setupWarehouseEventListeners();
+            }).then(() => {
+                console.log("Tabela magazynu zainicjalizowana z danymi:", this.warehouseCurrentData.length);
             }).catch(error => {
                 console.error("Błąd ładowania danych magazynu:", error);
                 this.showWarehouseError("Nie udało się załadować danych z magazynu");
@@ -134,9 +143,7 @@ app = {
                     if (rowData.id) {
                         // Aktualizacja istniejącego rekordu - tylko ilość
                         console.log(`Aktualizacja ilości dla ID ${rowData.id}: ${rowData.quantity}`);
-                        result = await apiRequest(`/api/warehouse/${rowData.id}/quantity`, 'PUT', {
-                            quantity: parseInt(rowData.quantity) || 0
-                        });
+                        result = await this.saveWarehouseQuantity(rowData);
                     } else {
                         // Nowy rekord
                         console.log("Dodawanie nowego rekordu:", rowData);
@@ -315,6 +322,15 @@ app = {
                     URL.revokeObjectURL(url);
                 }
             },
+            {
+                label: "🗄️ Eksportuj cały magazyn (CSV z serwera)",
+                action: () => {
+                    const a = document.createElement('a');
+                    a.href = 'api/warehouse/export?format=csv';
+                    a.download = 'magazyn.csv';
+                    a.click();
+                }
+            },
             {
                 label: "🖨️ Drukuj",
                 action: () => this.warehouseTable.print()
@@ -417,17 +433,25 @@ app = {
     refreshWarehouseData: async function () {
         try {
             this.showWarehouseMessage("🔄 Odświeżam dane...");
-            const data = await getEndpointData("api/warehouse");
-            this.warehouseOriginalData = data.data || [];
-            this.warehouseCurrentData = this.warehouseOriginalData.map(row => ({
-                ...row,
-                _original: { ...row }
-            }));
+            this.warehouseOriginalData = [];
+            this.warehouseCurrentData = [];
             this.warehouseEditedRows.clear();
 
-            if (this.warehouseTable) {
-                this.warehouseTable.setData(this.warehouseCurrentData);
-            }
+            await getEndpointPages("api/warehouse", async (rows, pageIndex) => {
+                const pageData = rows.map(row => ({
+                    ...row,
+                    _original: { ...row }
+                }));
+                this.warehouseOriginalData.push(...rows);
+                this.warehouseCurrentData.push(...pageData);
+
+                if (!this.warehouseTable) return;
+                if (pageIndex === 0) {
+                    await this.warehouseTable.setData(pageData);
+                } else {
+                    await this.warehouseTable.addData(pageData);
+                }
+            });
 
             this.showWarehouseMessage("✅ Dane odświeżone");
         } catch (error) {
@@ -436,6 +460,36 @@ app = {
         }
     },
 
+    // Zapis ilości jako zmiany (delta) względem wczytanego stanu - równoległe zmiany
+    // innych użytkowników nie są nadpisywane, a klucz idempotencji chroni przed podwójnym zapisem
+    saveWarehouseQuantity: async function (rowData) {
+        const quantity = parseInt(rowData.quantity) || 0;
+        const original = rowData._original ? parseInt(rowData._original.quantity) || 0 : null;
+
+        if (original === null) {
+            return apiRequest(`/api/warehouse/${rowData.id}/quantity`, 'PUT', { quantity });
+        }
+
+        const delta = quantity - original;
+        if (delta === 0) {
+            return { success: true };
+        }
+
+        // Ten sam klucz przy ponowieniu nieudanego zapisu, nowy po udanym
+        rowData._original._pendingKey = rowData._original._pendingKey || crypto.randomUUID();
+        const result = await apiRequest(`/api/warehouse/${rowData.id}/adjust`, 'POST', {
+            delta,
+            reason: 'dashboard',
+            idempotency_key: rowData._original._pendingKey
+        });
+
+        if (result && result.success) {
+            rowData._original.quantity = result.quantity;
+            delete rowData._original._pendingKey;
+        }
+        return result;
+    },
+
     // POMOCNICZE METODY MAGAZYNU
     markWarehouseRowAsEdited: function (row) {
         const rowData = row.getData();
@@ -506,9 +560,7 @@ app = {
             let result;
             if (rowData.id) {
                 // Aktualizacja ilości
-                result = await apiRequest(`/api/warehouse/${rowData.id}/quantity`, 'PUT', {
-                    quantity: parseInt(rowData.quantity) || 0
-                });
+                result = await this.saveWarehouseQuantity(rowData);
             } else {
                 // Nowy rekord
                 result = await apiRequest('/api/warehouse', 'POST', {
@@ -7,36 +7,37 @@ app = {
         document.getElementById('statusButton') ? modbusControllerStatus = document.getElementById('statusButton') : null;
         if (!modbusControllerStatus) return;
 
+        // Stan sprawdza serwer (monitor urządzeń) - przeglądarka tylko czyta wynik
+        const controllerName = 'control';
+
+        function showStatusModbusController(device) {
+            const online = Boolean(device && device.online);
+            modbusControllerStatus.classList.remove(online ? 'bg-red-500' : 'bg-green-500');
+            modbusControllerStatus.classList.add(online ? 'bg-green-500' : 'bg-red-500');
+            modbusControllerStatus.innerText = online ? 'Online' : 'Offline';
+            if (device) {
+                modbusControllerStatus.title = online
+                    ? `${device.latency_ms ?? '-'} ms, sprawdzono ${device.checked_at}`
+                    : `${device.error || 'Brak odpowiedzi'}; ostatnio online: ${device.last_seen || 'nigdy'}`;
+            }
+        }
 
-        function updateStatusModbusController() {
-
-            fetch('http://control.local/ping', {
-                mode: 'no-cors',
-                headers: {
-                    'Accept': 'application/json',
-                }
-            })
-                .then(response => {
-                    if (response.type === 'opaque') {
-                        modbusControllerStatus.classList.remove('bg-red-500');
-                        modbusControllerStatus.classList.add('bg-green-500');
-                        modbusControllerStatus.innerText = 'Online';
-                    } else {
-                        modbusControllerStatus.classList.remove('bg-green-500');
-                        modbusControllerStatus.classList.add('bg-red-500');
-                        modbusControllerStatus.innerText = 'Offline';
-                    }
-                })
-                .catch(error => {
-                    modbusControllerStatus.classList.remove('bg-green-500');
-                    modbusControllerStatus.classList.add('bg-red-500');
-                    modbusControllerStatus.innerText = 'Offline';
-                    console.error('Błąd:', error);
-                });
+        async function updateStatusModbusController() {
+            try {
+                const data = await getEndpointData('/api/devices/status');
+                if (!data || !data.success) throw new Error('Brak stanu urządzeń');
+                showStatusModbusController(data.data.find(device => device.name === controllerName));
+            } catch (error) {
+                showStatusModbusController(null);
+                console.error('Błąd:', error);
+            }
         }
 
         updateStatusModbusController();
+        onServerEvent('device_status', device => {
+            if (device && device.name === controllerName) showStatusModbusController(device);
+        });
+        onServerEvent('reset', () => updateStatusModbusController());
 
     }
 };
-
@@ -1,7 +1,7 @@
 appInitUpdate();
 
 app = {
-    ws: null,
+    send: null,
 
     init: function () {
 
@@ -11,36 +11,89 @@ app = {
             const output = document.getElementById('console-messages');
             output.innerHTML = '';
         }
-        if (this.ws) {
-            this.ws.close();
-            this.ws = null;
-            // addMessage('[System] Stare połączenie WebSocket zostało zamknięte', 'text-red-400');
+
+        // Ruch do kontrolera idzie przez bramkę na serwerze (/api/modbus) - jedno połączenie
+        // z kontrolerem niezależnie od liczby otwartych konsol. Strumień pokazuje cały ruch bramki.
+        if (window.modbusConsoleSource) {
+            window.modbusConsoleSource.close();
         }
-        this.ws = new WebSocket('ws://control.local:81/');
+        const source = new EventSource('/api/modbus/stream');
+        window.modbusConsoleSource = source;
+
+        source.onopen = () => {
+            addMessage('[System] Connected to Modbus gateway', 'text-blue-700');
+        };
 
-        this.ws.onopen = () => {
-            addMessage('[System] Connected to WebSocket', 'text-blue-700');
+        // Odpowiedź i błąd własnego żądania przychodzą dwa razy (wynik POST i strumień) -
+        // pokazujemy ten, który dotrze pierwszy (numer zdarzenia bramki)
+        const shownEvents = new Set();
+        const firstTime = (eventId) => {
+            if (eventId === null || eventId === undefined) return true;
+            if (shownEvents.has(eventId)) return false;
+            shownEvents.add(eventId);
+            if (shownEvents.size > 500) shownEvents.delete(shownEvents.values().next().value);
+            return true;
+        };
+        const showResponse = (data) => {
+            if (data.response === null || !firstTime(data.event_id)) return;
+            addMessage(`[${data.bus}] ${data.response} (${data.elapsed_ms} ms)`,
+                data.exception === null ? 'text-white' : 'text-red-400');
+        };
+
+        source.onmessage = (event) => {
+            const data = JSON.parse(event.data);
+            switch (data.type) {
+                case 'request':
+                    addMessage(`[SENT ${data.bus}] ${data.request}`, 'sent');
+                    break;
+                case 'response':
+                    showResponse({ ...data, event_id: data.id });
+                    break;
+                case 'unsolicited':
+                    addMessage(`[${data.bus}] ${data.response}`, 'text-white');
+                    break;
+                case 'message':
+                    addMessage(`[${data.bus}] ${data.text}`, 'text-white');
+                    break;
+                case 'error':
+                    if (firstTime(data.id)) addMessage(`[ERROR ${data.bus}] ${data.request}: ${data.error}`, 'text-red-400');
+                    break;
+                case 'status':
+                    addMessage(`[System] ${data.bus}: ` + (data.connected ? 'controller connected' : 'controller disconnected'
+                        + (data.error ? ` (${data.error})` : '')), data.connected ? 'text-blue-700' : 'text-red-400');
+                    break;
+            }
         };
 
-        this.ws.onmessage = (event) => {
-            addMessage(event.data, 'text-white');
+        source.onerror = () => {
+            addMessage('[System] Modbus gateway stream disconnected - reconnecting...', 'text-red-400');
         };
 
-        this.ws.onclose = () => {
-            addMessage('[System] WebSocket disconnected', 'text-red-400');
+        // Wynik pokazywany od razu z odpowiedzi POST - także gdy strumień jest rozłączony
+        this.send = (frame) => {
+            return fetch('/api/modbus/request', {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({ frame: frame })
+            })
+                .then(response => response.json().then(data => {
+                    if (data.success) showResponse(data.data);
+                    else if (firstTime(data.event_id)) addMessage('[ERROR] ' + data.error, 'text-red-400');
+                }))
+                .catch(err => addMessage('[ERROR] ' + err, 'text-red-400'));
         };
 
         const sendHex = () => {
             const hexInput = consoleElement;
             const hexData = hexInput.value.trim();
 
-            if (hexData && this.ws && this.ws.readyState === WebSocket.OPEN) {
-                this.ws.send(hexData);
+            if (hexData) {
+                this.send(hexData);
                 hexInput.value = '';
             }
         };
 
-        consoleElement.keyup = (e) => {
+        consoleElement.onkeyup = (e) => {
             if (e.key === 'Enter') sendHex();
         };
 
@@ -71,11 +124,12 @@ app = {
                 'Kontroler odczytu temperatury': '010300000002C40B',
                 'Moduł Kontroli Carel': '010300000002C40B'
             },
+            // Zapis nowego ID (1) do rejestru adresu urządzenia; ramki z policzonym CRC
             'Zmień ID': {
-                'Modbus RTU Relay': '0106000000010001F9F8',
-                'Licznik energii': '0106000000010001F9F8',
-                'Kontroler odczytu temperatury': '0106000000010001F9F8',
-                'Moduł Kontroli Carel': '0106000000010001F9F8'
+                'Modbus RTU Relay': '010600000001480A',
+                'Licznik energii': '0110100300010200017662',
+                'Kontroler odczytu temperatury': '010600FE000129FA',
+                'Moduł Kontroli Carel': '010600000001480A'
             },
         }
         function generateMenuTable(menuObject, parentElement) {
@@ -140,15 +194,14 @@ app = {
                     subMenu.classList.add('submenu');
                 } else {
                     button.addEventListener('click', () => {
-                        if (app.ws && app.ws.readyState === WebSocket.OPEN) {
-                            app.ws.send(menuObject[key]);
-                            addMessage('[SENT] ' + menuObject[key], 'sent');
+                        if (menuObject[key]) {
+                            app.send(menuObject[key]);
 
                             document.querySelectorAll('.submenu').forEach(item => {
                                 item.style.display = 'none';
                             });
                         } else {
-                            addMessage('[ERROR] WebSocket is not connected', 'text-red-400');
+                            addMessage('[ERROR] Brak ramki dla: ' + key, 'text-red-400');
                         }
                     });
                 }
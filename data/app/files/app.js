@@ -360,7 +360,9 @@ app = {
                 this.currentImages.forEach((image, index) => {
                     const thumbnail = document.createElement('img');
                     thumbnail.className = `thumbnail ${index === this.currentImageIndex ? 'active' : ''}`;
-                    thumbnail.src = `/api/file-content?path=${encodeURIComponent(image.path)}`;
+                    thumbnail.src = `/api/file-content?path=${encodeURIComponent(image.path)}&thumbnail=true&v=${image.modified}`;
+                    thumbnail.loading = 'lazy';
+                    thumbnail.decoding = 'async';
                     thumbnail.alt = image.name;
                     thumbnail.title = image.name;
 
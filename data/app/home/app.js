@@ -24,10 +24,10 @@ app = {
 
         window.dashboardUnreadAlert = function (id) {
             document.getElementById("alerty").innerHTML = `<div class="_dashboard-tab-loader"></div>`;
-            apiRequest(`/api/alerts/${id}/read`, "POST", { read: 1 });
-            setTimeout(() => {
-                dashboardReadAlerts();
-            }, 1000)
+            // Lista odświeży się po zdarzeniu alert_read z /api/events
+            apiRequest(`/api/alerts/${id}/read`, "POST", { read: 1 }).then(data => {
+                if (!data) dashboardReadAlerts();
+            });
         }
 
         function renderMessages(messages, containerId) {
@@ -84,6 +84,10 @@ app = {
         }
 
 
+        onServerEvent("alert_created", () => dashboardReadAlerts());
+        onServerEvent("alert_read", () => dashboardReadAlerts());
+        onServerEvent("reset", () => dashboardReadAlerts());
+
         dashboardReadAlerts();
 
     }
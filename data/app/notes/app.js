@@ -47,16 +47,20 @@ app = {
             async loadNotes() {
                 this.showLoading();
 
-                const result = await apiRequest('/api/notes');
-
-                if (!result || !result.success) {
+                // Notatki ładowane stronami - lista rysowana od pierwszej strony
+                this.notes = [];
+                try {
+                    await getEndpointPages('/api/notes', (rows) => {
+                        this.notes.push(...rows);
+                        this.renderNotesList();
+                    });
+                } catch (error) {
+                    console.error(error);
                     this.showError('Błąd ładowania notatek');
                     return;
                 }
 
-                this.notes = result.data || [];
                 console.log('📝 Załadowane notatki:', this.notes);
-                this.renderNotesList();
             }
 
             renderNotesList() {
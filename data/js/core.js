@@ -7,6 +7,8 @@ document.addEventListener('DOMContentLoaded', () => {
 });
 
 function appInitUpdate() {
+    // Handlery zdarzeń należą do poprzedniej zakładki
+    serverEventHandlers = {};
     if (window.app) {
         for (let key in app) {
             if (app.hasOwnProperty(key)) delete app[key];
@@ -114,6 +116,61 @@ async function apiRequest(url, method = "GET", payload = null) {
     }
 }
 
+// Pobiera listę stronami (?limit=&cursor=) i przekazuje każdą stronę do onPage,
+// dzięki czemu tabela może się wyrenderować po pierwszej stronie
+async function getEndpointPages(url, onPage, pageSize = 200) {
+    let cursor = null;
+    let pageIndex = 0;
+
+    do {
+        const separator = url.includes('?') ? '&' : '?';
+        let pageUrl = `${url}${separator}limit=${pageSize}`;
+        if (cursor) pageUrl += `&cursor=${encodeURIComponent(cursor)}`;
+
+        const data = await getEndpointData(pageUrl);
+        if (!data || !data.success) {
+            throw new Error(`Błąd pobierania strony ${pageIndex + 1} z ${url}`);
+        }
+
+        await onPage(data.data || [], pageIndex);
+        cursor = data.next_cursor;
+        pageIndex++;
+    } while (cursor);
+}
+
+// Jedno połączenie SSE (/api/events) na całą stronę; zakładki rejestrują handlery
+// przez onServerEvent. Po zerwaniu przeglądarka łączy się ponownie z Last-Event-ID.
+let serverEventSource = null;
+let serverEventHandlers = {};
+
+function onServerEvent(type, handler) {
+    if (!serverEventHandlers[type]) serverEventHandlers[type] = [];
+    serverEventHandlers[type].push(handler);
+    connectServerEvents();
+}
+
+function dispatchServerEvent(event) {
+    let data;
+    try {
+        data = JSON.parse(event.data);
+    } catch (err) {
+        console.error("Błędne zdarzenie SSE:", err);
+        return;
+    }
+    (serverEventHandlers[event.type] || []).forEach(handler => handler(data.data, data));
+}
+
+function connectServerEvents() {
+    if (serverEventSource || !window.EventSource) return;
+    serverEventSource = new EventSource("/api/events");
+    // reset - część zaległych zdarzeń usunięto, zakładki pobierają stan od nowa
+    ["alert_created", "alert_read", "note_reminder", "device_status", "reset"].forEach(type => {
+        serverEventSource.addEventListener(type, dispatchServerEvent);
+    });
+    serverEventSource.onerror = () => {
+        console.warn("Połączenie SSE przerwane - ponawianie...");
+    };
+}
 
 function loockScreen() {
     const overlay = document.createElement("div");
@@ -1,3 +1,28 @@
+// Fragmenty zakładek z /api/bundle (html + js) trzymane w pamięci strony;
+// przełączenie zakładki nie wymaga wtedy żadnego żądania do serwera
+let appBundle = null;
+
+function loadBundle() {
+    // Jedno żądanie nawet przy kilku równoczesnych wywołaniach loadContent
+    if (!appBundle) {
+        appBundle = fetch("/api/bundle", { headers: { "Accept": "application/json" } })
+            .then(response => {
+                if (!response.ok) throw new Error("Błąd ładowania paczki zakładek: " + response.status);
+                return response.json();
+            })
+            .then(data => data.data.fragments)
+            .catch(err => {
+                console.error(err);
+                return {};
+            });
+    }
+    return appBundle;
+}
+
+function fragmentId(path) {
+    return path.replace(/^\.?\/?data\/app\//, "").replace(/\/$/, "");
+}
+
 async function loadContent(divId, path) {
     const htmlFile = path.replace(/\/$/, "") + "/app.html";
     const jsFile = path.replace(/\/$/, "") + "/app.js";
@@ -12,11 +37,17 @@ async function loadContent(divId, path) {
     `;
 
     try {
-        // wczytanie HTML
-        const response = await fetch(htmlFile + "?v=" + Date.now());
-        if (!response.ok) throw new Error("Błąd ładowania " + htmlFile);
-        const html = await response.text();
-        container.innerHTML = html;
+        const fragment = (await loadBundle())[fragmentId(path)];
+
+        // wczytanie HTML (z paczki lub - gdy brak w manifeście - osobnym żądaniem)
+        if (fragment) {
+            container.innerHTML = fragment.html;
+        } else {
+            const response = await fetch(htmlFile + "?v=" + Date.now());
+            if (!response.ok) throw new Error("Błąd ładowania " + htmlFile);
+            const html = await response.text();
+            container.innerHTML = html;
+        }
 
         if (window.app) {
             for (let key in app) {
@@ -31,15 +62,23 @@ async function loadContent(divId, path) {
 
         // --- DYNAMICZNE DODANIE NOWEGO JS ---
         const script = document.createElement("script");
-        script.src = jsFile + "?v=" + Date.now(); // ⬅️ zawsze unikalny adres
         script.id = "dynamic-app-js";
-        script.defer = true;
 
-        script.onload = () => {
+        if (fragment) {
+            // Skrypt wstawiony jako tekst wykonuje się od razu przy dodaniu do dokumentu
+            script.textContent = fragment.js + `\n//# sourceURL=${jsFile.replace(/^\.\//, "")}`;
+            document.body.appendChild(script);
             if (app.init) app.init();
-        };
+        } else {
+            script.src = jsFile + "?v=" + Date.now(); // ⬅️ zawsze unikalny adres
+            script.defer = true;
 
-        document.body.appendChild(script);
+            script.onload = () => {
+                if (app.init) app.init();
+            };
+
+            document.body.appendChild(script);
+        }
 
     } catch (err) {
         console.error(err);
@@ -47,5 +86,3 @@ async function loadContent(divId, path) {
     }
     loadTranslations();
 }
-
-
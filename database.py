@@ -1,29 +1,845 @@
 # database.py
 import sqlite3
+import re
 import json
-from datetime import datetime
-from typing import List, Dict, Optional, Any
+import base64
+import os
+import time
+import queue
+import atexit
+import threading
+import tempfile
+from datetime import datetime, timezone
+from typing import List, Dict, Optional, Any, Callable
 import logging
 
 # Konfiguracja logowania
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Profile ustawień SQLite nakładane na każde nowe połączenie z puli
+STORAGE_PROFILES = {
+    # WAL - czytelnicy nie są blokowani przez trwający zapis
+    'wal': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'mmap_size': 64 * 1024 * 1024,
+        'cache_size': -16000,          # ~16 MB (wartość ujemna = KiB)
+        'temp_store': 'MEMORY',
+        'wal_autocheckpoint': 1000,    # strony
+        'journal_size_limit': 64 * 1024 * 1024,
+    },
+    # WAL z pełną synchronizacją - odporny na utratę zasilania kosztem zapisu
+    'wal_safe': {
+        'journal_mode': 'WAL',
+        'synchronous': 'FULL',
+        'mmap_size': 0,
+        'cache_size': -8000,
+        'temp_store': 'DEFAULT',
+        'wal_autocheckpoint': 1000,
+        'journal_size_limit': 64 * 1024 * 1024,
+    },
+    # Dotychczasowe zachowanie (rollback journal)
+    'legacy': {
+        'journal_mode': 'DELETE',
+        'synchronous': 'FULL',
+    },
+}
+
+def version_triggers(table: str) -> List[str]:
+    """Triggery podbijające licznik tabeli w change_versions przy każdej zmianie"""
+    statements = [f"INSERT OR IGNORE INTO change_versions (table_name) VALUES ('{table}')"]
+    for event in ('INSERT', 'UPDATE', 'DELETE'):
+        statements.append(
+            f"""CREATE TRIGGER IF NOT EXISTS {table}_version_{event.lower()} AFTER {event} ON {table} BEGIN
+                UPDATE change_versions SET version = version + 1, updated_at = CURRENT_TIMESTAMP
+                WHERE table_name = '{table}';
+            END"""
+        )
+    return statements
+
+# Formaty akceptowane w notes.alert_time (bez strefy czasowej = czas lokalny serwera)
+ALERT_TIME_FORMATS = ('%Y-%m-%dT%H:%M', '%Y-%m-%d %H:%M', '%d.%m.%Y %H:%M:%S', '%d.%m.%Y %H:%M',
+                      '%Y-%m-%d', '%d.%m.%Y')
+
+def normalize_alert_time(value: Optional[str]) -> Optional[str]:
+    """Zamień tekst alert_time na znormalizowany czas UTC 'YYYY-MM-DD HH:MM:SS' (jak CURRENT_TIMESTAMP).
+
+    Pusty tekst daje None; niepoprawny format zgłasza ValueError.
+    """
+    value = (value or '').strip()
+    if not value:
+        return None
+    try:
+        moment = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        for fmt in ALERT_TIME_FORMATS:
+            try:
+                moment = datetime.strptime(value, fmt)
+                break
+            except ValueError:
+                continue
+        else:
+            raise ValueError(f"Invalid alert_time: {value}")
+    return moment.astimezone(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+
+def backfill_note_reminders(cursor: sqlite3.Cursor):
+    """Uzupełnij notes.remind_at dla istniejących notatek (niepoprawne alert_time pomijane)"""
+    rows = cursor.execute("SELECT id, alert_time FROM notes WHERE alert_time IS NOT NULL AND alert_time != ''").fetchall()
+    updates = []
+    for note_id, alert_time in rows:
+        try:
+            updates.append((normalize_alert_time(alert_time), note_id))
+        except ValueError:
+            logger.warning(f"⚠️ Notatka {note_id}: nieczytelny alert_time '{alert_time}' - pominięto")
+    cursor.executemany("UPDATE notes SET remind_at = ? WHERE id = ?", updates)
+
+# Wersjonowane zmiany schematu (indeksy itd.) - numer ostatniej zapisany w PRAGMA user_version.
+# Nowe zmiany dopisuj na końcu z kolejnym numerem, istniejących nie modyfikuj.
+SCHEMA_MIGRATIONS = [
+    (1, "Indeksy dla list alertów, prac, notatek, planowania i magazynu", [
+        "CREATE INDEX IF NOT EXISTS idx_alerts_created_at ON alerts (created_at, id)",
+        "CREATE INDEX IF NOT EXISTS idx_alerts_is_read ON alerts (is_read, created_at)",
+        "CREATE INDEX IF NOT EXISTS idx_alerts_priority ON alerts (priority, created_at)",
+        "CREATE INDEX IF NOT EXISTS idx_works_created_at ON works (created_at, id)",
+        "CREATE INDEX IF NOT EXISTS idx_works_status ON works (status, created_at)",
+        "CREATE INDEX IF NOT EXISTS idx_works_priority ON works (priority, created_at)",
+        "CREATE INDEX IF NOT EXISTS idx_works_deadline ON works (deadline)",
+        "CREATE INDEX IF NOT EXISTS idx_notes_created_at ON notes (created_at, id)",
+        "CREATE INDEX IF NOT EXISTS idx_planning_created_at ON planning (created_at, id)",
+        "CREATE INDEX IF NOT EXISTS idx_warehouse_name ON warehouse (name, id)",
+    ]),
+    (2, "Indeks pełnotekstowy FTS5 magazynu i notatek", [
+        """CREATE VIRTUAL TABLE IF NOT EXISTS warehouse_fts USING fts5(
+            name, code, note,
+            content='warehouse', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+        )""",
+        """CREATE TRIGGER IF NOT EXISTS warehouse_fts_insert AFTER INSERT ON warehouse BEGIN
+            INSERT INTO warehouse_fts (rowid, name, code, note) VALUES (new.id, new.name, new.code, new.note);
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS warehouse_fts_delete AFTER DELETE ON warehouse BEGIN
+            INSERT INTO warehouse_fts (warehouse_fts, rowid, name, code, note)
+            VALUES ('delete', old.id, old.name, old.code, old.note);
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS warehouse_fts_update AFTER UPDATE OF name, code, note ON warehouse BEGIN
+            INSERT INTO warehouse_fts (warehouse_fts, rowid, name, code, note)
+            VALUES ('delete', old.id, old.name, old.code, old.note);
+            INSERT INTO warehouse_fts (rowid, name, code, note) VALUES (new.id, new.name, new.code, new.note);
+        END""",
+        "INSERT INTO warehouse_fts (warehouse_fts) VALUES ('rebuild')",
+        """CREATE VIRTUAL TABLE IF NOT EXISTS notes_fts USING fts5(
+            name, text,
+            content='notes', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+        )""",
+        """CREATE TRIGGER IF NOT EXISTS notes_fts_insert AFTER INSERT ON notes BEGIN
+            INSERT INTO notes_fts (rowid, name, text) VALUES (new.id, new.name, new.text);
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS notes_fts_delete AFTER DELETE ON notes BEGIN
+            INSERT INTO notes_fts (notes_fts, rowid, name, text) VALUES ('delete', old.id, old.name, old.text);
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS notes_fts_update AFTER UPDATE OF name, text ON notes BEGIN
+            INSERT INTO notes_fts (notes_fts, rowid, name, text) VALUES ('delete', old.id, old.name, old.text);
+            INSERT INTO notes_fts (rowid, name, text) VALUES (new.id, new.name, new.text);
+        END""",
+        "INSERT INTO notes_fts (notes_fts) VALUES ('rebuild')",
+    ]),
+    (3, "Rejestr ruchów magazynowych (tylko dopisywanie) z kluczami idempotencji", [
+        """CREATE TABLE IF NOT EXISTS warehouse_movements (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            item_id INTEGER NOT NULL,
+            delta INTEGER NOT NULL,
+            quantity_after INTEGER NOT NULL,
+            reason TEXT,
+            idempotency_key TEXT UNIQUE,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )""",
+        "CREATE INDEX IF NOT EXISTS idx_warehouse_movements_item ON warehouse_movements (item_id, id)",
+        """CREATE TRIGGER IF NOT EXISTS warehouse_movements_no_update BEFORE UPDATE ON warehouse_movements BEGIN
+            SELECT RAISE(ABORT, 'warehouse_movements is append-only');
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS warehouse_movements_no_delete BEFORE DELETE ON warehouse_movements BEGIN
+            SELECT RAISE(ABORT, 'warehouse_movements is append-only');
+        END""",
+    ]),
+    (4, "Liczniki wersji tabel (unieważnianie cache między workerami)", [
+        """CREATE TABLE IF NOT EXISTS change_versions (
+            table_name TEXT PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        ) WITHOUT ROWID""",
+        "INSERT OR IGNORE INTO change_versions (table_name) VALUES ('config')",
+        """CREATE TRIGGER IF NOT EXISTS config_version_insert AFTER INSERT ON config BEGIN
+            UPDATE change_versions SET version = version + 1, updated_at = CURRENT_TIMESTAMP
+            WHERE table_name = 'config';
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS config_version_update AFTER UPDATE ON config BEGIN
+            UPDATE change_versions SET version = version + 1, updated_at = CURRENT_TIMESTAMP
+            WHERE table_name = 'config';
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS config_version_delete AFTER DELETE ON config BEGIN
+            UPDATE change_versions SET version = version + 1, updated_at = CURRENT_TIMESTAMP
+            WHERE table_name = 'config';
+        END""",
+    ]),
+    (5, "Liczniki wersji list (ETag) dla alertów, prac, notatek, planowania i magazynu", [
+        *version_triggers('alerts'),
+        *version_triggers('works'),
+        *version_triggers('notes'),
+        *version_triggers('planning'),
+        *version_triggers('warehouse'),
+    ]),
+    (6, "Dziennik zdarzeń dla kanału SSE (alerty, przypomnienia notatek)", [
+        """CREATE TABLE IF NOT EXISTS events (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            event_type TEXT NOT NULL,
+            entity_id INTEGER,
+            payload TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )""",
+        "CREATE INDEX IF NOT EXISTS idx_events_created_at ON events(created_at)",
+        """CREATE TRIGGER IF NOT EXISTS alerts_event_insert AFTER INSERT ON alerts BEGIN
+            INSERT INTO events (event_type, entity_id, payload) VALUES ('alert_created', new.id,
+                json_object('id', new.id, 'title', new.title, 'message', new.message,
+                            'priority', new.priority, 'is_read', new.is_read, 'created_at', new.created_at));
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS alerts_event_read AFTER UPDATE OF is_read ON alerts
+        WHEN old.is_read IS NOT new.is_read BEGIN
+            INSERT INTO events (event_type, entity_id, payload) VALUES ('alert_read', new.id,
+                json_object('id', new.id, 'is_read', new.is_read));
+        END""",
+    ]),
+    (7, "Znormalizowany czas przypomnienia notatek z indeksem oczekujących", [
+        "ALTER TABLE notes ADD COLUMN remind_at TEXT",
+        "ALTER TABLE notes ADD COLUMN reminded_at TEXT",
+        # Indeks częściowy - zawiera tylko przypomnienia jeszcze niewykonane
+        """CREATE INDEX IF NOT EXISTS idx_notes_pending_reminders ON notes(remind_at)
+        WHERE is_alert = 1 AND reminded_at IS NULL""",
+        backfill_note_reminders,
+    ]),
+    (8, "Stan dostępności urządzeń (wynik monitora w tle, wspólny dla workerów)", [
+        """CREATE TABLE IF NOT EXISTS device_status (
+            name TEXT PRIMARY KEY,
+            url TEXT NOT NULL,
+            online BOOLEAN NOT NULL DEFAULT FALSE,
+            latency_ms REAL,
+            status_code INTEGER,
+            error TEXT,
+            last_seen TEXT,
+            checked_at TEXT,
+            changed_at TEXT
+        ) WITHOUT ROWID""",
+    ]),
+]
+
+# Wagi bm25 kolumn FTS - trafienie w kodzie części liczy się bardziej niż w notatce
+WAREHOUSE_FTS_WEIGHTS = (5.0, 10.0, 1.0)   # name, code, note
+NOTES_FTS_WEIGHTS = (5.0, 1.0)             # name, text
+HIGHLIGHT_OPEN = '<mark>'
+HIGHLIGHT_CLOSE = '</mark>'
+
+def build_fts_query(text: str) -> Optional[str]:
+    """Zamień tekst wpisany przez użytkownika na zapytanie FTS5 z dopasowaniem prefiksowym.
+
+    Każdy fragment oddzielony spacją staje się frazą z gwiazdką na końcu, więc
+    "MAT/ELE/00" szuka kolejnych tokenów MAT, ELE i prefiksu 00.
+    """
+    phrases = []
+    for chunk in text.split():
+        tokens = re.findall(r'\w+', chunk, flags=re.UNICODE)
+        if tokens:
+            phrases.append('"' + ' '.join(tokens) + '"*')
+    return ' AND '.join(phrases) if phrases else None
+
+# Wywołania DashboardDB (jak w serwerze i wątkach w tle) sprawdzane przez check_query_plans():
+# (nazwa, metoda, argumenty, dopuszczalne skany). Zapytania nie są przepisywane ręcznie -
+# check_query_plans() wykonuje wywołanie na kopii schematu i przechwytuje faktyczne SQL.
+# Dopuszczalne skany: False - żadnych, 'index' - przejście po indeksie (pełna lista
+# w kolejności indeksu), True - świadomie akceptowany pełny skan (małe tabele).
+QUERY_PLAN_CALLS = [
+    ('get_alerts', 'get_alerts', {}, 'index'),
+    ('get_alerts(unread_only)', 'get_alerts', {'unread_only': True}, False),
+    ('get_alerts(priority)', 'get_alerts', {'priority': 1}, False),
+    ('get_alerts(unread_only, priority)', 'get_alerts', {'unread_only': True, 'priority': 1}, False),
+    ('get_alerts(page)', 'get_alerts', {'limit': 100}, 'index'),
+    ('get_alerts(cursor)', 'get_alerts', {'limit': 100, 'after': ('2024-01-01 00:00:00', 1)}, False),
+    ('get_alerts(unread_only, priority, cursor)', 'get_alerts',
+     {'unread_only': True, 'priority': 1, 'limit': 100, 'after': ('2024-01-01 00:00:00', 1)}, False),
+    ('get_works', 'get_works', {'stream': True}, 'index'),
+    ('get_works(status)', 'get_works', {'status': 'pending', 'stream': True}, False),
+    ('get_works(priority)', 'get_works', {'priority': 1, 'stream': True}, False),
+    ('get_works(status, priority)', 'get_works', {'status': 'pending', 'priority': 1, 'stream': True}, False),
+    ('get_works(overdue_only)', 'get_works', {'overdue_only': True, 'stream': True}, 'index'),
+    ('get_works(page)', 'get_works', {'limit': 100}, 'index'),
+    ('get_works(cursor)', 'get_works', {'limit': 100, 'after': ('2024-01-01 00:00:00', 1)}, False),
+    ('get_works(status, cursor)', 'get_works',
+     {'status': 'pending', 'limit': 100, 'after': ('2024-01-01 00:00:00', 1)}, False),
+    ('get_works(priority, cursor)', 'get_works',
+     {'priority': 1, 'limit': 100, 'after': ('2024-01-01 00:00:00', 1)}, False),
+    ('get_notes', 'get_notes', {'stream': True}, 'index'),
+    ('get_notes(page)', 'get_notes', {'limit': 100}, 'index'),
+    ('get_notes(cursor)', 'get_notes', {'limit': 100, 'after': ('2024-01-01 00:00:00', 1)}, False),
+    # Wyniki FTS sortowane wg trafności (bm25) - sortowanie tylko dopasowanych wierszy
+    ('search_notes', 'search_notes', {'search': 'spot'}, True),
+    ('get_note', 'get_note', {'note_id': 1}, False),
+    ('update_note', 'update_note', {'note_id': 1, 'text': 'plan'}, False),
+    ('get_planing', 'get_planing', {}, 'index'),
+    ('get_warehouse_items', 'get_warehouse_items', {'stream': True}, 'index'),
+    ('get_warehouse_items(page)', 'get_warehouse_items', {'limit': 100}, 'index'),
+    ('get_warehouse_items(cursor)', 'get_warehouse_items', {'limit': 100, 'after': ('a', 1)}, False),
+    ('iter_warehouse_items', 'iter_warehouse_items', {}, 'index'),
+    ('search_warehouse_items', 'search_warehouse_items', {'search': 'mat'}, True),
+    ('search_warehouse_items(cursor)', 'search_warehouse_items', {'search': 'mat', 'after': (-1.0, 1)}, True),
+    ('get_warehouse_item', 'get_warehouse_item', {'item_id': 1}, False),
+    ('update_warehouse_quantity', 'update_warehouse_quantity', {'item_id': 1, 'new_quantity': 7}, False),
+    ('upsert_warehouse_items', 'upsert_warehouse_items',
+     {'items': [{'name': 'Plan', 'code': 'MAT/ELE/00123', 'quantity': 3}]}, False),
+    ('adjust_warehouse_quantity', 'adjust_warehouse_quantity',
+     {'item_id': 1, 'delta': 1, 'idempotency_key': 'plan-check'}, False),
+    ('get_warehouse_movements', 'get_warehouse_movements', {'item_id': 1, 'before_id': 100}, False),
+    # Raport magazynu czyta wszystkie ruchy z zakresu w kolejności id
+    ('get_movement_rows', 'get_movement_rows', {'start': 0, 'end': 2000000000}, True),
+    ('get_movement_rows(item)', 'get_movement_rows', {'start': 0, 'end': 2000000000, 'item_id': 1}, False),
+    ('get_users', 'get_users', {}, True),
+    ('get_user_by_username', 'get_user_by_username', {'username': 'admin'}, False),
+    ('get_all_config', 'get_all_config', {}, True),
+    ('get_change_versions', 'get_change_versions', {'tables': ['alerts', 'notes']}, False),
+    ('claim_due_reminders', 'claim_due_reminders', {'limit': 100}, False),
+    ('get_upcoming_reminders', 'get_upcoming_reminders', {'until': '2030-01-01 00:00:00'}, False),
+    ('get_events_after', 'get_events_after', {'last_id': 0}, False),
+    ('get_events_after(types)', 'get_events_after', {'last_id': 0, 'types': ['alert_created']}, False),
+    ('prune_events', 'prune_events', {'max_age_seconds': 86400}, False),
+    ('get_device_status', 'get_device_status', {}, True),
+]
+
+# Instrukcje przechwycone podczas wywołania, które mają plan zapytania
+PLANNED_STATEMENTS = ('SELECT', 'WITH', 'UPDATE', 'DELETE', 'INSERT')
+
+# Stronicowanie kursorem (keyset): kolumny klucza i kierunek sortowania dla każdej listy
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+KEYSET_ORDER = {
+    'alerts': (('created_at', 'id'), True),
+    'works': (('created_at', 'id'), True),
+    'notes': (('created_at', 'id'), True),
+    'warehouse': (('name', 'id'), False),
+    # Wyszukiwanie w magazynie - kolejność wg trafności (bm25), remisy wg id
+    'warehouse_search': (('rank', 'id'), False),
+}
+# Typy wartości kolumn klucza w tokenie kursora (JSON: tekst lub liczba)
+KEYSET_COLUMN_TYPES = {'created_at': str, 'name': str, 'id': int, 'rank': (int, float)}
+
+def encode_cursor(table: str, row: Dict) -> str:
+    """Zakoduj pozycję ostatniego wiersza strony jako nieprzezroczysty token"""
+    columns, _ = KEYSET_ORDER[table]
+    payload = json.dumps([row[column] for column in columns], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+def decode_cursor(table: str, token: str) -> tuple:
+    """Odkoduj token kursora; ValueError gdy token jest nieprawidłowy"""
+    columns, _ = KEYSET_ORDER[table]
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except Exception:
+        raise ValueError("Nieprawidłowy kursor")
+    if not isinstance(values, list) or len(values) != len(columns):
+        raise ValueError("Nieprawidłowy kursor")
+    for column, value in zip(columns, values):
+        # bool to w Pythonie podtyp int - true/false w tokenie nie jest identyfikatorem
+        if not isinstance(value, KEYSET_COLUMN_TYPES[column]) or isinstance(value, bool):
+            raise ValueError("Nieprawidłowy kursor")
+    return tuple(values)
+
+def keyset_order_by(table: str) -> str:
+    columns, descending = KEYSET_ORDER[table]
+    direction = "DESC" if descending else "ASC"
+    return ", ".join(f"{column} {direction}" for column in columns)
+
+def keyset_condition(table: str, after: tuple) -> tuple:
+    """Warunek WHERE wybierający wiersze za pozycją kursora (porównanie krotek)"""
+    columns, descending = KEYSET_ORDER[table]
+    placeholders = ", ".join("?" for _ in columns)
+    operator = "<" if descending else ">"
+    return f" AND ({', '.join(columns)}) {operator} ({placeholders})", list(after)
+
+def next_cursor(table: str, rows: List[Dict], limit: int) -> Optional[str]:
+    """Token następnej strony lub None, gdy strona nie była pełna"""
+    if not rows or len(rows) < limit:
+        return None
+    return encode_cursor(table, rows[-1])
+
+# Powód ruchu magazynowego zapisywany przy zmianach stanu poza /adjust
+MOVEMENT_REASON_SET = 'Ustawienie stanu'
+MOVEMENT_REASON_IMPORT = 'Import'
+
+# Wiersze na porcję przy strumieniowaniu pełnych list (stream=True)
+STREAM_BATCH_SIZE = 500
+
+class RowBatches:
+    """Porcje wierszy pełnej listy dla odpowiedzi strumieniowych, czytane stronami keyset.
+
+    Każda porcja to osobne zapytanie (batch_size wierszy za ostatnim wierszem
+    poprzedniej porcji) na połączeniu wypożyczonym z puli tylko na czas tego
+    zapytania - wolny klient nie trzyma połączenia ani otwartej transakcji
+    odczytu. Pierwsza porcja jest czytana od razu, więc błąd bazy (np. brak
+    wolnego połączenia) wychodzi przed wysłaniem nagłówków odpowiedzi.
+    """
+
+    def __init__(self, fetch: Callable[[Optional[tuple], int], List[sqlite3.Row]], table: str,
+                 batch_size: int = STREAM_BATCH_SIZE):
+        self._fetch = fetch
+        self.table = table
+        self.batch_size = batch_size
+        self._done = False
+        self._next = self._read(None)
+
+    def _read(self, after: Optional[tuple]) -> List[sqlite3.Row]:
+        rows = self._fetch(after, self.batch_size)
+        if len(rows) < self.batch_size:
+            self._done = True
+        return rows
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> List[sqlite3.Row]:
+        rows = self._next
+        if not rows:
+            raise StopIteration
+        if self._done:
+            self._next = []
+        else:
+            columns, _ = KEYSET_ORDER[self.table]
+            self._next = self._read(tuple(rows[-1][column] for column in columns))
+        return rows
+
+    def close(self):
+        self._done = True
+        self._next = []
+
+def apply_pragmas(conn: sqlite3.Connection, pragmas: Dict[str, Any]):
+    """Nałóż ustawienia PRAGMA na połączenie"""
+    for name, value in pragmas.items():
+        conn.execute(f"PRAGMA {name} = {value}").fetchall()
+
+class CheckpointScheduler:
+    """Wątek w tle okresowo wykonujący checkpoint WAL, by plik -wal nie rósł bez końca"""
+
+    def __init__(self, db_path: str, interval: float = 30.0,
+                 wal_size_limit: int = 32 * 1024 * 1024):
+        self.db_path = db_path
+        self.interval = interval
+        self.wal_size_limit = wal_size_limit
+        self._stop = threading.Event()
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._stats = {
+            'checkpoints': 0,
+            'truncates': 0,
+            'busy': 0,
+            'errors': 0,
+            'last_checkpoint': None,
+            'last_wal_size': 0,
+        }
+
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    def start(self):
+        """Uruchom wątek (ponownie po fork() - wątki nie przechodzą do procesu potomnego)"""
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='wal-checkpoint', daemon=True)
+            self._thread.start()
+
+    def _after_fork(self):
+        """Proces potomny (np. worker gunicorna z --preload) nie ma wątku rodzica - uruchom własny"""
+        if self._thread is not None and not self._stop.is_set():
+            # Blokada mogła zostać skopiowana w stanie zajętym przez inny wątek rodzica
+            self._lock = threading.Lock()
+            self.start()
+
+    def stop(self):
+        """Zatrzymaj wątek i wykonaj ostatni checkpoint"""
+        self._stop.set()
+        if self._thread is not None and self._pid == os.getpid():
+            self._thread.join(timeout=self.interval)
+            self.checkpoint('TRUNCATE')
+
+    def wal_size(self) -> int:
+        try:
+            return os.path.getsize(self.db_path + '-wal')
+        except OSError:
+            return 0
+
+    def checkpoint(self, mode: Optional[str] = None) -> Optional[tuple]:
+        """Wykonaj checkpoint; TRUNCATE gdy plik -wal przekroczył limit"""
+        wal_size = self.wal_size()
+        if mode is None:
+            mode = 'TRUNCATE' if wal_size > self.wal_size_limit else 'PASSIVE'
+        try:
+            conn = sqlite3.connect(self.db_path, timeout=5.0)
+            try:
+                busy, log_pages, checkpointed = conn.execute(
+                    f"PRAGMA wal_checkpoint({mode})").fetchone()
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            self._stats['errors'] += 1
+            logger.warning(f"⚠️ Checkpoint WAL nieudany: {e}")
+            return None
+
+        self._stats['checkpoints'] += 1
+        if mode == 'TRUNCATE':
+            self._stats['truncates'] += 1
+        if busy:
+            self._stats['busy'] += 1
+        self._stats['last_checkpoint'] = datetime.now().isoformat()
+        self._stats['last_wal_size'] = wal_size
+        return busy, log_pages, checkpointed
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.checkpoint()
+
+    def stats(self) -> Dict[str, Any]:
+        stats = dict(self._stats)
+        stats['wal_size'] = self.wal_size()
+        stats['running'] = self._thread is not None and self._thread.is_alive()
+        return stats
+
+class ConfigCache:
+    """Kopia tabeli config w pamięci procesu.
+
+    Odczyty to wyszukiwania w słowniku. Co najwyżej raz na max_staleness sekund
+    sprawdzany jest licznik w change_versions (zmieniany triggerami), więc zmiana
+    zapisana przez inny worker jest widoczna najpóźniej po max_staleness sekundach.
+    """
+
+    def __init__(self, db: 'DashboardDB', max_staleness: float = 1.0):
+        self.db = db
+        self.max_staleness = max_staleness
+        self._lock = threading.Lock()
+        self._values: Optional[Dict[str, str]] = None
+        self._version: Optional[int] = None
+        self._checked_at = 0.0
+        self._stats = {'hits': 0, 'version_checks': 0, 'reloads': 0, 'write_through': 0}
+
+    def read_version(self, conn) -> int:
+        row = conn.execute(
+            "SELECT version FROM change_versions WHERE table_name = 'config'"
+        ).fetchone()
+        return row[0] if row else 0
+
+    def _reload(self, conn):
+        # Wersja i dane w jednej transakcji odczytu - spójna migawka
+        conn.execute("BEGIN")
+        try:
+            version = self.read_version(conn)
+            values = {
+                row['config_key']: row['config_value']
+                for row in conn.execute("SELECT config_key, config_value FROM config")
+            }
+        finally:
+            conn.rollback()
+        self._values = values
+        self._version = version
+        self._stats['reloads'] += 1
+
+    def snapshot(self) -> Dict[str, str]:
+        """Aktualna konfiguracja (nie starsza niż max_staleness)"""
+        now = time.monotonic()
+        values = self._values
+        if values is not None and now - self._checked_at < self.max_staleness:
+            self._stats['hits'] += 1
+            return values
+
+        with self._lock:
+            if self._values is None or time.monotonic() - self._checked_at >= self.max_staleness:
+                conn = self.db.get_connection()
+                try:
+                    self._stats['version_checks'] += 1
+                    if self._values is None or self.read_version(conn) != self._version:
+                        self._reload(conn)
+                finally:
+                    conn.close()
+                self._checked_at = time.monotonic()
+            return self._values
+
+    def write_through(self, key: str, value: str, version: int):
+        """Nanieś własny zapis bez przeładowania, jeśli nikt inny nie pisał w międzyczasie"""
+        with self._lock:
+            if self._values is not None and self._version is not None and version == self._version + 1:
+                values = dict(self._values)
+                values[key] = value
+                self._values = values
+                self._version = version
+                self._checked_at = time.monotonic()
+                self._stats['write_through'] += 1
+            else:
+                self.invalidate()
+
+    def invalidate(self):
+        self._values = None
+        self._version = None
+        self._checked_at = 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        stats = dict(self._stats)
+        stats['version'] = self._version
+        stats['loaded'] = self._values is not None
+        stats['max_staleness'] = self.max_staleness
+        return stats
+
+class PoolTimeout(sqlite3.OperationalError):
+    """Brak wolnego połączenia w puli w czasie timeout (serwer przeciążony - klient może ponowić)"""
+
+class PooledConnection:
+    """Połączenie wypożyczone z puli - close() oddaje je do puli zamiast zamykać"""
+
+    def __init__(self, pool: 'ConnectionPool', conn: sqlite3.Connection):
+        self._pool = pool
+        self._conn = conn
+
+    def close(self):
+        """Zwróć połączenie do puli"""
+        conn, self._conn = self._conn, None
+        if conn is not None:
+            self._pool.release(conn)
+
+    def __getattr__(self, name):
+        if self._conn is None:
+            raise sqlite3.ProgrammingError("Połączenie zostało już zwrócone do puli")
+        return getattr(self._conn, name)
+
+    def __enter__(self):
+        return self._conn.__enter__()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return self._conn.__exit__(exc_type, exc_value, traceback)
+
+    def __del__(self):
+        # Zabezpieczenie przed wyciekiem - ścieżki błędów nie zawsze wołają close()
+        try:
+            self.close()
+        except Exception:
+            pass
+
+class ConnectionPool:
+    """Ograniczona pula połączeń SQLite współdzielona przez wątki jednego procesu"""
+
+    def __init__(self, db_path: str, max_size: int = 8, timeout: float = 10.0,
+                 health_check_interval: float = 30.0, pragmas: Optional[Dict[str, Any]] = None):
+        self.db_path = db_path
+        self.max_size = max_size
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+        self.pragmas = pragmas or {}
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        """Wyczyść stan puli (także po fork() w workerze gunicorna)"""
+        self._pid = os.getpid()
+        self._idle = queue.LifoQueue()
+        self._size = 0
+        self._closed = False
+        self._stats = {
+            'acquired': 0,
+            'hits': 0,
+            'created': 0,
+            'discarded': 0,
+            'waits': 0,
+            'timeouts': 0,
+            'wait_time_total': 0.0,
+            'wait_time_max': 0.0,
+        }
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=self.timeout, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        try:
+            apply_pragmas(conn, self.pragmas)
+        except sqlite3.Error:
+            conn.close()
+            raise
+        return conn
+
+    def _is_healthy(self, conn: sqlite3.Connection, idle_since: float) -> bool:
+        if time.monotonic() - idle_since < self.health_check_interval:
+            return True
+        try:
+            conn.execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def _discard(self, conn: sqlite3.Connection):
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+        with self._lock:
+            self._size -= 1
+            self._stats['discarded'] += 1
+
+    def acquire(self) -> PooledConnection:
+        """Wypożycz połączenie z puli (tworzy nowe, jeśli pula nie jest pełna)"""
+        if self._pid != os.getpid():
+            # Połączeń SQLite nie wolno dzielić między procesami
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._reset()
+        if self._closed:
+            raise sqlite3.ProgrammingError("Pula połączeń została zamknięta")
+
+        with self._lock:
+            self._stats['acquired'] += 1
+
+        while True:
+            try:
+                conn, idle_since = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            if self._is_healthy(conn, idle_since):
+                with self._lock:
+                    self._stats['hits'] += 1
+                return PooledConnection(self, conn)
+            self._discard(conn)
+
+        with self._lock:
+            can_create = self._size < self.max_size
+            if can_create:
+                self._size += 1
+                self._stats['created'] += 1
+        if can_create:
+            try:
+                return PooledConnection(self, self._connect())
+            except Exception:
+                with self._lock:
+                    self._size -= 1
+                raise
+
+        # Pula pełna - czekamy na zwrot połączenia przez inny wątek
+        started = time.monotonic()
+        try:
+            conn, _ = self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            with self._lock:
+                self._stats['timeouts'] += 1
+            raise PoolTimeout(
+                f"Przekroczono czas oczekiwania na połączenie z puli ({self.timeout}s)")
+        waited = time.monotonic() - started
+        with self._lock:
+            self._stats['waits'] += 1
+            self._stats['hits'] += 1
+            self._stats['wait_time_total'] += waited
+            self._stats['wait_time_max'] = max(self._stats['wait_time_max'], waited)
+        return PooledConnection(self, conn)
+
+    def release(self, conn: sqlite3.Connection):
+        """Oddaj połączenie do puli"""
+        if self._closed or self._pid != os.getpid():
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+            return
+        try:
+            # Niezatwierdzona transakcja nie może przejść do kolejnego użytkownika
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            self._discard(conn)
+            return
+        self._idle.put((conn, time.monotonic()))
+
+    def close_all(self):
+        """Zamknij wszystkie bezczynne połączenia i zablokuj pulę"""
+        self._closed = True
+        while True:
+            try:
+                conn, _ = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+            with self._lock:
+                self._size -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Statystyki puli: trafienia, oczekiwania, rozmiar"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['size'] = self._size
+        stats['idle'] = self._idle.qsize()
+        stats['in_use'] = stats['size'] - stats['idle']
+        stats['max_size'] = self.max_size
+        stats['hit_rate'] = round(stats['hits'] / stats['acquired'], 4) if stats['acquired'] else 0.0
+        stats['wait_time_avg'] = stats['wait_time_total'] / stats['waits'] if stats['waits'] else 0.0
+        return stats
+
 class DashboardDB:
-    def __init__(self, db_path='dashboard.db', auto_init=True):
+    def __init__(self, db_path='dashboard.db', auto_init=True, pool_size: int = 8,
+                 pool_timeout: float = 10.0, storage_profile: str = 'wal',
+                 pragmas: Optional[Dict[str, Any]] = None, checkpoint_interval: float = 30.0,
+                 config_max_staleness: float = 1.0):
         self.db_path = db_path
         self._initialized = False
-        
+
+        if storage_profile not in STORAGE_PROFILES:
+            raise ValueError(f"Nieznany profil bazy danych: {storage_profile}")
+        self.storage_profile = storage_profile
+        self.pragmas = {**STORAGE_PROFILES[storage_profile], **(pragmas or {})}
+
+        self.pool = ConnectionPool(db_path, max_size=pool_size, timeout=pool_timeout,
+                                   pragmas=self.pragmas)
+        self.checkpointer = None
+        self.config_cache = ConfigCache(self, max_staleness=config_max_staleness)
+        if str(self.pragmas.get('journal_mode', '')).upper() == 'WAL' and checkpoint_interval:
+            self.checkpointer = CheckpointScheduler(db_path, interval=checkpoint_interval)
+        atexit.register(self.close)
+
         if auto_init:
             self.init_db()
+        if self.checkpointer is not None:
+            self.checkpointer.start()
+
+    def close(self):
+        """Zamknij pulę połączeń (wywoływane przy zamykaniu procesu)"""
+        if self.checkpointer is not None:
+            self.checkpointer.stop()
+        self.pool.close_all()
+
+    def pool_stats(self) -> Dict[str, Any]:
+        """Statystyki puli połączeń"""
+        return self.pool.stats()
+
+    def storage_stats(self) -> Dict[str, Any]:
+        """Aktywny profil PRAGMA i stan checkpointów WAL"""
+        return {
+            'profile': self.storage_profile,
+            'pragmas': self.pragmas,
+            'checkpoint': self.checkpointer.stats() if self.checkpointer is not None else None
+        }
     
-    def init_db(self):
+    def init_db(self, check_plans: bool = True):
         """Inicjalizacja bazy danych przy pierwszym uruchomieniu"""
         if self._initialized:
             return
             
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self.get_connection()
             cursor = conn.cursor()
             
             # ALERTY - USUŃ KOMENTARZE W ŚRODKU ZAPYTANIA
@@ -116,6 +932,9 @@ class DashboardDB:
             )
             ''')
             
+            # Indeksy i pozostałe zmiany schematu
+            self._apply_migrations(cursor)
+            
             # Przykładowe dane
             self._seed_example_data(cursor)
             
@@ -123,11 +942,113 @@ class DashboardDB:
             conn.close()
             self._initialized = True
             logger.info("✅ Baza danych zainicjalizowana pomyślnie")
+            
+            # Ostrzeżenia w logu, jeśli któreś zapytanie straciło indeks
+            if check_plans:
+                self.check_query_plans()
         
         except Exception as e:
             logger.error(f"❌ Błąd inicjalizacji bazy danych: {e}")
             raise
         
+    def _apply_migrations(self, cursor):
+        """Wykonaj brakujące zmiany schematu z SCHEMA_MIGRATIONS"""
+        cursor.execute("PRAGMA user_version")
+        current_version = cursor.fetchone()[0]
+        
+        for version, description, statements in SCHEMA_MIGRATIONS:
+            if version <= current_version:
+                continue
+            for statement in statements:
+                # Zmiana danych, której nie da się zapisać w SQL, jest funkcją przyjmującą kursor
+                if callable(statement):
+                    statement(cursor)
+                else:
+                    cursor.execute(statement)
+            cursor.execute(f"PRAGMA user_version = {version}")
+            logger.info(f"✅ Schemat bazy zaktualizowany do wersji {version}: {description}")
+    
+    def _capture_statements(self, calls=QUERY_PLAN_CALLS) -> List[tuple]:
+        """Wykonaj wywołania na pustej kopii schematu i przechwyć wysłane SQL (set_trace_callback).
+
+        Zwraca listę (nazwa, dopuszczalne skany, lista instrukcji lub wyjątek). Kopia ma
+        jedno połączenie w puli - to samo dla wszystkich wywołań, więc callback widzi całość;
+        metody zapisujące (przypomnienia, stany magazynu) nie zmieniają tej bazy.
+        """
+        results = []
+        with tempfile.TemporaryDirectory() as directory:
+            copy = DashboardDB(os.path.join(directory, 'plans.db'), auto_init=False, pool_size=1,
+                               pool_timeout=1.0, storage_profile=self.storage_profile, checkpoint_interval=0)
+            try:
+                copy.init_db(check_plans=False)
+                statements = []
+                conn = copy.get_connection()
+                conn.set_trace_callback(statements.append)
+                conn.close()
+                for name, method, kwargs, allow_scan in calls:
+                    statements.clear()
+                    try:
+                        result = getattr(copy, method)(**kwargs)
+                        if hasattr(result, '__next__'):
+                            for _ in result:
+                                pass
+                    except Exception as e:
+                        results.append((name, allow_scan, e))
+                        continue
+                    planned = []
+                    for statement in statements:
+                        statement = statement.strip()
+                        # Instrukcje wyzwalaczy ("-- TRIGGER ...") mają plan w instrukcji nadrzędnej
+                        if statement.upper().startswith(PLANNED_STATEMENTS) and statement not in planned:
+                            planned.append(statement)
+                    results.append((name, allow_scan, planned))
+            finally:
+                copy.close()
+        return results
+    
+    def check_query_plans(self) -> List[Dict]:
+        """Sprawdź EXPLAIN QUERY PLAN zapytań faktycznie wykonywanych przez metody DashboardDB.
+
+        Pełny skan to SCAN tabeli - także po indeksie (przejście całego indeksu), chyba że
+        wywołanie dopuszcza 'index'. Sortowanie w TEMP B-TREE zawsze oznacza brak indeksu.
+        """
+        report = []
+        captured = self._capture_statements()
+        # Osobne połączenie: EXPLAIN z cache instrukcji połączenia z puli pokazuje plan
+        # sprzed zmiany schematu (np. usunięcia indeksu)
+        conn = self.pool._connect()
+        try:
+            for name, allow_scan, statements in captured:
+                if isinstance(statements, Exception):
+                    report.append({'query': name, 'sql': None, 'plan': [], 'error': str(statements),
+                                   'allowed': allow_scan, 'ok': False})
+                    continue
+                for statement in statements:
+                    plan = [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {statement}").fetchall()]
+                    scans = [step for step in plan if step.startswith('SCAN ') and ' VIRTUAL TABLE ' not in step]
+                    full_scans = [step for step in scans if ' USING ' not in step]
+                    index_scans = [step for step in scans if ' USING ' in step]
+                    temp_sorts = [step for step in plan if 'TEMP B-TREE' in step]
+                    report.append({
+                        'query': name,
+                        'sql': statement,
+                        'plan': plan,
+                        'full_scan': bool(full_scans),
+                        'index_scan': bool(index_scans),
+                        'temp_sort': bool(temp_sorts),
+                        'allowed': allow_scan,
+                        'ok': allow_scan is True or not (
+                            full_scans or temp_sorts or (index_scans and allow_scan != 'index'))
+                    })
+        finally:
+            conn.close()
+        
+        for entry in report:
+            if not entry['ok']:
+                logger.warning(f"⚠️ Zapytanie {entry['query']} bez indeksu: "
+                               f"{entry.get('error') or '; '.join(entry['plan'])}")
+        return report
+    
     def _seed_example_data(self, cursor):
         """Wstaw przykładowe dane przy pierwszym uruchomieniu"""
         try:
@@ -230,19 +1151,35 @@ class DashboardDB:
             raise
     
     def get_connection(self):
-        """Pobierz połączenie z bazą"""
+        """Pobierz połączenie z puli (conn.close() oddaje je do puli)"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            conn.row_factory = sqlite3.Row
-            return conn
+            return self.pool.acquire()
         except Exception as e:
             logger.error(f"❌ Błąd połączenia z bazą: {e}")
             raise
     
+    def _keyset_batches(self, table: str, query: str, params: List) -> RowBatches:
+        """Pełna lista strumieniowo: query (SELECT ... WHERE ...) czytane porcjami w kolejności KEYSET_ORDER"""
+        def fetch(after: Optional[tuple], limit: int) -> List[sqlite3.Row]:
+            sql, sql_params = query, list(params)
+            if after is not None:
+                condition, condition_params = keyset_condition(table, after)
+                sql += condition
+                sql_params.extend(condition_params)
+            sql += f" ORDER BY {keyset_order_by(table)} LIMIT ?"
+            sql_params.append(limit)
+            conn = self.get_connection()
+            try:
+                return conn.execute(sql, sql_params).fetchall()
+            finally:
+                conn.close()
+        return RowBatches(fetch, table)
+    
     # ALERTY
     def get_alerts(self, unread_only: bool = False, priority: Optional[int] = None, 
-                  limit: Optional[int] = None, order_by: str = "created_at DESC") -> List[Dict]:
-        """Pobierz alerty z bazy danych"""
+                  limit: Optional[int] = None, order_by: str = "created_at DESC, id DESC",
+                  after: Optional[tuple] = None) -> List[Dict]:
+        """Pobierz alerty z bazy danych (after - pozycja z decode_cursor)"""
         try:
             conn = self.get_connection()
             cursor = conn.cursor()
@@ -257,6 +1194,12 @@ class DashboardDB:
                 query += " AND priority = ?"
                 params.append(priority)
             
+            if after is not None:
+                condition, condition_params = keyset_condition('alerts', after)
+                query += condition
+                params.extend(condition_params)
+                order_by = keyset_order_by('alerts')
+            
             query += f" ORDER BY {order_by}"
             
             if limit:
@@ -268,6 +1211,8 @@ class DashboardDB:
             conn.close()
             return results
             
+        except PoolTimeout:
+            raise
         except Exception as e:
             logger.error(f"❌ Błąd pobierania alertów: {e}")
             return []
@@ -288,12 +1233,15 @@ class DashboardDB:
     # PRACE
     def get_works(self, status: Optional[str] = None, priority: Optional[int] = None,
                  assigned_to: Optional[str] = None, overdue_only: bool = False,
-                 order_by: str = "created_at DESC") -> List[Dict]:
-        """Pobierz zadania z bazy danych"""
+                 order_by: str = "created_at DESC, id DESC", limit: Optional[int] = None,
+                 after: Optional[tuple] = None, stream: bool = False) -> List[sqlite3.Row]:
+        """Pobierz zadania z bazy danych (after - pozycja z decode_cursor).
+
+        Zwraca wiersze sqlite3.Row (dostęp po nazwie kolumny) - trafiają do
+        serializera JSON bez kopiowania do słowników. Ze stream=True zwraca
+        RowBatches zamiast listy.
+        """
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            
             query = "SELECT * FROM works WHERE 1=1"
             params = []
             
@@ -312,29 +1260,67 @@ class DashboardDB:
             if overdue_only:
                 query += " AND deadline < DATE('now') AND status != 'completed'"
             
+            if stream:
+                return self._keyset_batches('works', query, params)
+            
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            
+            if after is not None:
+                condition, condition_params = keyset_condition('works', after)
+                query += condition
+                params.extend(condition_params)
+                order_by = keyset_order_by('works')
+            
             query += f" ORDER BY {order_by}"
             
+            if limit:
+                query += " LIMIT ?"
+                params.append(limit)
+            
             cursor.execute(query, params)
-            results = [dict(row) for row in cursor.fetchall()]
+            results = cursor.fetchall()
             conn.close()
             return results
             
+        except PoolTimeout:
+            raise
         except Exception as e:
             logger.error(f"❌ Błąd pobierania zadań: {e}")
             return []
     
     # NOTATKI - ZAKTUALIZOWANE METODY
-    def get_notes(self) -> List[Dict]:
-        """Pobierz wszystkie notatki z bazy danych"""
+    def get_notes(self, limit: Optional[int] = None, after: Optional[tuple] = None,
+                  stream: bool = False) -> List[Dict]:
+        """Pobierz notatki z bazy danych (wszystkie lub stronę od pozycji after; stream jak w get_works)"""
         try:
+            query = "SELECT * FROM notes WHERE 1=1"
+            params = []
+            
+            if stream:
+                return self._keyset_batches('notes', query, params)
+            
             conn = self.get_connection()
             cursor = conn.cursor()
             
-            cursor.execute("SELECT * FROM notes ORDER BY created_at DESC")
+            if after is not None:
+                condition, condition_params = keyset_condition('notes', after)
+                query += condition
+                params.extend(condition_params)
+            
+            query += f" ORDER BY {keyset_order_by('notes')}"
+            
+            if limit:
+                query += " LIMIT ?"
+                params.append(limit)
+            
+            cursor.execute(query, params)
             results = [dict(row) for row in cursor.fetchall()]
             conn.close()
             return results
             
+        except PoolTimeout:
+            raise
         except Exception as e:
             logger.error(f"❌ Błąd pobierania notatek: {e}")
             return []
@@ -347,9 +1333,9 @@ class DashboardDB:
             cursor = conn.cursor()
             
             cursor.execute(
-                """INSERT INTO notes (name, text, is_alert, is_planing, alert_time) 
-                VALUES (?, ?, ?, ?, ?)""",
-                (name, text, is_alert, is_planing, alert_time)
+                """INSERT INTO notes (name, text, is_alert, is_planing, alert_time, remind_at) 
+                VALUES (?, ?, ?, ?, ?, ?)""",
+                (name, text, is_alert, is_planing, alert_time, normalize_alert_time(alert_time))
             )
             conn.commit()
             note_id = cursor.lastrowid
@@ -364,8 +1350,8 @@ class DashboardDB:
     
     def update_note(self, note_id: int, name: Optional[str] = None, text: Optional[str] = None,
                    is_alert: Optional[bool] = None, is_planing: Optional[bool] = None,
-                   alert_time: Optional[str] = None) -> bool:
-        """Aktualizuje notatkę w bazie danych"""
+                   alert_time: Optional[str] = None) -> Optional[Dict]:
+        """Aktualizuje notatkę; zwraca zaktualizowany wiersz lub None (brak notatki/błąd)"""
         try:
             conn = self.get_connection()
             cursor = conn.cursor()
@@ -387,27 +1373,62 @@ class DashboardDB:
                 update_fields.append("is_planing = ?")
                 params.append(1 if is_planing else 0)
             if alert_time is not None:
-                update_fields.append("alert_time = ?")
-                params.append(alert_time)
+                # Nowy termin - przypomnienie zostanie wykonane ponownie
+                update_fields.append("alert_time = ?, remind_at = ?, reminded_at = NULL")
+                params.extend([alert_time, normalize_alert_time(alert_time)])
             
             if not update_fields:
                 logger.warning("⚠️ Brak pól do aktualizacji")
-                return False
+                conn.close()
+                return None
                 
             update_fields.append("updated_at = datetime('now')")
             params.append(note_id)
             
-            query = f"UPDATE notes SET {', '.join(update_fields)} WHERE id = ?"
+            query = f"UPDATE notes SET {', '.join(update_fields)} WHERE id = ? RETURNING *"
             cursor.execute(query, params)
+            row = cursor.fetchone()
             conn.commit()
             conn.close()
             
+            if row is None:
+                logger.warning(f"⚠️ Notatka {note_id} nie istnieje")
+                return None
+            
             logger.info(f"✅ Zaktualizowano notatkę ID: {note_id}")
-            return True
+            return dict(row)
             
+        except PoolTimeout:
+            raise
         except Exception as e:
             logger.error(f"❌ Błąd podczas aktualizacji notatki {note_id}: {e}")
-            return False
+            return None
+    
+    def get_note(self, note_id: int) -> Optional[Dict]:
+        """Pobierz jedną notatkę po ID"""
+        try:
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            
+            cursor.execute("SELECT * FROM notes WHERE id = ?", (note_id,))
+            result = cursor.fetchone()
+            conn.close()
+            
+            return dict(result) if result else None
+            
+        except PoolTimeout:
+            raise
+        except Exception as e:
+            logger.error(f"❌ Błąd pobierania notatki {note_id}: {e}")
+            return None
+    
+    def note_exists(self, note_id: int) -> bool:
+        """Sprawdź czy notatka istnieje (wyszukiwanie po kluczu głównym)"""
+        conn = self.get_connection()
+        try:
+            return conn.execute("SELECT 1 FROM notes WHERE id = ?", (note_id,)).fetchone() is not None
+        finally:
+            conn.close()
     
     def delete_note(self, note_id: int) -> bool:
         """Usuwa notatkę z bazy danych"""
@@ -416,16 +1437,52 @@ class DashboardDB:
             cursor = conn.cursor()
             
             cursor.execute("DELETE FROM notes WHERE id = ?", (note_id,))
+            deleted = cursor.rowcount > 0
             conn.commit()
             conn.close()
             
-            logger.info(f"✅ Usunięto notatkę ID: {note_id}")
-            return True
+            if deleted:
+                logger.info(f"✅ Usunięto notatkę ID: {note_id}")
+            return deleted
             
+        except PoolTimeout:
+            raise
         except Exception as e:
             logger.error(f"❌ Błąd usuwania notatki {note_id}: {e}")
             return False
     
+    def search_notes(self, search: str, limit: int = DEFAULT_PAGE_SIZE) -> List[Dict]:
+        """Wyszukiwanie pełnotekstowe w notatkach - wyniki wg trafności z fragmentami tekstu"""
+        try:
+            match = build_fts_query(search)
+            if match is None:
+                return []
+            
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            
+            cursor.execute(
+                f"""SELECT n.*,
+                    bm25(notes_fts, {', '.join(map(str, NOTES_FTS_WEIGHTS))}) AS rank,
+                    highlight(notes_fts, 0, ?, ?) AS name_highlight,
+                    snippet(notes_fts, 1, ?, ?, '…', 16) AS text_snippet
+                FROM notes_fts
+                JOIN notes n ON n.id = notes_fts.rowid
+                WHERE notes_fts MATCH ?
+                ORDER BY rank
+                LIMIT ?""",
+                (HIGHLIGHT_OPEN, HIGHLIGHT_CLOSE) * 2 + (match, limit)
+            )
+            results = [dict(row) for row in cursor.fetchall()]
+            conn.close()
+            return results
+            
+        except PoolTimeout:
+            raise
+        except Exception as e:
+            logger.error(f"❌ Błąd wyszukiwania notatek '{search}': {e}")
+            return []
+    
     # PLANOWANIE - ZAKTUALIZOWANE METODY
     def get_planing(self) -> List[Dict]:
         """Pobierz elementy planowania z bazy danych"""
@@ -438,6 +1495,8 @@ class DashboardDB:
             conn.close()
             return results
             
+        except PoolTimeout:
+            raise
         except Exception as e:
             logger.error(f"❌ Błąd pobierania planowania: {e}")
             return []
@@ -488,12 +1547,16 @@ class DashboardDB:
             
             query = f"UPDATE planning SET {', '.join(update_fields)} WHERE id = ?"
             cursor.execute(query, params)
+            updated = cursor.rowcount > 0
             conn.commit()
             conn.close()
             
-            logger.info(f"✅ Zaktualizowano element planowania ID: {planing_id}")
-            return True
+            if updated:
+                logger.info(f"✅ Zaktualizowano element planowania ID: {planing_id}")
+            return updated
             
+        except PoolTimeout:
+            raise
         except Exception as e:
             logger.error(f"❌ Błąd aktualizacji elementu planowania {planing_id}: {e}")
             return False
@@ -505,130 +1568,146 @@ class DashboardDB:
             cursor = conn.cursor()
             
             cursor.execute("DELETE FROM planning WHERE id = ?", (planing_id,))
+            deleted = cursor.rowcount > 0
             conn.commit()
             conn.close()
             
-            logger.info(f"✅ Usunięto element planowania ID: {planing_id}")
-            return True
+            if deleted:
+                logger.info(f"✅ Usunięto element planowania ID: {planing_id}")
+            return deleted
             
+        except PoolTimeout:
+            raise
         except Exception as e:
             logger.error(f"❌ Błąd usuwania elementu planowania {planing_id}: {e}")
             return False
     
     # MAGAZYN
-    def get_warehouse_items(self, search: Optional[str] = None, 
-                           order_by: str = "name ASC") -> List[Dict]:
-        """Pobierz elementy magazynu"""
+    def get_warehouse_items(self, order_by: str = "name ASC, id ASC", limit: Optional[int] = None,
+                           after: Optional[tuple] = None, stream: bool = False) -> List[sqlite3.Row]:
+        """Pobierz elementy magazynu (after - pozycja z decode_cursor); wiersze i stream jak w get_works"""
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            
             query = "SELECT * FROM warehouse WHERE 1=1"
             params = []
             
-            if search:
-                query += " AND (name LIKE ? OR code LIKE ? OR note LIKE ?)"
-                params.extend([f"%{search}%", f"%{search}%", f"%{search}%"])
+            if stream:
+                return self._keyset_batches('warehouse', query, params)
+            
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            
+            if after is not None:
+                condition, condition_params = keyset_condition('warehouse', after)
+                query += condition
+                params.extend(condition_params)
+                order_by = keyset_order_by('warehouse')
             
             query += f" ORDER BY {order_by}"
             
+            if limit:
+                query += " LIMIT ?"
+                params.append(limit)
+            
             cursor.execute(query, params)
-            results = [dict(row) for row in cursor.fetchall()]
+            results = cursor.fetchall()
             conn.close()
             return results
             
+        except PoolTimeout:
+            raise
         except Exception as e:
             logger.error(f"❌ Błąd pobierania elementów magazynu: {e}")
             return []
-        
-    # W klasie DashboardDB dodaj te metody:
+    
+    def search_warehouse_items(self, search: str, limit: int = DEFAULT_PAGE_SIZE,
+                               after: Optional[tuple] = None) -> List[Dict]:
+        """Wyszukiwanie pełnotekstowe w magazynie - wyniki wg trafności z podświetleniem.
 
-def add_note(self, name: str, text: str = "", is_alert: bool = False, 
-            is_planing: bool = False, alert_time: str = "") -> int:
-    """Dodaj nową notatkę do bazy danych"""
-    try:
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute(
-            """INSERT INTO notes (name, text, is_alert, is_planing, alert_time) 
-            VALUES (?, ?, ?, ?, ?)""",
-            (name, text, is_alert, is_planing, alert_time)
-        )
-        conn.commit()
-        note_id = cursor.lastrowid
-        conn.close()
-        
-        logger.info(f"✅ Dodano nową notatkę: {name} (ID: {note_id})")
-        return note_id
-        
-    except Exception as e:
-        logger.error(f"❌ Błąd dodawania notatki: {e}")
-        raise
-
-def update_note(self, note_id: int, name: Optional[str] = None, text: Optional[str] = None,
-               is_alert: Optional[bool] = None, is_planing: Optional[bool] = None,
-               alert_time: Optional[str] = None) -> bool:
-    """Aktualizuje notatkę w bazie danych"""
-    try:
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        # Budujemy zapytanie dynamicznie na podstawie podanych parametrów
-        update_fields = []
-        params = []
-        
-        if name is not None:
-            update_fields.append("name = ?")
-            params.append(name)
-        if text is not None:
-            update_fields.append("text = ?")
-            params.append(text)
-        if is_alert is not None:
-            update_fields.append("is_alert = ?")
-            params.append(1 if is_alert else 0)
-        if is_planing is not None:
-            update_fields.append("is_planing = ?")
-            params.append(1 if is_planing else 0)
-        if alert_time is not None:
-            update_fields.append("alert_time = ?")
-            params.append(alert_time)
-        
-        if not update_fields:
-            logger.warning("⚠️ Brak pól do aktualizacji")
-            return False
+        after - pozycja (rank, id) ostatniego wyniku poprzedniej strony (decode_cursor('warehouse_search')).
+        """
+        try:
+            match = build_fts_query(search)
+            if match is None:
+                return []
             
-        update_fields.append("updated_at = datetime('now')")
-        params.append(note_id)
-        
-        query = f"UPDATE notes SET {', '.join(update_fields)} WHERE id = ?"
-        cursor.execute(query, params)
-        conn.commit()
-        conn.close()
-        
-        logger.info(f"✅ Zaktualizowano notatkę ID: {note_id}")
-        return True
-        
-    except Exception as e:
-        logger.error(f"❌ Błąd podczas aktualizacji notatki {note_id}: {e}")
-        return False
-
-def delete_note(self, note_id: int) -> bool:
-    """Usuwa notatkę z bazy danych"""
-    try:
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            
+            rank = f"bm25(warehouse_fts, {', '.join(map(str, WAREHOUSE_FTS_WEIGHTS))})"
+            params = (HIGHLIGHT_OPEN, HIGHLIGHT_CLOSE) * 3 + (match,)
+            condition = ""
+            if after is not None:
+                # Ukryta kolumna rank tabeli FTS to bm25 bez wag - porównanie z pełnym wyrażeniem
+                condition = f" AND ({rank}, w.id) > (?, ?)"
+                params += tuple(after)
+            
+            cursor.execute(
+                f"""SELECT w.*,
+                    {rank} AS rank,
+                    highlight(warehouse_fts, 0, ?, ?) AS name_highlight,
+                    highlight(warehouse_fts, 1, ?, ?) AS code_highlight,
+                    snippet(warehouse_fts, 2, ?, ?, '…', 12) AS note_snippet
+                FROM warehouse_fts
+                JOIN warehouse w ON w.id = warehouse_fts.rowid
+                WHERE warehouse_fts MATCH ?{condition}
+                ORDER BY rank, w.id
+                LIMIT ?""",
+                params + (limit,)
+            )
+            results = [dict(row) for row in cursor.fetchall()]
+            conn.close()
+            return results
+            
+        except PoolTimeout:
+            raise
+        except Exception as e:
+            logger.error(f"❌ Błąd wyszukiwania w magazynie '{search}': {e}")
+            return []
+    
+    def get_warehouse_item(self, item_id: int) -> Optional[Dict]:
+        """Pobierz jeden element magazynu po ID"""
+        try:
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            
+            cursor.execute("SELECT * FROM warehouse WHERE id = ?", (item_id,))
+            result = cursor.fetchone()
+            conn.close()
+            
+            return dict(result) if result else None
+            
+        except PoolTimeout:
+            raise
+        except Exception as e:
+            logger.error(f"❌ Błąd pobierania elementu magazynu {item_id}: {e}")
+            return None
+    
+    def warehouse_code_exists(self, code: str) -> bool:
+        """Sprawdź czy kod jest już zajęty (indeks UNIQUE)"""
         conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute("DELETE FROM notes WHERE id = ?", (note_id,))
-        conn.commit()
-        conn.close()
-        
-        logger.info(f"✅ Usunięto notatkę ID: {note_id}")
-        return True
-        
-    except Exception as e:
-        logger.error(f"❌ Błąd usuwania notatki {note_id}: {e}")
-        return False
+        try:
+            return conn.execute("SELECT 1 FROM warehouse WHERE code = ?", (code,)).fetchone() is not None
+        finally:
+            conn.close()
+    
+    def delete_warehouse_item(self, item_id: int) -> bool:
+        """Usuń element magazynu; False gdy element nie istniał"""
+        try:
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            
+            cursor.execute("DELETE FROM warehouse WHERE id = ?", (item_id,))
+            deleted = cursor.rowcount > 0
+            conn.commit()
+            conn.close()
+            
+            if deleted:
+                logger.info(f"✅ Usunięto element magazynu ID: {item_id}")
+            return deleted
+            
+        except Exception as e:
+            logger.error(f"❌ Błąd usuwania elementu magazynu {item_id}: {e}")
+            raise
     
     def add_warehouse_item(self, name: str, code: str, quantity: int, note: str = "") -> int:
         """Dodaj nowy element do magazynu"""
@@ -651,25 +1730,232 @@ def delete_note(self, note_id: int) -> bool:
             logger.error(f"❌ Błąd dodawania elementu magazynu: {e}")
             raise
     
-    def update_warehouse_quantity(self, item_id: int, new_quantity: int):
-        """Aktualizuj ilość elementu w magazynie"""
+    def update_warehouse_quantity(self, item_id: int, new_quantity: int) -> Optional[Dict]:
+        """Ustaw ilość elementu w magazynie i zapisz ruch (delta = nowa - stara) w tej samej transakcji.
+
+        Zwraca zaktualizowany wiersz lub None gdy brak elementu.
+        """
+        conn = self.get_connection()
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            
-            cursor.execute(
-                "UPDATE warehouse SET quantity = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?",
+            conn.execute("BEGIN IMMEDIATE")
+            previous = conn.execute("SELECT quantity FROM warehouse WHERE id = ?", (item_id,)).fetchone()
+            if previous is None:
+                conn.rollback()
+                return None
+            
+            row = conn.execute(
+                "UPDATE warehouse SET quantity = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ? RETURNING *",
                 (new_quantity, item_id)
-            )
+            ).fetchone()
+            delta = row['quantity'] - previous['quantity']
+            if delta:
+                conn.execute(
+                    "INSERT INTO warehouse_movements (item_id, delta, quantity_after, reason) VALUES (?, ?, ?, ?)",
+                    (item_id, delta, row['quantity'], MOVEMENT_REASON_SET)
+                )
             conn.commit()
-            conn.close()
             
             logger.info(f"✅ Zaktualizowano ilość elementu {item_id}: {new_quantity}")
+            return dict(row)
             
         except Exception as e:
             logger.error(f"❌ Błąd aktualizacji ilości elementu {item_id}: {e}")
             raise
+        finally:
+            conn.close()
+    
+    def upsert_warehouse_items(self, items: List[Dict[str, Any]]) -> tuple:
+        """Wstaw lub zaktualizuj (po kodzie) partię elementów w jednej transakcji.
+
+        Zmiana stanu istniejącego elementu trafia do rejestru ruchów w tej samej
+        transakcji (nowe elementy - bez ruchu, jak w add_warehouse_item).
+        Zwraca krotkę (liczba nowych, liczba zaktualizowanych).
+        """
+        if not items:
+            return 0, 0
+        
+        conn = self.get_connection()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            
+            # Stany istniejących kodów partii - wyszukiwanie po indeksie UNIQUE(code), porcjami
+            # ze względu na limit parametrów zapytania SQLite
+            codes = list({item['code'] for item in items})
+            existing = {}
+            for start in range(0, len(codes), 500):
+                chunk = codes[start:start + 500]
+                placeholders = ', '.join('?' for _ in chunk)
+                existing.update(
+                    (row['code'], row['quantity']) for row in conn.execute(
+                        f"SELECT code, quantity FROM warehouse WHERE code IN ({placeholders})", chunk
+                    )
+                )
+            
+            conn.executemany(
+                """INSERT INTO warehouse (name, code, quantity, note) VALUES (?, ?, ?, ?)
+                ON CONFLICT (code) DO UPDATE SET
+                    name = excluded.name,
+                    quantity = excluded.quantity,
+                    note = excluded.note,
+                    updated_at = CURRENT_TIMESTAMP""",
+                [(item['name'], item['code'], item['quantity'], item.get('note', '')) for item in items]
+            )
+            
+            updated_codes = list(existing)
+            movements = []
+            for start in range(0, len(updated_codes), 500):
+                chunk = updated_codes[start:start + 500]
+                placeholders = ', '.join('?' for _ in chunk)
+                for row in conn.execute(
+                    f"SELECT id, code, quantity FROM warehouse WHERE code IN ({placeholders})", chunk
+                ):
+                    delta = row['quantity'] - existing[row['code']]
+                    if delta:
+                        movements.append((row['id'], delta, row['quantity'], MOVEMENT_REASON_IMPORT))
+            conn.executemany(
+                "INSERT INTO warehouse_movements (item_id, delta, quantity_after, reason) VALUES (?, ?, ?, ?)",
+                movements
+            )
+            conn.commit()
+            
+            inserted = len(codes) - len(existing)
+            return inserted, len(items) - inserted
+            
+        except Exception as e:
+            logger.error(f"❌ Błąd zapisu partii elementów magazynu: {e}")
+            raise
+        finally:
+            conn.close()
+    
+    def iter_warehouse_items(self, batch_size: int = 1000):
+        """Generator wierszy magazynu (po nazwie) pobieranych porcjami przez fetchmany"""
+        conn = self.get_connection()
+        try:
+            cursor = conn.execute(f"SELECT * FROM warehouse ORDER BY {keyset_order_by('warehouse')}")
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                for row in rows:
+                    yield dict(row)
+        finally:
+            conn.close()
+    
+    def adjust_warehouse_quantity(self, item_id: int, delta: int, reason: Optional[str] = None,
+                                  idempotency_key: Optional[str] = None) -> Dict[str, Any]:
+        """Zmień stan o delta jednym warunkowym UPDATE i zapisz ruch w rejestrze.
+
+        Zwraca słownik ze statusem: 'ok', 'replayed' (klucz idempotencji już użyty),
+        'not_found', 'insufficient' (stan spadłby poniżej zera) lub 'conflict'
+        (klucz użyty wcześniej dla innego elementu lub innej zmiany).
+        """
+        conn = self.get_connection()
+        try:
+            # Blokada zapisu od początku - sprawdzenie klucza i UPDATE w jednej transakcji
+            conn.execute("BEGIN IMMEDIATE")
+            
+            if idempotency_key:
+                previous = conn.execute(
+                    "SELECT * FROM warehouse_movements WHERE idempotency_key = ?",
+                    (idempotency_key,)
+                ).fetchone()
+                if previous is not None:
+                    conn.rollback()
+                    if previous['item_id'] != item_id or previous['delta'] != delta:
+                        return {'status': 'conflict', 'movement': dict(previous)}
+                    return {
+                        'status': 'replayed',
+                        'quantity': previous['quantity_after'],
+                        'movement': dict(previous)
+                    }
+            
+            row = conn.execute(
+                """UPDATE warehouse SET quantity = quantity + ?, updated_at = CURRENT_TIMESTAMP
+                WHERE id = ? AND quantity + ? >= 0
+                RETURNING quantity""",
+                (delta, item_id, delta)
+            ).fetchone()
+            
+            if row is None:
+                exists = conn.execute(
+                    "SELECT quantity FROM warehouse WHERE id = ?", (item_id,)
+                ).fetchone()
+                conn.rollback()
+                if exists is None:
+                    return {'status': 'not_found'}
+                return {'status': 'insufficient', 'quantity': exists['quantity']}
+            
+            quantity = row['quantity']
+            cursor = conn.execute(
+                """INSERT INTO warehouse_movements (item_id, delta, quantity_after, reason, idempotency_key)
+                VALUES (?, ?, ?, ?, ?)""",
+                (item_id, delta, quantity, reason, idempotency_key)
+            )
+            movement_id = cursor.lastrowid
+            conn.commit()
+            
+            logger.info(f"✅ Zmiana stanu elementu {item_id}: {delta:+d} -> {quantity}")
+            return {'status': 'ok', 'quantity': quantity, 'movement_id': movement_id}
+            
+        except Exception as e:
+            logger.error(f"❌ Błąd zmiany stanu elementu {item_id}: {e}")
+            raise
+        finally:
+            conn.close()
     
+    def get_warehouse_movements(self, item_id: int, limit: int = DEFAULT_PAGE_SIZE,
+                                before_id: Optional[int] = None) -> List[Dict]:
+        """Pobierz historię ruchów elementu (od najnowszych)"""
+        try:
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            
+            query = "SELECT * FROM warehouse_movements WHERE item_id = ?"
+            params = [item_id]
+            
+            if before_id is not None:
+                query += " AND id < ?"
+                params.append(before_id)
+            
+            query += " ORDER BY id DESC LIMIT ?"
+            params.append(limit)
+            
+            cursor.execute(query, params)
+            results = [dict(row) for row in cursor.fetchall()]
+            conn.close()
+            return results
+            
+        except PoolTimeout:
+            raise
+        except Exception as e:
+            logger.error(f"❌ Błąd pobierania ruchów elementu {item_id}: {e}")
+            return []
+
+    def get_movement_rows(self, start: int, end: int, item_id: Optional[int] = None) -> List[tuple]:
+        """Ruchy magazynowe z zakresu [start, end) jako krotki (czas unix, delta, stan po ruchu).
+
+        Krotki zamiast sqlite3.Row - wynik trafia wprost do kolumn analytics.
+        """
+        conn = self.get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.row_factory = None
+            # created_at to CURRENT_TIMESTAMP (UTC) - porównanie tekstowe w tym samym formacie
+            query = """SELECT CAST(strftime('%s', created_at) AS INTEGER), delta, quantity_after
+                FROM warehouse_movements WHERE created_at >= ? AND created_at < ?"""
+            params = [datetime.fromtimestamp(start, timezone.utc).strftime('%Y-%m-%d %H:%M:%S'),
+                      datetime.fromtimestamp(end, timezone.utc).strftime('%Y-%m-%d %H:%M:%S')]
+
+            if item_id is not None:
+                query += " AND item_id = ?"
+                params.append(item_id)
+
+            # Kolejność id = kolejność zapisu (created_at ma rozdzielczość sekund)
+            query += " ORDER BY id"
+            return cursor.execute(query, params).fetchall()
+        finally:
+            conn.close()
+
     # UŻYTKOWNICY
     def get_users(self, active_only: bool = True) -> List[Dict]:
         """Pobierz użytkowników z bazy danych"""
@@ -688,6 +1974,8 @@ def delete_note(self, note_id: int) -> bool:
             conn.close()
             return results
             
+        except PoolTimeout:
+            raise
         except Exception as e:
             logger.error(f"❌ Błąd pobierania użytkowników: {e}")
             return []
@@ -704,6 +1992,8 @@ def delete_note(self, note_id: int) -> bool:
             
             return dict(result) if result else None
             
+        except PoolTimeout:
+            raise
         except Exception as e:
             logger.error(f"❌ Błąd pobierania użytkownika {username}: {e}")
             return None
@@ -729,52 +2019,253 @@ def delete_note(self, note_id: int) -> bool:
             logger.error(f"❌ Błąd tworzenia użytkownika: {e}")
             raise
     
-    # KONFIGURACJA
-    def get_config(self, key: str) -> Optional[str]:
-        """Pobierz wartość konfiguracji"""
+    # WERSJE ZMIAN
+    def get_change_versions(self, tables) -> Dict[str, tuple]:
+        """Pobierz (wersja, czas ostatniej zmiany) dla podanych tabel - jedno zapytanie po kluczu"""
+        tables = list(tables)
+        conn = self.get_connection()
+        try:
+            placeholders = ', '.join('?' for _ in tables)
+            rows = conn.execute(
+                f"SELECT table_name, version, updated_at FROM change_versions WHERE table_name IN ({placeholders})",
+                tables
+            ).fetchall()
+            return {row['table_name']: (row['version'], row['updated_at']) for row in rows}
+        finally:
+            conn.close()
+    
+    # PRZYPOMNIENIA NOTATEK
+    def get_upcoming_reminders(self, until: str, limit: int = 1000) -> List[Dict]:
+        """Oczekujące przypomnienia z terminem do `until` (UTC) - zakres indeksu częściowego"""
+        conn = self.get_connection()
+        try:
+            rows = conn.execute(
+                """SELECT id, remind_at FROM notes
+                WHERE is_alert = 1 AND reminded_at IS NULL AND remind_at <= ?
+                ORDER BY remind_at LIMIT ?""",
+                (until, limit)
+            ).fetchall()
+            return [dict(row) for row in rows]
+        finally:
+            conn.close()
+    
+    def claim_due_reminders(self, limit: int = 100) -> List[Dict]:
+        """Zamień wymagalne przypomnienia na alerty - każde dokładnie raz.
+
+        Oznaczenie notatki, alert i zdarzenie note_reminder powstają w jednej transakcji
+        z blokadą zapisu, więc przy wielu workerach przypomnienie przejmuje tylko jeden.
+        Błąd (np. baza zablokowana) jest zgłaszany - harmonogram ponawia próbę.
+        """
         try:
             conn = self.get_connection()
-            cursor = conn.cursor()
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                notes = conn.execute(
+                    """UPDATE notes SET reminded_at = datetime('now')
+                    WHERE id IN (
+                        SELECT id FROM notes
+                        WHERE is_alert = 1 AND reminded_at IS NULL AND remind_at <= datetime('now')
+                        ORDER BY remind_at LIMIT ?
+                    )
+                    RETURNING id, name, text, remind_at""",
+                    (limit,)
+                ).fetchall()
+                
+                claimed = []
+                for note in notes:
+                    alert_id = conn.execute(
+                        "INSERT INTO alerts (title, message, priority) VALUES (?, ?, ?) RETURNING id",
+                        (f"Przypomnienie: {note['name']}", note['text'] or '', 1)
+                    ).fetchone()[0]
+                    reminder = {
+                        'note_id': note['id'],
+                        'alert_id': alert_id,
+                        'name': note['name'],
+                        'remind_at': note['remind_at']
+                    }
+                    self.publish_event('note_reminder', note['id'], reminder, conn=conn)
+                    claimed.append(reminder)
+                conn.commit()
+            finally:
+                conn.close()
+            
+            if claimed:
+                logger.info(f"✅ Wykonano {len(claimed)} przypomnień notatek")
+            return claimed
             
-            cursor.execute("SELECT config_value FROM config WHERE config_key = ?", (key,))
-            result = cursor.fetchone()
+        except Exception as e:
+            logger.error(f"❌ Błąd wykonywania przypomnień: {e}")
+            raise
+    
+    # ZDARZENIA (kanał SSE)
+    def get_last_event_id(self) -> int:
+        """Pobierz identyfikator ostatniego zdarzenia (0 gdy brak)"""
+        conn = self.get_connection()
+        try:
+            return conn.execute("SELECT COALESCE(MAX(id), 0) FROM events").fetchone()[0]
+        finally:
             conn.close()
+    
+    def get_first_event_id(self) -> int:
+        """Pobierz identyfikator najstarszego zachowanego zdarzenia (następny, gdy wszystkie usunięto)"""
+        conn = self.get_connection()
+        try:
+            return conn.execute(
+                "SELECT COALESCE(MIN(id), (SELECT seq + 1 FROM sqlite_sequence WHERE name = 'events'), 1) "
+                "FROM events"
+            ).fetchone()[0]
+        finally:
+            conn.close()
+    
+    def get_events_after(self, last_id: int, limit: int = 500, types=None) -> List[Dict]:
+        """Pobierz zdarzenia o id większym niż last_id (rosnąco, po kluczu głównym)"""
+        conn = self.get_connection()
+        try:
+            query = "SELECT * FROM events WHERE id > ?"
+            params = [last_id]
+            if types:
+                types = list(types)
+                query += f" AND event_type IN ({', '.join('?' for _ in types)})"
+                params.extend(types)
+            query += " ORDER BY id ASC LIMIT ?"
+            params.append(limit)
+            return [dict(row) for row in conn.execute(query, params).fetchall()]
+        finally:
+            conn.close()
+    
+    def publish_event(self, event_type: str, entity_id: Optional[int] = None,
+                      payload: Optional[Dict] = None, conn: sqlite3.Connection = None) -> int:
+        """Zapisz zdarzenie; z podanym połączeniem staje się częścią jego transakcji"""
+        own_connection = conn is None
+        if own_connection:
+            conn = self.get_connection()
+        try:
+            cursor = conn.execute(
+                "INSERT INTO events (event_type, entity_id, payload) VALUES (?, ?, ?)",
+                (event_type, entity_id, json.dumps(payload or {}, ensure_ascii=False))
+            )
+            if own_connection:
+                conn.commit()
+            return cursor.lastrowid
+        finally:
+            if own_connection:
+                conn.close()
+    
+    # STAN URZĄDZEŃ
+    def get_device_status(self) -> List[Dict]:
+        """Ostatni wynik sprawdzenia dostępności urządzeń"""
+        conn = self.get_connection()
+        try:
+            return [dict(row) for row in conn.execute("SELECT * FROM device_status ORDER BY name")]
+        finally:
+            conn.close()
+
+    def save_device_status(self, statuses: List[Dict[str, Any]]) -> List[Dict]:
+        """Zapisz wyniki rundy sprawdzeń (wszystkie urządzenia z konfiguracji).
+
+        Zmiana online/offline trafia w tej samej transakcji do events jako
+        device_status; zwraca listę urządzeń, których stan się zmienił.
+        Urządzenia usunięte z konfiguracji są usuwane z tabeli.
+        """
+        conn = self.get_connection()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            previous = {row['name']: dict(row) for row in conn.execute("SELECT * FROM device_status")}
+            changed = []
+            for status in statuses:
+                old = previous.get(status['name'])
+                # Online z błędem = histereza monitora (próba nieudana, stan jeszcze nie zmieniony)
+                answered = status['online'] and status.get('error') is None
+                last_seen = status['checked_at'] if answered else (old or {}).get('last_seen')
+                is_change = old is None or bool(old['online']) != status['online']
+                row = {
+                    **status,
+                    'last_seen': last_seen,
+                    'changed_at': status['checked_at'] if is_change else old['changed_at'],
+                }
+                conn.execute(
+                    """INSERT OR REPLACE INTO device_status
+                    (name, url, online, latency_ms, status_code, error, last_seen, checked_at, changed_at)
+                    VALUES (:name, :url, :online, :latency_ms, :status_code, :error, :last_seen, :checked_at, :changed_at)""",
+                    row
+                )
+                if is_change:
+                    changed.append(row)
+                    self.publish_event('device_status', payload=row, conn=conn)
+            removed = set(previous) - {status['name'] for status in statuses}
+            conn.executemany("DELETE FROM device_status WHERE name = ?", [(name,) for name in removed])
+            conn.commit()
+            return changed
+        except Exception as e:
+            logger.error(f"❌ Błąd zapisu stanu urządzeń: {e}")
+            raise
+        finally:
+            conn.close()
+
+    def prune_events(self, max_age_seconds: float) -> int:
+        """Usuń zdarzenia starsze niż max_age_seconds (AUTOINCREMENT nie użyje ich id ponownie)"""
+        try:
+            conn = self.get_connection()
+            try:
+                cursor = conn.execute(
+                    "DELETE FROM events WHERE created_at < datetime('now', ?)",
+                    (f'-{int(max_age_seconds)} seconds',)
+                )
+                conn.commit()
+                if cursor.rowcount:
+                    logger.info(f"✅ Usunięto {cursor.rowcount} starych zdarzeń")
+                return cursor.rowcount
+            finally:
+                conn.close()
+                
+        except Exception as e:
+            logger.error(f"❌ Błąd czyszczenia zdarzeń: {e}")
+            return 0
+    
+    # KONFIGURACJA
+    def get_config(self, key: str) -> Optional[str]:
+        """Pobierz wartość konfiguracji (z cache procesu)"""
+        try:
+            return self.config_cache.snapshot().get(key)
             
-            return result['config_value'] if result else None
-            
+        except PoolTimeout:
+            raise
         except Exception as e:
             logger.error(f"❌ Błąd pobierania konfiguracji {key}: {e}")
             return None
     
     def get_all_config(self) -> Dict[str, str]:
-        """Pobierz wszystkie konfiguracje"""
+        """Pobierz wszystkie konfiguracje (z cache procesu)"""
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            
-            cursor.execute("SELECT config_key, config_value FROM config")
-            results = {row['config_key']: row['config_value'] for row in cursor.fetchall()}
-            conn.close()
-            
-            return results
+            return dict(self.config_cache.snapshot())
             
+        except PoolTimeout:
+            raise
         except Exception as e:
             logger.error(f"❌ Błąd pobierania wszystkich konfiguracji: {e}")
             return {}
     
     def set_config(self, key: str, value: str):
-        """Ustaw wartość konfiguracji"""
+        """Ustaw wartość konfiguracji (zapis do bazy i do cache)"""
         try:
             conn = self.get_connection()
-            cursor = conn.cursor()
-            
-            cursor.execute(
-                "INSERT OR REPLACE INTO config (config_key, config_value) VALUES (?, ?)",
-                (key, value)
-            )
-            conn.commit()
-            conn.close()
-            
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                # UPSERT zamiast INSERT OR REPLACE - zachowuje id i opis klucza
+                stored = conn.execute(
+                    """INSERT INTO config (config_key, config_value) VALUES (?, ?)
+                    ON CONFLICT (config_key) DO UPDATE SET
+                        config_value = excluded.config_value,
+                        updated_at = CURRENT_TIMESTAMP
+                    RETURNING config_value""",
+                    (key, value)
+                ).fetchone()[0]
+                version = self.config_cache.read_version(conn)
+                conn.commit()
+            finally:
+                conn.close()
+            
+            self.config_cache.write_through(key, stored, version)
             logger.info(f"✅ Ustawiono konfigurację {key} = {value}")
             
         except Exception as e:
@@ -0,0 +1,198 @@
+# device_monitor.py
+"""Monitor dostępności urządzeń w sieci (kontroler Modbus, kwiatomat itd.).
+
+Zamiast pingowania urządzeń z każdej przeglądarki serwer sprawdza je sam,
+wszystkie równocześnie, co interval sekund: http(s):// - żądanie GET i kod
+odpowiedzi, tcp:// i ws:// - samo nawiązanie połączenia. Wynik (opóźnienie,
+ostatnia odpowiedź) jest zapisywany w tabeli device_status, skąd czytają go
+wszystkie workery, a zmiana online/offline trafia do kanału /api/events.
+Sprawdza tylko jeden worker gunicorna (blokada pliku).
+
+Konfiguracja: DASHBOARD_DEVICES="control=http://control.local/ping,kwiatomat=tcp://kwiatomat.local:80"
+"""
+import os
+import time
+import asyncio
+import threading
+from datetime import datetime
+from urllib.parse import urlsplit
+from typing import Dict, List, Any
+import logging
+
+from modbus_gateway import parse_bus_config
+
+try:
+    import fcntl
+except ImportError:  # Windows - jeden proces serwera, blokada niepotrzebna
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DEVICES = 'control=http://control.local/ping'
+LOCK_FILE = 'cache/device_monitor.lock'
+DEFAULT_PORTS = {'http': 80, 'https': 443, 'ws': 80, 'wss': 443}
+
+def parse_device_config(text: str) -> Dict[str, str]:
+    """'control=http://control.local/ping,...' -> {nazwa: adres} (format jak DASHBOARD_MODBUS_BUSES)"""
+    devices = parse_bus_config(text)
+    for name, url in devices.items():
+        parts = urlsplit(url)
+        if parts.scheme not in ('http', 'https', 'tcp', 'ws', 'wss') or not parts.hostname:
+            raise ValueError(f"Nieobsługiwany adres urządzenia {name}: {url}")
+        if parts.scheme == 'tcp' and not parts.port:
+            raise ValueError(f"Adres tcp:// urządzenia {name} wymaga portu: {url}")
+    return devices
+
+async def probe(url: str, timeout: float) -> Dict[str, Any]:
+    """Sprawdź urządzenie; zwraca {'online', 'latency_ms', 'status_code', 'error'}"""
+    parts = urlsplit(url)
+    port = parts.port or DEFAULT_PORTS.get(parts.scheme)
+    started = time.monotonic()
+    writer = None
+    try:
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(parts.hostname, port, ssl=parts.scheme in ('https', 'wss') or None), timeout)
+        status_code = None
+        if parts.scheme in ('http', 'https'):
+            path = parts.path or '/'
+            if parts.query:
+                path += '?' + parts.query
+            writer.write(f"GET {path} HTTP/1.1\r\nHost: {parts.netloc}\r\n"
+                         f"User-Agent: dashboard-monitor\r\nConnection: close\r\n\r\n".encode('ascii'))
+            await writer.drain()
+            line = await asyncio.wait_for(reader.readline(), max(timeout - (time.monotonic() - started), 0.01))
+            fields = line.split()
+            if len(fields) < 2 or not fields[0].startswith(b'HTTP/') or not fields[1].isdigit():
+                return {'online': False, 'latency_ms': None, 'status_code': None,
+                        'error': 'Odpowiedź nie jest odpowiedzią HTTP'}
+            status_code = int(fields[1])
+        latency = round((time.monotonic() - started) * 1000, 1)
+        if status_code is not None and status_code >= 500:
+            return {'online': False, 'latency_ms': latency, 'status_code': status_code,
+                    'error': f"HTTP {status_code}"}
+        return {'online': True, 'latency_ms': latency, 'status_code': status_code, 'error': None}
+    except asyncio.TimeoutError:
+        return {'online': False, 'latency_ms': None, 'status_code': None, 'error': f"Brak odpowiedzi w {timeout} s"}
+    except (OSError, ConnectionError, asyncio.IncompleteReadError) as e:
+        return {'online': False, 'latency_ms': None, 'status_code': None, 'error': str(e) or type(e).__name__}
+    finally:
+        if writer is not None:
+            writer.close()
+
+class DeviceMonitor:
+    """Cykliczne sprawdzanie urządzeń w wątku w tle; wyniki w bazie (db.save_device_status).
+
+    Urządzenie, które było online, przechodzi w offline dopiero po offline_after
+    nieudanych próbach z rzędu - pojedynczy zgubiony pakiet nie wywołuje zdarzenia.
+    """
+
+    def __init__(self, db, devices: Dict[str, str], interval: float = 30.0, timeout: float = 3.0,
+                 offline_after: int = 2, lock_path: str = LOCK_FILE):
+        self.db = db
+        self.devices = devices
+        self.interval = interval
+        self.timeout = timeout
+        self.offline_after = offline_after
+        self.lock_path = lock_path
+        self._failures: Dict[str, int] = {}
+        self._online: Dict[str, bool] = {}
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._lock_file = None
+        self._stats = {
+            'leader': False,
+            'rounds': 0,
+            'changes': 0,
+            'errors': 0,
+            'last_round': None,
+            'last_round_ms': None,
+        }
+
+    def start(self):
+        """Uruchom wątek (ponownie po fork() - wątki nie przechodzą do procesu potomnego)"""
+        if not self.devices:
+            return
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._stats['leader'] = False
+            self._thread = threading.Thread(target=self._run, name='device-monitor', daemon=True)
+            self._thread.start()
+
+    def _acquire_leadership(self) -> bool:
+        """Tylko jeden proces sprawdza urządzenia - blokada na pliku lock_path"""
+        if fcntl is None:
+            return True
+        os.makedirs(os.path.dirname(self.lock_path) or '.', exist_ok=True)
+        lock_file = open(self.lock_path, 'a')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self._lock_file = lock_file
+        return True
+
+    def _run(self):
+        while not self._acquire_leadership():
+            # Inny worker sprawdza urządzenia; przejmujemy zadanie, gdy zakończy pracę
+            time.sleep(30)
+        self._stats['leader'] = True
+        # Stan sprzed restartu - żeby restart serwera nie generował zdarzeń
+        try:
+            self._online = {row['name']: bool(row['online']) for row in self.db.get_device_status()}
+        except Exception as e:
+            logger.error(f"❌ Błąd odczytu stanu urządzeń: {e}")
+
+        while True:
+            started = time.monotonic()
+            try:
+                self.check_all()
+            except Exception as e:
+                self._stats['errors'] += 1
+                logger.error(f"❌ Błąd monitora urządzeń: {e}")
+            time.sleep(max(self.interval - (time.monotonic() - started), 1.0))
+
+    async def _probe_all(self) -> List[Dict[str, Any]]:
+        names = list(self.devices)
+        results = await asyncio.gather(*(probe(self.devices[name], self.timeout) for name in names))
+        return [{'name': name, 'url': self.devices[name], **result} for name, result in zip(names, results)]
+
+    def check_all(self) -> List[Dict]:
+        """Jedna runda: wszystkie urządzenia równocześnie, zapis wyników; zwraca zmiany stanu"""
+        started = time.monotonic()
+        results = asyncio.run(self._probe_all())
+        checked_at = datetime.now().isoformat(timespec='seconds')
+        for result in results:
+            name = result['name']
+            result['checked_at'] = checked_at
+            if result['online']:
+                self._failures[name] = 0
+            else:
+                self._failures[name] = self._failures.get(name, 0) + 1
+                # Histereza: było online - zostaje do offline_after porażek z rzędu
+                if self._online.get(name) and self._failures[name] < self.offline_after:
+                    result['online'] = True
+            self._online[name] = result['online']
+
+        changed = self.db.save_device_status(results)
+        for status in changed:
+            if status['online']:
+                logger.info(f"✅ Urządzenie {status['name']} dostępne ({status['latency_ms']} ms)")
+            else:
+                logger.warning(f"⚠️ Urządzenie {status['name']} niedostępne: {status['error']}")
+        self._stats['rounds'] += 1
+        self._stats['changes'] += len(changed)
+        self._stats['last_round'] = checked_at
+        self._stats['last_round_ms'] = round((time.monotonic() - started) * 1000, 1)
+        return changed
+
+    def stats(self) -> Dict[str, Any]:
+        stats = dict(self._stats)
+        stats['devices'] = len(self.devices)
+        stats['running'] = self._thread is not None and self._thread.is_alive()
+        return stats
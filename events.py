@@ -0,0 +1,186 @@
+# events.py
+import os
+import json
+import queue
+import threading
+import time
+from typing import Dict, Iterator, List, Optional, Any
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Typy zdarzeń zapisywanych w tabeli events
+ALERT_CREATED = 'alert_created'
+ALERT_READ = 'alert_read'
+NOTE_REMINDER = 'note_reminder'
+DEVICE_STATUS = 'device_status'
+EVENT_TYPES = (ALERT_CREATED, ALERT_READ, NOTE_REMINDER, DEVICE_STATUS)
+# Wysyłane zamiast zdarzeń usuniętych przez retencję - klient pobiera stan od nowa
+RESET = 'reset'
+
+class Subscription:
+    """Kolejka zdarzeń jednego klienta SSE"""
+
+    def __init__(self, types: Optional[set], queue_size: int):
+        self.types = types
+        self.queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self.overflowed = False
+
+    def offer(self, event: Dict[str, Any]):
+        if self.types is not None and event['event_type'] not in self.types:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except queue.Full:
+            # Wolny klient - rozłączamy go, a po ponownym połączeniu
+            # dostanie zaległe zdarzenia z bazy przez Last-Event-ID
+            self.overflowed = True
+
+class EventBroker:
+    """Rozsyłanie zdarzeń z tabeli events do klientów SSE jednego workera.
+
+    Jeden wątek na proces odpytuje tabelę events (jedno zapytanie po kluczu
+    głównym niezależnie od liczby klientów) i rozdziela nowe wiersze do kolejek
+    subskrybentów. Zdarzenia zapisują triggery i inne workery, więc kanał
+    działa także przy wielu workerach gunicorna.
+    """
+
+    def __init__(self, db, poll_interval: float = 1.0, queue_size: int = 1000,
+                 replay_limit: int = 1000, retention: float = 24 * 3600):
+        self.db = db
+        self.poll_interval = poll_interval
+        self.queue_size = queue_size
+        self.replay_limit = replay_limit
+        self.retention = retention
+        self._lock = threading.Lock()
+        self._subscribers: List[Subscription] = []
+        self._last_id: Optional[int] = None
+        self._thread = None
+        self._pid = None
+        self._wakeup = threading.Event()
+        self._last_prune = 0.0
+
+    def _ensure_started(self):
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._subscribers = []
+            self._last_id = self.db.get_last_event_id()
+            self._thread = threading.Thread(target=self._run, name='event-broker', daemon=True)
+            self._thread.start()
+
+    def subscribe(self, types: Optional[set] = None) -> Subscription:
+        self._ensure_started()
+        subscription = Subscription(types, self.queue_size)
+        with self._lock:
+            self._subscribers.append(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            if subscription in self._subscribers:
+                self._subscribers.remove(subscription)
+
+    def notify(self):
+        """Wybudź wątek od razu (np. po zapisie w tym samym procesie)"""
+        self._wakeup.set()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.poll_interval)
+            self._wakeup.clear()
+            try:
+                self._poll()
+                self._prune()
+            except Exception as e:
+                logger.error(f"❌ Błąd rozsyłania zdarzeń: {e}")
+
+    def _poll(self):
+        with self._lock:
+            idle = not self._subscribers
+        if idle:
+            # Bez klientów nie ma czego rozsyłać - tylko przesuwamy pozycję
+            self._last_id = self.db.get_last_event_id()
+            return
+
+        while True:
+            events = self.db.get_events_after(self._last_id or 0, limit=500)
+            if not events:
+                return
+            # Lista subskrybentów pobrana po odczycie zdarzeń: kto dołączył później,
+            # dostał te zdarzenia z bazy w ramach odtwarzania od Last-Event-ID
+            with self._lock:
+                subscribers = list(self._subscribers)
+            for event in events:
+                for subscription in subscribers:
+                    subscription.offer(event)
+            self._last_id = events[-1]['id']
+            if len(events) < 500:
+                return
+
+    def _prune(self):
+        now = time.monotonic()
+        if now - self._last_prune < 3600:
+            return
+        self._last_prune = now
+        self.db.prune_events(self.retention)
+
+    def stream(self, last_event_id: Optional[int] = None, types: Optional[set] = None,
+               heartbeat: float = 15.0) -> Iterator[str]:
+        """Generator strumienia SSE: zaległe zdarzenia od last_event_id, potem na żywo"""
+        subscription = self.subscribe(types)
+        try:
+            yield f"retry: {int(self.poll_interval * 3000)}\n\n"
+
+            sent_id = last_event_id or 0
+            if last_event_id is not None:
+                first_id = self.db.get_first_event_id()
+                if last_event_id < first_id - 1:
+                    # Część zaległych zdarzeń usunięto (retencja) - klient musi pobrać stan od nowa
+                    yield format_reset(first_id - 1)
+                # Subskrypcja jest już aktywna, więc nic nie zginie między odczytem zaległych a strumieniem;
+                # zaległe czytane porcjami po replay_limit aż do bieżących
+                while True:
+                    events = self.db.get_events_after(sent_id, limit=self.replay_limit, types=types)
+                    for event in events:
+                        yield format_sse(event)
+                        sent_id = event['id']
+                    if len(events) < self.replay_limit:
+                        break
+
+            while not subscription.overflowed:
+                try:
+                    event = subscription.queue.get(timeout=heartbeat)
+                except queue.Empty:
+                    yield ": keep-alive\n\n"
+                    continue
+                if event['id'] <= sent_id:
+                    continue
+                yield format_sse(event)
+                sent_id = event['id']
+        finally:
+            self.unsubscribe(subscription)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'subscribers': len(self._subscribers),
+                'last_event_id': self._last_id,
+                'running': self._thread is not None and self._thread.is_alive()
+            }
+
+def format_reset(last_id: int) -> str:
+    """Zdarzenie reset: zaległe zdarzenia do last_id nie są już dostępne"""
+    body = json.dumps({'id': last_id, 'type': RESET}, ensure_ascii=False)
+    return f"id: {last_id}\nevent: {RESET}\ndata: {body}\n\n"
+
+def format_sse(event: Dict[str, Any]) -> str:
+    """Zapisz zdarzenie w formacie text/event-stream"""
+    payload = event.get('payload')
+    data = json.loads(payload) if isinstance(payload, str) else payload
+    body = json.dumps({'id': event['id'], 'type': event['event_type'],
+                       'created_at': event.get('created_at'), 'data': data}, ensure_ascii=False)
+    return f"id: {event['id']}\nevent: {event['event_type']}\ndata: {body}\n\n"
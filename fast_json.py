@@ -0,0 +1,94 @@
+# fast_json.py
+"""Serializacja JSON odpowiedzi API.
+
+Gdy zainstalowany jest orjson, jsonify/request.get_json używają go zamiast
+modułu json (kilka razy szybciej dla dużych list). Wiersze sqlite3.Row są
+serializowane bezpośrednio, więc metody bazy nie muszą budować list słowników.
+stream_list koduje pełne listy porcjami - pamięć nie zależy od liczby wierszy.
+Backend można wymusić zmienną DASHBOARD_JSON=json (np. do porównań).
+"""
+import os
+import json
+import sqlite3
+import decimal
+from datetime import date, datetime, time
+from typing import Any, Iterable, Iterator
+import logging
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # orjson jest opcjonalny - bez niego moduł json z biblioteki standardowej
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+if os.environ.get('DASHBOARD_JSON', '').lower() == 'json':
+    orjson = None
+
+BACKEND = 'orjson' if orjson is not None else 'json'
+
+def _default(obj: Any) -> Any:
+    """Typy spoza JSON: wiersze i kursory SQLite, daty, Decimal, zbiory"""
+    if isinstance(obj, sqlite3.Row):
+        return dict(obj)
+    if isinstance(obj, sqlite3.Cursor):
+        return obj.fetchall()
+    if isinstance(obj, (datetime, date, time)):
+        return obj.isoformat()
+    if isinstance(obj, decimal.Decimal):
+        return float(obj)
+    if isinstance(obj, (set, frozenset, tuple)):
+        return list(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+if orjson is not None:
+    _ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+    def dumps(obj: Any) -> bytes:
+        return orjson.dumps(obj, default=_default, option=_ORJSON_OPTIONS)
+
+    loads = orjson.loads
+else:
+    _encoder = json.JSONEncoder(default=_default, ensure_ascii=False, separators=(',', ':'))
+
+    def dumps(obj: Any) -> bytes:
+        return _encoder.encode(obj).encode('utf-8')
+
+    loads = json.loads
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Dostawca JSON dla Flask (app.json) oparty na dumps/loads tego modułu"""
+
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        return dumps(obj).decode('utf-8')
+
+    def loads(self, s, **kwargs: Any) -> Any:
+        return loads(s)
+
+    def response(self, *args: Any, **kwargs: Any):
+        obj = self._prepare_response_obj(args, kwargs)
+        # Gotowe bajty trafiają do odpowiedzi bez ponownego kodowania
+        return self._app.response_class(dumps(obj) + b'\n', mimetype=self.mimetype)
+
+def stream_list(batches: Iterable[list]) -> Iterator[bytes]:
+    """Odpowiedź {"success": true, "data": [...], "total": N} kodowana porcja po porcji.
+
+    total jest znany dopiero po ostatniej porcji, więc trafia na koniec obiektu.
+    """
+    try:
+        yield b'{"success":true,"data":['
+        total = 0
+        for batch in batches:
+            if not batch:
+                continue
+            # Porcja kodowana jako tablica - bez nawiasów wstawiana do wspólnej tablicy
+            chunk = dumps(batch)[1:-1]
+            yield b',' + chunk if total else chunk
+            total += len(batch)
+        yield b'],"total":' + str(total).encode('ascii') + b'}\n'
+    finally:
+        close = getattr(batches, 'close', None)
+        if close is not None:
+            close()
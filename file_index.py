@@ -0,0 +1,723 @@
+# file_index.py
+"""Indeks katalogów FILES w pamięci procesu.
+
+DirectoryCache trzyma wynik os.scandir + stat() dla ostatnio używanych katalogów,
+kluczem jest ścieżka i mtime katalogu. Zmiany treści plików (rozmiar, czas) nie
+zmieniają mtime katalogu, więc dodatkowo wpisy unieważnia inotify (Linux), a gdy
+inotify jest niedostępny (np. Windows) - wiek wpisu (odpytywanie co poll_interval).
+
+FileSearchIndex to trwały indeks całego drzewa FILES w osobnej bazie SQLite
+(files_index.db), budowany i aktualizowany w tle - podstawa wyszukiwania plików.
+"""
+import os
+import sys
+import time
+import queue
+import sqlite3
+import struct
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple, Any
+import logging
+
+from database import ConnectionPool, STORAGE_PROFILES
+
+try:
+    import fcntl
+except ImportError:  # Windows - jeden proces serwera, blokada niepotrzebna
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+SORT_KEYS = {
+    'name': lambda item: item['name'].lower(),
+    'size': lambda item: (item['size'] or 0, item['name'].lower()),
+    'modified': lambda item: (item['modified'] or 0, item['name'].lower()),
+}
+
+# Flagi inotify (linux/inotify.h)
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+WATCH_MASK = (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO |
+              IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR)
+EVENT_HEADER = struct.Struct('iIII')
+
+class InotifyWatcher:
+    """Obserwacja katalogów przez inotify (ctypes, bez zależności zewnętrznych).
+
+    on_change(directory, name, mask) jest wołane z wątku watchera; name to nazwa
+    wpisu w katalogu lub None dla zdarzeń samego katalogu. Przy przepełnieniu
+    kolejki jądra wołane jest on_change(None, None, IN_Q_OVERFLOW).
+    """
+
+    def __init__(self, on_change: Callable[[Optional[str], Optional[str], int], None]):
+        import ctypes
+        import ctypes.util
+        self._libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        self._ctypes = ctypes
+        self.on_change = on_change
+        self._fd = None
+        self._pid = None
+        self._thread = None
+        self._lock = threading.Lock()
+        self._paths: Dict[str, int] = {}
+        self._watches: Dict[int, str] = {}
+        self.failures = 0
+
+    @staticmethod
+    def supported() -> bool:
+        return sys.platform.startswith('linux')
+
+    def _ensure_started(self):
+        if self._fd is not None and self._pid == os.getpid():
+            return
+        # Po fork() deskryptor i wątek należą do rodzica - zaczynamy od nowa
+        fd = self._libc.inotify_init1(os.O_CLOEXEC)
+        if fd < 0:
+            raise OSError(self._ctypes.get_errno(), 'inotify_init1 failed')
+        self._fd = fd
+        self._pid = os.getpid()
+        self._paths = {}
+        self._watches = {}
+        self._thread = threading.Thread(target=self._run, args=(fd,), name='inotify', daemon=True)
+        self._thread.start()
+
+    def watch(self, directory: str) -> bool:
+        """Dodaj obserwację katalogu; False gdy się nie udało (np. limit max_user_watches)"""
+        with self._lock:
+            self._ensure_started()
+            if directory in self._paths:
+                return True
+            wd = self._libc.inotify_add_watch(self._fd, os.fsencode(directory), WATCH_MASK)
+            if wd < 0:
+                self.failures += 1
+                if self.failures == 1:
+                    logger.warning(f"⚠️ inotify: nie można obserwować {directory} (errno {self._ctypes.get_errno()}) "
+                                   f"- sprawdź fs.inotify.max_user_watches")
+                return False
+            self._paths[directory] = wd
+            self._watches[wd] = directory
+            return True
+
+    def unwatch(self, directory: str):
+        with self._lock:
+            if self._pid != os.getpid():
+                return
+            wd = self._paths.pop(directory, None)
+            if wd is not None:
+                self._watches.pop(wd, None)
+                self._libc.inotify_rm_watch(self._fd, wd)
+
+    def _run(self, fd: int):
+        while True:
+            try:
+                data = os.read(fd, 64 * 1024)
+            except OSError as e:
+                logger.error(f"❌ inotify: błąd odczytu zdarzeń: {e}")
+                return
+            offset = 0
+            while offset + EVENT_HEADER.size <= len(data):
+                wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+                offset += EVENT_HEADER.size
+                name = data[offset:offset + length].rstrip(b'\0')
+                offset += length
+                try:
+                    self._dispatch(wd, mask, os.fsdecode(name) if name else None)
+                except Exception as e:
+                    logger.error(f"❌ inotify: błąd obsługi zdarzenia: {e}")
+
+    def _dispatch(self, wd: int, mask: int, name: Optional[str]):
+        if mask & IN_Q_OVERFLOW:
+            self.on_change(None, None, mask)
+            return
+        with self._lock:
+            directory = self._watches.get(wd)
+            if mask & IN_IGNORED and directory is not None:
+                # Katalog usunięty lub obserwacja zdjęta
+                self._watches.pop(wd, None)
+                self._paths.pop(directory, None)
+        if directory is not None:
+            self.on_change(directory, name, mask)
+
+    def stats(self) -> Dict[str, Any]:
+        return {'watches': len(self._paths), 'failures': self.failures,
+                'running': self._thread is not None and self._thread.is_alive()}
+
+def create_watcher(on_change) -> Optional[InotifyWatcher]:
+    """Watcher inotify albo None (inny system lub brak wsparcia) - wtedy odpytywanie"""
+    if not InotifyWatcher.supported():
+        return None
+    try:
+        return InotifyWatcher(on_change)
+    except (OSError, AttributeError) as e:
+        logger.warning(f"⚠️ inotify niedostępny ({e}) - indeks katalogów w trybie odpytywania")
+        return None
+
+class DirectoryCache:
+    """Cache listingów katalogów (LRU) z gotowymi widokami posortowanymi"""
+
+    def __init__(self, max_directories: int = 256, poll_interval: float = 10.0, use_inotify: bool = True):
+        self.max_directories = max_directories
+        self.poll_interval = poll_interval
+        self._entries: 'OrderedDict[str, Dict[str, Any]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.watcher = create_watcher(self._on_change) if use_inotify else None
+        self._stats = {'hits': 0, 'misses': 0, 'invalidations': 0}
+        self._changes = 0
+
+    def _on_change(self, directory: Optional[str], name: Optional[str], mask: int):
+        with self._lock:
+            self._changes += 1
+            if directory is None:
+                self._stats['invalidations'] += len(self._entries)
+                self._entries.clear()
+            elif self._entries.pop(directory, None) is not None:
+                self._stats['invalidations'] += 1
+
+    def _scan(self, directory: str) -> Dict[str, List[Dict[str, Any]]]:
+        files = []
+        directories = []
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir():
+                        directories.append({
+                            'name': entry.name,
+                            'path': entry.path,
+                            'type': 'directory',
+                            'size': None
+                        })
+                    elif entry.is_file():
+                        stat_info = entry.stat()
+                        files.append({
+                            'name': entry.name,
+                            'path': entry.path,
+                            'type': 'file',
+                            'extension': os.path.splitext(entry.name)[1].lower(),
+                            'size': stat_info.st_size,
+                            'modified': stat_info.st_mtime
+                        })
+                except (OSError, PermissionError):
+                    continue  # Pomijanie problematycznych plików/katalogów
+        directories.sort(key=SORT_KEYS['name'])
+        return {'files': files, 'directories': directories}
+
+    def listing(self, directory: str) -> Dict[str, Any]:
+        """Wpis cache katalogu; skanuje tylko gdy zmienił się mtime lub wpis unieważniono"""
+        directory = os.path.normpath(directory)
+        mtime = os.stat(directory).st_mtime_ns
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self._entries.get(directory)
+            if entry is not None and entry['mtime'] == mtime and (
+                    entry['watched'] or now - entry['scanned_at'] < self.poll_interval):
+                self._entries.move_to_end(directory)
+                self._stats['hits'] += 1
+                return entry
+
+        # Obserwacja przed skanem; zdarzenie w trakcie skanu oznacza, że wynik może być
+        # nieaktualny - taki wpis jest traktowany jak w trybie odpytywania
+        changes_before = self._changes
+        watched = self.watcher.watch(directory) if self.watcher is not None else False
+        scanned = self._scan(directory)
+        watched = watched and self._changes == changes_before
+        entry = {
+            'mtime': mtime,
+            'scanned_at': now,
+            'watched': watched,
+            'files': scanned['files'],
+            'directories': scanned['directories'],
+            'views': {},
+        }
+
+        with self._lock:
+            self._stats['misses'] += 1
+            self._entries[directory] = entry
+            self._entries.move_to_end(directory)
+            while len(self._entries) > self.max_directories:
+                evicted, _ = self._entries.popitem(last=False)
+                if self.watcher is not None:
+                    self.watcher.unwatch(evicted)
+        return entry
+
+    def files_view(self, entry: Dict[str, Any], sort: str = 'name', descending: bool = False,
+                   extensions: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """Pliki katalogu posortowane i przefiltrowane (posortowany widok zapamiętany we wpisie)"""
+        key = (sort, descending)
+        view = entry['views'].get(key)
+        if view is None:
+            view = sorted(entry['files'], key=SORT_KEYS[sort], reverse=descending)
+            entry['views'][key] = view
+        if extensions:
+            wanted = set(extensions)
+            return [item for item in view if item['extension'] in wanted]
+        return view
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats['directories'] = len(self._entries)
+        stats['mode'] = 'inotify' if self.watcher is not None else 'polling'
+        if self.watcher is not None:
+            stats['watcher'] = self.watcher.stats()
+        return stats
+
+# Schemat indeksu plików - baza jest odtwarzalna, więc zmiana schematu to nowa wersja i przebudowa
+FILE_INDEX_VERSION = 1
+FILE_INDEX_SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS files (
+        id INTEGER PRIMARY KEY,
+        path TEXT NOT NULL UNIQUE,
+        parent TEXT NOT NULL,
+        name TEXT NOT NULL,
+        name_key TEXT NOT NULL,
+        extension TEXT NOT NULL,
+        size INTEGER NOT NULL,
+        mtime REAL NOT NULL
+    )""",
+    "CREATE INDEX IF NOT EXISTS idx_files_parent ON files(parent)",
+    "CREATE INDEX IF NOT EXISTS idx_files_name_key ON files(name_key)",
+    "CREATE INDEX IF NOT EXISTS idx_files_extension ON files(extension, name_key)",
+    "CREATE INDEX IF NOT EXISTS idx_files_size ON files(size)",
+    "CREATE INDEX IF NOT EXISTS idx_files_mtime ON files(mtime)",
+    """CREATE TABLE IF NOT EXISTS directories (
+        path TEXT PRIMARY KEY,
+        mtime INTEGER NOT NULL
+    ) WITHOUT ROWID""",
+    # Trigramy - wyszukiwanie fragmentu nazwy bez skanowania tabeli
+    """CREATE VIRTUAL TABLE IF NOT EXISTS files_fts USING fts5(
+        name, content='files', content_rowid='id', tokenize='trigram'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS files_fts_insert AFTER INSERT ON files BEGIN
+        INSERT INTO files_fts (rowid, name) VALUES (new.id, new.name);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS files_fts_delete AFTER DELETE ON files BEGIN
+        INSERT INTO files_fts (files_fts, rowid, name) VALUES ('delete', old.id, old.name);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS files_fts_update AFTER UPDATE OF name ON files BEGIN
+        INSERT INTO files_fts (files_fts, rowid, name) VALUES ('delete', old.id, old.name);
+        INSERT INTO files_fts (rowid, name) VALUES (new.id, new.name);
+    END""",
+]
+
+# Kolumny z indeksem używane w warunkach zakresowych wyszukiwania
+_INDEXED = {'name_key': '', 'path': '', 'size': '', 'mtime': ''}
+
+# Dogrywka po id - kolejność zgodna z indeksami (indeks zawiera rowid), bez sortowania
+SEARCH_SORT = {
+    'name': 'name_key ASC, id ASC',
+    'size': 'size DESC, id DESC',
+    'modified': 'mtime DESC, id DESC',
+}
+MAX_SEARCH_LIMIT = 500
+SEARCH_PROBE_LIMIT = 5000
+
+# Zdarzenia inotify wymagające ponownego odczytu pliku lub usunięcia go z indeksu
+FILE_UPDATE_EVENTS = IN_CREATE | IN_MOVED_TO | IN_CLOSE_WRITE | IN_ATTRIB | IN_MODIFY
+FILE_REMOVE_EVENTS = IN_DELETE | IN_MOVED_FROM
+
+def parse_timestamp(value: Optional[str]) -> Optional[float]:
+    """Czas jako epoch (liczba) lub data ISO (czas lokalny serwera); ValueError gdy nieczytelny"""
+    if value in (None, ''):
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+
+class FileSearchIndex:
+    """Trwały indeks drzewa FILES (ścieżka, nazwa, rozszerzenie, rozmiar, mtime) w SQLite.
+
+    Indeks buduje jeden proces (blokada pliku przy wielu workerach gunicorna):
+    pełne uzgodnienie przy starcie i co rescan_interval, a pomiędzy nimi
+    zdarzenia inotify stosowane partiami. Bez inotify uzgodnienie co
+    poll_rescan_interval porównuje katalog po katalogu i zapisuje tylko zmiany.
+    Wyszukiwanie działa w każdym workerze na połączeniach z puli.
+    """
+
+    def __init__(self, root: str = 'FILES', db_path: str = 'files_index.db',
+                 rescan_interval: float = 3600, poll_rescan_interval: float = 300,
+                 batch_size: int = 1000, use_inotify: bool = True):
+        self.root = os.path.normpath(root)
+        self.db_path = db_path
+        self.rescan_interval = rescan_interval
+        self.poll_rescan_interval = poll_rescan_interval
+        self.batch_size = batch_size
+        self.use_inotify = use_inotify
+        self.pool = ConnectionPool(db_path, max_size=4, pragmas=STORAGE_PROFILES['wal'])
+        self.watcher = None
+        self._events: queue.Queue = queue.Queue()
+        self._rescan_requested = threading.Event()
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._lock_file = None
+        self._stats = {
+            'leader': False,
+            'scans': 0,
+            'last_scan': None,
+            'last_scan_seconds': None,
+            'events_applied': 0,
+            'errors': 0,
+        }
+        self._init_schema()
+
+    def _init_schema(self):
+        conn = self.pool.acquire()
+        try:
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            if version != FILE_INDEX_VERSION:
+                for table in ('files_fts', 'files', 'directories'):
+                    conn.execute(f"DROP TABLE IF EXISTS {table}")
+            for statement in FILE_INDEX_SCHEMA:
+                conn.execute(statement)
+            conn.execute(f"PRAGMA user_version = {FILE_INDEX_VERSION}")
+            conn.commit()
+        finally:
+            conn.close()
+
+    # --- wątek indeksujący ---
+
+    def start(self):
+        """Uruchom wątek indeksu (ponownie po fork() - wątki nie przechodzą do procesu potomnego)"""
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._stats['leader'] = False
+            self._thread = threading.Thread(target=self._run, name='file-index', daemon=True)
+            self._thread.start()
+
+    def _acquire_leadership(self) -> bool:
+        """Tylko jeden proces aktualizuje indeks - blokada na pliku <db>.lock"""
+        if fcntl is None:
+            return True
+        lock_file = open(self.db_path + '.lock', 'a')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self._lock_file = lock_file
+        return True
+
+    def _run(self):
+        while not self._acquire_leadership():
+            # Inny worker indeksuje; przejmujemy zadanie, gdy zakończy pracę
+            time.sleep(30)
+        self._stats['leader'] = True
+        if self.use_inotify:
+            self.watcher = create_watcher(self._on_fs_event)
+
+        next_scan = 0.0
+        while True:
+            try:
+                if self._rescan_requested.is_set() or time.monotonic() >= next_scan:
+                    self._rescan_requested.clear()
+                    self.rescan()
+                    interval = self.rescan_interval if self._fully_watched() else self.poll_rescan_interval
+                    next_scan = time.monotonic() + interval
+                self._apply_events(timeout=min(5.0, max(next_scan - time.monotonic(), 0.1)))
+            except Exception as e:
+                self._stats['errors'] += 1
+                logger.error(f"❌ Błąd indeksu plików: {e}")
+                time.sleep(5)
+
+    def _fully_watched(self) -> bool:
+        """Czy inotify obserwuje całe drzewo (brak odmów z powodu limitu obserwacji)"""
+        return self.watcher is not None and self.watcher.failures == 0
+
+    def _on_fs_event(self, directory: Optional[str], name: Optional[str], mask: int):
+        if directory is None:
+            # Przepełniona kolejka zdarzeń jądra - pełne uzgodnienie
+            self._rescan_requested.set()
+            return
+        self._events.put((directory, name, mask))
+
+    def _apply_events(self, timeout: float):
+        """Zbierz zdarzenia z krótkiego okna i zastosuj je w jednej transakcji"""
+        try:
+            first = self._events.get(timeout=timeout)
+        except queue.Empty:
+            return
+        time.sleep(0.2)  # zmiany przychodzą seriami (kopiowanie wielu plików)
+        events = [first]
+        while True:
+            try:
+                events.append(self._events.get_nowait())
+            except queue.Empty:
+                break
+
+        files: Dict[str, bool] = {}      # ścieżka -> czy odczytać ponownie (False = usunąć)
+        trees_removed = set()
+        trees_added = set()
+        for directory, name, mask in events:
+            if name is None:
+                if mask & (IN_DELETE_SELF | IN_MOVE_SELF):
+                    trees_removed.add(directory)
+                continue
+            path = os.path.join(directory, name)
+            if mask & IN_ISDIR:
+                if mask & FILE_REMOVE_EVENTS:
+                    trees_removed.add(path)
+                    trees_added.discard(path)
+                elif mask & (IN_CREATE | IN_MOVED_TO):
+                    trees_added.add(path)
+                    trees_removed.discard(path)
+            elif mask & FILE_REMOVE_EVENTS:
+                files[path] = False
+            elif mask & FILE_UPDATE_EVENTS:
+                files[path] = True
+
+        conn = self.pool.acquire()
+        try:
+            for tree in trees_removed:
+                self._delete_tree(conn, tree)
+            for path, refresh in files.items():
+                row = self._stat_row(path) if refresh else None
+                if row is None:
+                    conn.execute("DELETE FROM files WHERE path = ?", (path,))
+                else:
+                    self._upsert(conn, [row])
+            conn.commit()
+        finally:
+            conn.close()
+
+        for tree in trees_added:
+            # Nowy katalog (np. przeniesiony z zewnątrz) - zeskanuj poddrzewo
+            self._scan_tree(tree, full=True)
+        self._stats['events_applied'] += len(events)
+
+    # --- uzgadnianie z systemem plików ---
+
+    def _stat_row(self, path: str) -> Optional[Tuple]:
+        try:
+            stat_info = os.stat(path)
+        except OSError:
+            return None
+        if not os.path.isfile(path):
+            return None
+        name = os.path.basename(path)
+        return (path, os.path.dirname(path), name, name.lower(),
+                os.path.splitext(name)[1].lower(), stat_info.st_size, stat_info.st_mtime)
+
+    def _upsert(self, conn: sqlite3.Connection, rows: List[Tuple]):
+        conn.executemany(
+            """INSERT INTO files (path, parent, name, name_key, extension, size, mtime)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (path) DO UPDATE SET size = excluded.size, mtime = excluded.mtime""",
+            rows
+        )
+
+    def _delete_tree(self, conn: sqlite3.Connection, directory: str):
+        """Usuń katalog i całe jego poddrzewo (zakres ścieżek po indeksie)"""
+        low, high = directory + os.sep, directory + chr(ord(os.sep) + 1)
+        conn.execute("DELETE FROM files WHERE path >= ? AND path < ?", (low, high))
+        conn.execute("DELETE FROM directories WHERE path = ? OR (path >= ? AND path < ?)", (directory, low, high))
+
+    def rescan(self):
+        """Pełne uzgodnienie indeksu z drzewem FILES"""
+        started = time.monotonic()
+        if not os.path.isdir(self.root):
+            logger.warning(f"⚠️ Indeks plików: brak katalogu {self.root}")
+            return
+        # Z inotify pliki w katalogach o niezmienionym mtime są aktualne dzięki zdarzeniom
+        visited = self._scan_tree(self.root, full=not self._fully_watched() or self._stats['scans'] == 0)
+
+        conn = self.pool.acquire()
+        try:
+            known = [row[0] for row in conn.execute("SELECT path FROM directories")]
+            for directory in known:
+                if directory not in visited:
+                    self._delete_tree(conn, directory)
+            conn.commit()
+            # Statystyki dla planera (wybór między indeksem filtra a indeksem sortowania)
+            conn.execute("PRAGMA optimize")
+        finally:
+            conn.close()
+
+        elapsed = time.monotonic() - started
+        self._stats['scans'] += 1
+        self._stats['last_scan'] = datetime.now().isoformat()
+        self._stats['last_scan_seconds'] = round(elapsed, 3)
+        logger.info(f"✅ Indeks plików uzgodniony: {len(visited)} katalogów w {elapsed:.2f}s")
+
+    def _scan_tree(self, top: str, full: bool) -> set:
+        """Przejdź poddrzewo; zapisuje tylko pliki dodane, zmienione i usunięte"""
+        visited = set()
+        stack = [top]
+        conn = self.pool.acquire()
+        try:
+            pending = 0
+            while stack:
+                directory = stack.pop()
+                visited.add(directory)
+                if self.watcher is not None:
+                    self.watcher.watch(directory)
+                try:
+                    mtime = os.stat(directory).st_mtime_ns
+                    entries = list(os.scandir(directory))
+                except OSError:
+                    continue
+
+                subdirectories = []
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            subdirectories.append(entry.path)
+                    except OSError:
+                        continue
+                stack.extend(subdirectories)
+
+                stored = conn.execute("SELECT mtime FROM directories WHERE path = ?", (directory,)).fetchone()
+                if not full and stored is not None and stored[0] == mtime:
+                    continue
+
+                existing = {row[0]: (row[1], row[2]) for row in conn.execute(
+                    "SELECT name, size, mtime FROM files WHERE parent = ?", (directory,))}
+                changed = []
+                for entry in entries:
+                    try:
+                        if not entry.is_file(follow_symlinks=False):
+                            continue
+                        stat_info = entry.stat(follow_symlinks=False)
+                    except OSError:
+                        continue
+                    current = (stat_info.st_size, stat_info.st_mtime)
+                    if existing.pop(entry.name, None) != current:
+                        changed.append((entry.path, directory, entry.name, entry.name.lower(),
+                                        os.path.splitext(entry.name)[1].lower(), *current))
+                if changed:
+                    self._upsert(conn, changed)
+                if existing:
+                    conn.executemany("DELETE FROM files WHERE path = ?",
+                                     [(os.path.join(directory, name),) for name in existing])
+                conn.execute(
+                    "INSERT INTO directories (path, mtime) VALUES (?, ?) ON CONFLICT (path) DO UPDATE SET mtime = excluded.mtime",
+                    (directory, mtime)
+                )
+
+                pending += len(changed) + len(existing) + 1
+                if pending >= self.batch_size:
+                    conn.commit()
+                    pending = 0
+            conn.commit()
+        finally:
+            conn.close()
+        return visited
+
+    # --- wyszukiwanie ---
+
+    def search(self, text: Optional[str] = None, prefix: Optional[str] = None,
+               extensions: Optional[List[str]] = None, directory: Optional[str] = None,
+               min_size: Optional[int] = None, max_size: Optional[int] = None,
+               modified_after: Optional[float] = None, modified_before: Optional[float] = None,
+               sort: str = 'name', limit: int = 100, offset: int = 0) -> Tuple[List[Dict], bool]:
+        """Wyszukaj pliki; zwraca (wyniki, czy_jest_więcej)"""
+        conditions: List[str] = []
+        params: List[Any] = []
+        if prefix:
+            conditions.append("{name_key}name_key >= ? AND {name_key}name_key < ?")
+            params.extend([prefix.lower(), prefix.lower() + '\U0010ffff'])
+        if extensions:
+            conditions.append(f"extension IN ({', '.join('?' for _ in extensions)})")
+            params.extend(extensions)
+        if directory:
+            directory = os.path.normpath(directory)
+            conditions.append("{path}path >= ? AND {path}path < ?")
+            params.extend([directory + os.sep, directory + chr(ord(os.sep) + 1)])
+        if min_size is not None:
+            conditions.append("{size}size >= ?")
+            params.append(min_size)
+        if max_size is not None:
+            conditions.append("{size}size <= ?")
+            params.append(max_size)
+        if modified_after is not None:
+            conditions.append("{mtime}mtime >= ?")
+            params.append(modified_after)
+        if modified_before is not None:
+            conditions.append("{mtime}mtime < ?")
+            params.append(modified_before)
+        narrowing = len(params) > len(extensions or [])
+
+        conn = self.pool.acquire()
+        try:
+            # SQLite bez STAT4 nie oszacuje liczby trafień, więc liczymy je z limitem:
+            # mało trafień - pobieramy je z indeksu filtra i sortujemy,
+            # dużo - idziemy indeksem sortowania i kończymy po `limit` wierszach
+            selective = False
+            if text:
+                phrase = '"' + text.replace('"', '""') + '"'
+                if len(text) >= 3 and self._count_upto(
+                        conn, "SELECT 1 FROM files_fts WHERE files_fts MATCH ?", [phrase]) < SEARCH_PROBE_LIMIT:
+                    # Fraza trigramowa = dowolny fragment nazwy, bez rozróżniania wielkości liter
+                    conditions.append("id IN (SELECT rowid FROM files_fts WHERE files_fts MATCH ?)")
+                    params.append(phrase)
+                    selective = True
+                else:
+                    conditions.append("instr(name_key, ?) > 0")
+                    params.append(text.lower())
+            where = ' AND '.join(conditions) or '1=1'
+            if narrowing and not selective:
+                selective = self._count_upto(
+                    conn, f"SELECT 1 FROM files WHERE {where.format_map(_INDEXED)}", params) < SEARCH_PROBE_LIMIT
+
+            # Unarny + wyłącza użycie indeksu: dla ORDER BY przy małej liczbie trafień,
+            # dla warunków zakresowych (poza kolumną sortowania) przy dużej
+            order_by = SEARCH_SORT[sort]
+            sort_column = order_by.split(' ', 1)[0]
+            if selective:
+                order_by = ', '.join('+' + term for term in order_by.split(', '))
+                where = where.format_map(_INDEXED)
+            else:
+                where = where.format_map({column: '' if column == sort_column else '+'
+                                          for column in _INDEXED})
+            rows = conn.execute(
+                f"""SELECT path, name, extension, size, mtime FROM files WHERE {where}
+                ORDER BY {order_by} LIMIT ? OFFSET ?""",
+                params + [limit + 1, offset]
+            ).fetchall()
+        finally:
+            conn.close()
+
+        results = [{
+            'name': row['name'],
+            'path': row['path'],
+            'type': 'file',
+            'extension': row['extension'],
+            'size': row['size'],
+            'modified': row['mtime']
+        } for row in rows[:limit]]
+        return results, len(rows) > limit
+
+    @staticmethod
+    def _count_upto(conn: sqlite3.Connection, query: str, params: List[Any]) -> int:
+        return conn.execute(f"SELECT COUNT(*) FROM ({query} LIMIT {SEARCH_PROBE_LIMIT})", params).fetchone()[0]
+
+    def stats(self) -> Dict[str, Any]:
+        stats = dict(self._stats)
+        conn = self.pool.acquire()
+        try:
+            stats['files'] = conn.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+            stats['directories'] = conn.execute("SELECT COUNT(*) FROM directories").fetchone()[0]
+        finally:
+            conn.close()
+        stats['pending_events'] = self._events.qsize()
+        stats['mode'] = 'inotify' if self._fully_watched() else 'polling'
+        stats['running'] = self._thread is not None and self._thread.is_alive()
+        return stats
@@ -15,6 +15,14 @@ def initialize_database():
         print(f"   Alerty: {len(alerts)}")
         print(f"   Prace: {len(works)}")
         print(f"   Notatki: {len(notes)}")
+        
+        slow_queries = [entry for entry in db.check_query_plans() if not entry['ok']]
+        if slow_queries:
+            print("UWAGA: zapytania bez indeksu:")
+            for entry in slow_queries:
+                print(f"   {entry['query']}: {'; '.join(entry['plan'])}")
+        else:
+            print("Plany zapytan: OK (brak pelnych skanow)")
         print("=== Baza danych gotowa ===")
         
     except Exception as e:
@@ -28,6 +28,9 @@ if errorlevel 1 (
 
 echo ✅ Wszystkie zależności zostały zainstalowane pomyślnie!
 
+echo 🗜️ Budowanie zasobów statycznych...
+python static_assets.py
+
 echo 🗃️ Inicjalizacja bazy danych...
 python init_database.py
 
@@ -0,0 +1,949 @@
+# modbus_gateway.py
+"""Bramka Modbus RTU po stronie serwera.
+
+Pętla asyncio w wątku w tle utrzymuje jedno połączenie z kontrolerem na każdą
+magistralę (bus). Żądania z przeglądarek trafiają do kolejki magistrali i są
+wysyłane pojedynczo, z kontrolą CRC16 i timeoutem; identyczne ramki czekające
+w kolejce są wysyłane raz. Cały ruch (żądania, odpowiedzi, błędy) trafia do
+historii i do subskrybentów strumienia SSE, więc kilka otwartych konsol nie
+otwiera kilku połączeń do kontrolera. Przy kilku workerach gunicorna
+magistrale obsługuje jeden z nich, pozostałe przekazują mu żądania.
+
+Transporty: ws://host:port/ (kontroler ESP - ramki jako tekst hex) oraz
+tcp://host:port (surowe RTU po TCP, np. konwerter RS485/Ethernet).
+Symulator slave'a do testów: python modbus_gateway.py simulate [port]
+"""
+import os
+import sys
+import json
+import time
+import queue
+import base64
+import struct
+import asyncio
+import hashlib
+import threading
+import concurrent.futures
+from collections import deque
+from datetime import datetime
+from urllib.parse import urlsplit
+from typing import Dict, Iterator, List, Optional, Tuple, Union, Any
+import logging
+
+try:
+    import fcntl
+except ImportError:  # Windows - jeden proces serwera, blokada niepotrzebna
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUSES = 'default=ws://control.local:81/'
+# Cisza na łączu kończąca ramkę o nieznanej długości (t3.5 z zapasem na TCP)
+FRAME_GAP = 0.05
+# Ponowna próba połączenia z kontrolerem najwcześniej po tylu sekundach
+RECONNECT_INTERVAL = 5.0
+WEBSOCKET_GUID = '258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+# Blokada procesu obsługującego magistrale (gniazdo dla pozostałych workerów: ta sama nazwa, .sock)
+LOCK_FILE = 'cache/modbus_gateway.lock'
+# Co tyle sekund worker bez magistral próbuje je przejąć, gdy lider nie odpowiada
+LEADER_RETRY_INTERVAL = 2.0
+
+class ModbusError(Exception):
+    """Błąd wykonania żądania Modbus (brak połączenia, błędna odpowiedź)"""
+    # Numer zdarzenia 'error' w strumieniu - konsola nie pokazuje błędu dwa razy
+    event_id: Optional[int] = None
+
+class ModbusTimeout(ModbusError):
+    """Brak odpowiedzi w czasie"""
+
+class ModbusBusy(ModbusError):
+    """Kolejka magistrali jest pełna"""
+
+# Błędy przekazywane z procesu lidera do pozostałych workerów
+RELAY_ERRORS = {cls.__name__: cls for cls in (ModbusError, ModbusTimeout, ModbusBusy)}
+
+def _crc_table() -> List[int]:
+    table = []
+    for byte in range(256):
+        crc = byte
+        for _ in range(8):
+            crc = (crc >> 1) ^ 0xA001 if crc & 1 else crc >> 1
+        table.append(crc)
+    return table
+
+CRC_TABLE = _crc_table()
+
+def crc16(data: bytes) -> int:
+    """CRC16/MODBUS (wielomian 0xA001, start 0xFFFF)"""
+    crc = 0xFFFF
+    for byte in data:
+        crc = (crc >> 8) ^ CRC_TABLE[(crc ^ byte) & 0xFF]
+    return crc
+
+def with_crc(payload: bytes) -> bytes:
+    return payload + crc16(payload).to_bytes(2, 'little')
+
+def crc_ok(frame: bytes) -> bool:
+    return len(frame) >= 4 and crc16(frame[:-2]) == int.from_bytes(frame[-2:], 'little')
+
+def parse_frame(text: str, append_crc: bool = False) -> bytes:
+    """Ramka z tekstu hex ('96 03 00 00 00 01 98 ED'); ModbusError gdy nieprawidłowa"""
+    digits = ''.join(text.split())
+    try:
+        frame = bytes.fromhex(digits)
+    except ValueError:
+        raise ModbusError("Ramka musi być zapisana szesnastkowo")
+    if append_crc:
+        frame = with_crc(frame)
+    if len(frame) < 4 or len(frame) > 256:
+        raise ModbusError("Nieprawidłowa długość ramki (4-256 bajtów)")
+    if not crc_ok(frame):
+        expected = crc16(frame[:-2]).to_bytes(2, 'little').hex().upper()
+        raise ModbusError(f"Błędne CRC ramki (oczekiwane {expected})")
+    return frame
+
+def response_length(buffer: bytes) -> Optional[int]:
+    """Długość ramki odpowiedzi wg kodu funkcji; None gdy nieznana lub za mało bajtów"""
+    if len(buffer) < 3:
+        return None
+    function = buffer[1]
+    if function & 0x80:
+        return 5
+    if function in (1, 2, 3, 4, 23):
+        return 5 + buffer[2]
+    if function in (5, 6, 15, 16):
+        return 8
+    return None
+
+def response_matches(request: bytes, response: bytes) -> bool:
+    """Czy odpowiedź (o poprawnym CRC) dotyczy tego żądania, a nie wcześniejszego z tym samym kodem funkcji"""
+    if response[0] != request[0] or (response[1] & 0x7F) != request[1]:
+        return False
+    if response[1] & 0x80:
+        return True
+    function = request[1]
+    if function in (1, 2, 3, 4) and len(request) >= 8:
+        quantity = struct.unpack('>H', request[4:6])[0]
+        expected = (quantity + 7) // 8 if function in (1, 2) else quantity * 2
+        return response[2] == expected and len(response) == 5 + expected
+    if function in (5, 6, 15, 16):
+        # Echo adresu oraz wartości (05/06) lub liczby rejestrów (15/16)
+        return response[2:6] == request[2:6]
+    return True
+
+def request_length(buffer: bytes) -> Optional[int]:
+    """Długość ramki żądania wg kodu funkcji (dla symulatora)"""
+    if len(buffer) < 2:
+        return None
+    function = buffer[1]
+    if function in (1, 2, 3, 4, 5, 6):
+        return 8
+    if function in (15, 16):
+        return 9 + buffer[6] if len(buffer) >= 7 else None
+    return None
+
+def parse_bus_config(text: str) -> Dict[str, str]:
+    """'default=ws://control.local:81/,rs485b=tcp://10.0.0.5:502' -> {nazwa: adres}"""
+    buses = {}
+    for part in text.split(','):
+        name, _, url = part.strip().partition('=')
+        if name and url:
+            buses[name.strip()] = url.strip()
+    return buses
+
+# WebSocket (RFC 6455) - tylko to, czego potrzebuje kontroler: ramki tekstowe i binarne
+
+async def _read_ws_frame(reader: asyncio.StreamReader) -> Tuple[bool, int, bytes]:
+    header = await reader.readexactly(2)
+    fin, opcode = header[0] & 0x80, header[0] & 0x0F
+    masked, length = header[1] & 0x80, header[1] & 0x7F
+    if length == 126:
+        length = struct.unpack('>H', await reader.readexactly(2))[0]
+    elif length == 127:
+        length = struct.unpack('>Q', await reader.readexactly(8))[0]
+    mask = await reader.readexactly(4) if masked else None
+    payload = await reader.readexactly(length)
+    if mask:
+        payload = bytes(b ^ mask[i % 4] for i, b in enumerate(payload))
+    return bool(fin), opcode, payload
+
+def _ws_frame(opcode: int, payload: bytes, mask: bool) -> bytes:
+    header = bytearray([0x80 | opcode])
+    length = len(payload)
+    mask_bit = 0x80 if mask else 0
+    if length < 126:
+        header.append(mask_bit | length)
+    elif length < 65536:
+        header.append(mask_bit | 126)
+        header += struct.pack('>H', length)
+    else:
+        header.append(mask_bit | 127)
+        header += struct.pack('>Q', length)
+    if mask:
+        key = os.urandom(4)
+        header += key
+        payload = bytes(b ^ key[i % 4] for i, b in enumerate(payload))
+    return bytes(header) + payload
+
+def _ws_accept(key: str) -> str:
+    return base64.b64encode(hashlib.sha1((key + WEBSOCKET_GUID).encode('ascii')).digest()).decode('ascii')
+
+class TcpTransport:
+    """Surowe ramki RTU po TCP; granice ramek wg kodu funkcji lub ciszy na łączu"""
+
+    def __init__(self, host: str, port: int):
+        self.host = host
+        self.port = port
+        self._reader = None
+        self._writer = None
+        self._buffer = b''
+
+    async def connect(self, timeout: float):
+        self._reader, self._writer = await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port), timeout)
+        self._buffer = b''
+
+    @property
+    def alive(self) -> bool:
+        return self._reader is not None and not self._reader.at_eof()
+
+    async def send(self, frame: bytes):
+        self._writer.write(frame)
+        await self._writer.drain()
+
+    async def receive(self) -> bytes:
+        while True:
+            expected = response_length(self._buffer)
+            if expected is not None and len(self._buffer) >= expected:
+                frame, self._buffer = self._buffer[:expected], self._buffer[expected:]
+                return frame
+            try:
+                # Ramka o nieznanej długości kończy się ciszą na łączu
+                wait = FRAME_GAP if self._buffer and expected is None else None
+                chunk = await asyncio.wait_for(self._reader.read(512), wait)
+            except asyncio.TimeoutError:
+                frame, self._buffer = self._buffer, b''
+                return frame
+            if not chunk:
+                raise ConnectionError("Kontroler zamknął połączenie")
+            self._buffer += chunk
+
+    async def drain(self, quiet: float, limit: float) -> int:
+        """Odrzuć zaległe dane i czekaj na ciszę na łączu (po timeoucie); zwraca liczbę odrzuconych bajtów"""
+        discarded = len(self._buffer)
+        self._buffer = b''
+        deadline = time.monotonic() + limit
+        while (remaining := deadline - time.monotonic()) > 0:
+            try:
+                chunk = await asyncio.wait_for(self._reader.read(512), min(quiet, remaining))
+            except asyncio.TimeoutError:
+                break
+            if not chunk:
+                raise ConnectionError("Kontroler zamknął połączenie")
+            discarded += len(chunk)
+        return discarded
+
+    async def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+class WebSocketTransport:
+    """Połączenie WebSocket z kontrolerem; ramki RTU wysyłane jako tekst hex.
+
+    Wiadomości czyta osobne zadanie do kolejki, więc przerwanie receive() przez
+    timeout nie zostawia w połowie odczytanej ramki WebSocket. receive() zwraca
+    bytes dla ramek (tekst hex lub ramka binarna) oraz str dla innych
+    komunikatów tekstowych kontrolera.
+    """
+
+    def __init__(self, url: str):
+        parts = urlsplit(url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.path = parts.path or '/'
+        self._writer = None
+        self._messages: Optional[asyncio.Queue] = None
+        self._reader_task = None
+
+    async def connect(self, timeout: float):
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(self.host, self.port), timeout)
+        key = base64.b64encode(os.urandom(16)).decode('ascii')
+        writer.write((
+            f"GET {self.path} HTTP/1.1\r\nHost: {self.host}:{self.port}\r\n"
+            f"Upgrade: websocket\r\nConnection: Upgrade\r\n"
+            f"Sec-WebSocket-Key: {key}\r\nSec-WebSocket-Version: 13\r\n\r\n"
+        ).encode('ascii'))
+        await writer.drain()
+        try:
+            head = (await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), timeout)).decode('latin-1')
+        except Exception:
+            writer.close()
+            raise
+        status = head.split('\r\n', 1)[0]
+        if ' 101 ' not in status + ' ' or _ws_accept(key) not in head:
+            writer.close()
+            raise ConnectionError(f"Kontroler odrzucił połączenie WebSocket: {status}")
+        self._writer = writer
+        self._messages = asyncio.Queue()
+        self._reader_task = asyncio.get_running_loop().create_task(self._read_messages(reader))
+
+    async def _read_messages(self, reader: asyncio.StreamReader):
+        message = b''
+        message_opcode = None
+        try:
+            while True:
+                fin, opcode, payload = await _read_ws_frame(reader)
+                if opcode == 0x8:
+                    raise ConnectionError("Kontroler zamknął połączenie WebSocket")
+                if opcode == 0x9:
+                    self._writer.write(_ws_frame(0xA, payload, mask=True))
+                    continue
+                if opcode == 0xA:
+                    continue
+                if opcode != 0x0:
+                    message_opcode = opcode
+                message += payload
+                if not fin:
+                    continue
+                if message_opcode == 0x2:
+                    self._messages.put_nowait(message)
+                else:
+                    text = message.decode('utf-8', 'replace').strip()
+                    try:
+                        self._messages.put_nowait(bytes.fromhex(''.join(text.split())))
+                    except ValueError:
+                        self._messages.put_nowait(text)
+                message = b''
+        except (OSError, ConnectionError, asyncio.IncompleteReadError) as e:
+            self._messages.put_nowait(e if isinstance(e, ConnectionError) else ConnectionError(str(e)))
+
+    @property
+    def alive(self) -> bool:
+        return self._reader_task is not None and not self._reader_task.done()
+
+    async def send(self, frame: bytes):
+        self._writer.write(_ws_frame(0x1, frame.hex().upper().encode('ascii'), mask=True))
+        await self._writer.drain()
+
+    async def receive(self) -> Union[bytes, str]:
+        message = await self._messages.get()
+        if isinstance(message, Exception):
+            # Kolejne wywołania też mają zobaczyć zerwane połączenie
+            self._messages.put_nowait(message)
+            raise message
+        return message
+
+    async def drain(self, quiet: float, limit: float) -> int:
+        """Odrzuć zaległe wiadomości i czekaj na ciszę na łączu (po timeoucie); zwraca liczbę odrzuconych"""
+        discarded = 0
+        deadline = time.monotonic() + limit
+        while True:
+            try:
+                message = self._messages.get_nowait()
+            except asyncio.QueueEmpty:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return discarded
+                try:
+                    message = await asyncio.wait_for(self._messages.get(), min(quiet, remaining))
+                except asyncio.TimeoutError:
+                    return discarded
+            if isinstance(message, Exception):
+                self._messages.put_nowait(message)
+                raise message
+            discarded += 1
+
+    async def close(self):
+        if self._reader_task is not None:
+            self._reader_task.cancel()
+            self._reader_task = None
+        if self._writer is not None:
+            try:
+                self._writer.write(_ws_frame(0x8, b'', mask=True))
+            except Exception:
+                pass
+            self._writer.close()
+            self._writer = None
+
+def create_transport(url: str):
+    parts = urlsplit(url)
+    if parts.scheme in ('ws', 'http'):
+        return WebSocketTransport(url)
+    if parts.scheme == 'tcp':
+        return TcpTransport(parts.hostname, parts.port or 502)
+    raise ValueError(f"Nieobsługiwany adres magistrali: {url}")
+
+class Bus:
+    """Kolejka żądań jednej magistrali - w danej chwili w toku jest jedno żądanie"""
+
+    def __init__(self, name: str, url: str, gateway: 'ModbusGateway'):
+        self.name = name
+        self.url = url
+        self.gateway = gateway
+        self.transport = None
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=gateway.queue_size)
+        self._pending: Dict[bytes, asyncio.Future] = {}
+        self._last_attempt = 0.0
+        self.connected = False
+        self.stats = {
+            'requests': 0,
+            'coalesced': 0,
+            'responses': 0,
+            'timeouts': 0,
+            'crc_errors': 0,
+            'stale': 0,
+            'errors': 0,
+            'reconnects': 0,
+        }
+
+    async def submit(self, frame: bytes) -> Dict[str, Any]:
+        future = self._pending.get(frame)
+        if future is not None:
+            # Ta sama ramka już czeka - odpowiedź dostaną wszyscy zlecający
+            self.stats['coalesced'] += 1
+            return await asyncio.shield(future)
+        if self.queue.full():
+            raise ModbusBusy(f"Kolejka magistrali {self.name} jest pełna")
+        future = asyncio.get_running_loop().create_future()
+        self._pending[frame] = future
+        self.queue.put_nowait((frame, future, time.monotonic()))
+        return await asyncio.shield(future)
+
+    async def run(self):
+        while True:
+            frame, future, queued_at = await self.queue.get()
+            try:
+                if time.monotonic() - queued_at > self.gateway.queue_timeout:
+                    raise ModbusTimeout("Przekroczono czas oczekiwania w kolejce")
+                result = await self._transact(frame)
+                if not future.done():
+                    future.set_result(result)
+            except Exception as e:
+                if not isinstance(e, ModbusError):
+                    e = ModbusError(str(e))
+                self.stats['errors'] += 1
+                e.event_id = self.gateway.publish('error', self.name, request=frame.hex().upper(), error=str(e))['id']
+                if not future.done():
+                    future.set_exception(e)
+            finally:
+                self._pending.pop(frame, None)
+            # Przerwa między ramkami - kontroler nie dostaje żądań jedno za drugim
+            await asyncio.sleep(self.gateway.frame_gap)
+
+    async def _ensure_connected(self):
+        if self.transport is not None:
+            if self.transport.alive:
+                return
+            await self._disconnect("połączenie zamknięte przez kontroler")
+            # Od razu próbujemy ponownie - zerwanie wykryte przy bezczynnej magistrali
+            self._last_attempt = 0.0
+        now = time.monotonic()
+        if now - self._last_attempt < RECONNECT_INTERVAL:
+            raise ModbusError(f"Brak połączenia z kontrolerem {self.name}")
+        self._last_attempt = now
+        transport = create_transport(self.url)
+        try:
+            await transport.connect(self.gateway.timeout)
+        except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError) as e:
+            self.gateway.publish('status', self.name, connected=False, error=str(e) or 'timeout')
+            raise ModbusError(f"Brak połączenia z kontrolerem {self.name}: {e or 'timeout'}")
+        self.transport = transport
+        self.connected = True
+        self.stats['reconnects'] += 1
+        logger.info(f"✅ Modbus: połączono z {self.url} ({self.name})")
+        self.gateway.publish('status', self.name, connected=True)
+
+    async def _disconnect(self, reason: str):
+        if self.transport is not None:
+            await self.transport.close()
+        self.transport = None
+        self.connected = False
+        logger.warning(f"⚠️ Modbus: rozłączono {self.name}: {reason}")
+        self.gateway.publish('status', self.name, connected=False, error=reason)
+
+    async def _transact(self, frame: bytes) -> Dict[str, Any]:
+        await self._ensure_connected()
+        request_hex = frame.hex().upper()
+        self.stats['requests'] += 1
+        started = time.monotonic()
+        self.gateway.publish('request', self.name, request=request_hex)
+        try:
+            await self.transport.send(frame)
+            if frame[0] == 0:
+                # Ramka rozgłoszeniowa - slave'y nie odpowiadają
+                return self._result(request_hex, None, started)
+            deadline = started + self.gateway.timeout
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise asyncio.TimeoutError
+                received = await asyncio.wait_for(self.transport.receive(), remaining)
+                if isinstance(received, str):
+                    self.gateway.publish('message', self.name, text=received)
+                    continue
+                if not crc_ok(received):
+                    self.stats['crc_errors'] += 1
+                    raise ModbusError(f"Błędne CRC odpowiedzi: {received.hex().upper()}")
+                if not response_matches(frame, received):
+                    # Spóźniona odpowiedź na wcześniejsze żądanie lub ramka spoza bramki
+                    self.stats['stale'] += 1
+                    self.gateway.publish('unsolicited', self.name, response=received.hex().upper())
+                    continue
+                self.stats['responses'] += 1
+                return self._result(request_hex, received, started)
+        except asyncio.TimeoutError:
+            self.stats['timeouts'] += 1
+            await self._drain_late_reply()
+            raise ModbusTimeout(f"Brak odpowiedzi slave'a {frame[0]} w {self.gateway.timeout} s")
+        except (OSError, ConnectionError, asyncio.IncompleteReadError) as e:
+            await self._disconnect(str(e) or type(e).__name__)
+            raise ModbusError(f"Połączenie z kontrolerem przerwane: {e}")
+
+    async def _drain_late_reply(self):
+        """Po timeoucie slave może jeszcze odpowiedzieć - ta odpowiedź nie może trafić do kolejnego żądania"""
+        try:
+            discarded = await self.transport.drain(self.gateway.timeout, self.gateway.timeout * 3)
+        except (OSError, ConnectionError, asyncio.IncompleteReadError) as e:
+            await self._disconnect(str(e) or type(e).__name__)
+            return
+        if discarded:
+            self.stats['stale'] += 1
+            self.gateway.publish('unsolicited', self.name, discarded=discarded)
+
+    def _result(self, request_hex: str, response: Optional[bytes], started: float) -> Dict[str, Any]:
+        result = {
+            'request': request_hex,
+            'response': response.hex().upper() if response is not None else None,
+            'slave': int(request_hex[:2], 16),
+            'function': int(request_hex[2:4], 16),
+            'exception': response[2] if response is not None and response[1] & 0x80 else None,
+            'elapsed_ms': round((time.monotonic() - started) * 1000, 1),
+        }
+        event = self.gateway.publish('response', self.name, **result)
+        return {'bus': self.name, **result, 'event_id': event['id']}
+
+class ModbusGateway:
+    """Magistrale Modbus obsługiwane w jednej pętli asyncio (wątek w tle).
+
+    request() jest wywoływane z wątków Flaska; submit() to wersja dla
+    korutyn działających w pętli bramki (np. cykliczne odczyty).
+
+    Przy wielu workerach gunicorna magistrale obsługuje tylko jeden proces
+    (blokada na pliku lock_path). Pozostałe przekazują mu żądania przez gniazdo
+    unix obok pliku blokady i odbierają od niego zdarzenia do własnej historii
+    i strumieni SSE. Gdy lider zakończy pracę, magistrale przejmuje kolejny
+    proces. Bez lock_path (lub bez fcntl) proces zawsze obsługuje magistrale sam.
+    """
+
+    def __init__(self, buses: Dict[str, str], timeout: float = 1.0, frame_gap: float = 0.02,
+                 queue_size: int = 100, queue_timeout: float = 10.0, history_size: int = 500,
+                 lock_path: Optional[str] = None):
+        self.bus_urls = buses
+        self.timeout = timeout
+        self.frame_gap = frame_gap
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.lock_path = lock_path
+        self.leader = False
+        self.buses: Dict[str, Bus] = {}
+        self.history: deque = deque(maxlen=history_size)
+        self._subscribers: List[queue.Queue] = []
+        self._relays: List[asyncio.Queue] = []
+        self._next_id = 1
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread = None
+        self._pid = None
+        self._lock_file = None
+
+    @property
+    def socket_path(self) -> Optional[str]:
+        return os.path.splitext(self.lock_path)[0] + '.sock' if self.lock_path else None
+
+    def start(self):
+        """Uruchom pętlę (ponownie po fork() - wątki nie przechodzą do procesu potomnego)"""
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._subscribers = []
+            self._relays = []
+            # Blokada odziedziczona po rodzicu nie może trzymać przywództwa po jego śmierci
+            if self._lock_file is not None:
+                self._lock_file.close()
+            self._lock_file = None
+            self.leader = False
+            self.buses = {}
+            ready = threading.Event()
+            self._thread = threading.Thread(target=self._run, args=(ready,), name='modbus-gateway', daemon=True)
+            self._thread.start()
+            ready.wait()
+
+    def _run(self, ready: threading.Event):
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        self._loop = loop
+        if not loop.run_until_complete(self._try_lead()):
+            loop.create_task(self._follow())
+        ready.set()
+        loop.run_forever()
+
+    async def _try_lead(self) -> bool:
+        """Przejmij magistrale, jeśli nie obsługuje ich inny proces"""
+        if self.leader:
+            return True
+        if self.lock_path is not None and fcntl is not None:
+            os.makedirs(os.path.dirname(self.lock_path) or '.', exist_ok=True)
+            lock_file = open(self.lock_path, 'a')
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                lock_file.close()
+                return False
+            self._lock_file = lock_file
+            try:
+                # Gniazdo po poprzednim liderze zostaje na dysku
+                if os.path.exists(self.socket_path):
+                    os.unlink(self.socket_path)
+                await asyncio.start_unix_server(self._serve_relay, self.socket_path)
+            except OSError as e:
+                logger.error(f"❌ Bramka Modbus: brak gniazda dla pozostałych workerów ({self.socket_path}): {e}")
+            logger.info(f"✅ Bramka Modbus: magistrale obsługuje proces {os.getpid()}")
+        loop = asyncio.get_running_loop()
+        self.buses = {name: Bus(name, url, self) for name, url in self.bus_urls.items()}
+        for bus in self.buses.values():
+            loop.create_task(bus.run())
+        self.leader = True
+        return True
+
+    async def _follow(self):
+        """Proces bez magistral: zdarzenia lidera trafiają do lokalnej historii i strumieni SSE"""
+        while True:
+            try:
+                reader, writer = await asyncio.open_unix_connection(self.socket_path)
+                try:
+                    with self._lock:
+                        after = self.history[-1]['id'] if self.history else None
+                    writer.write(_relay_line({'op': 'subscribe', 'after': after}))
+                    await writer.drain()
+                    while True:
+                        line = await reader.readline()
+                        if not line:
+                            break
+                        self._deliver(json.loads(line))
+                finally:
+                    writer.close()
+            except (OSError, ValueError):
+                pass
+            # Lider zakończył pracę (lub jeszcze nie wystartował)
+            if await self._try_lead():
+                return
+            await asyncio.sleep(LEADER_RETRY_INTERVAL)
+
+    async def _serve_relay(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Lider: żądanie, statystyki lub subskrypcja zdarzeń od innego workera (jedna linia JSON)"""
+        try:
+            message = json.loads(await reader.readline())
+            if message.get('op') == 'subscribe':
+                await self._relay_events(message.get('after'), writer)
+                return
+            if message.get('op') == 'stats':
+                reply = {'result': self.stats()}
+            else:
+                try:
+                    result = await self.submit(bytes.fromhex(message['frame']), message.get('bus', 'default'))
+                    reply = {'result': result}
+                except KeyError as e:
+                    reply = {'error': f"Nieznana magistrala: {e}", 'kind': 'ModbusError'}
+                except ModbusError as e:
+                    reply = {'error': str(e), 'kind': type(e).__name__, 'event_id': e.event_id}
+            writer.write(_relay_line(reply))
+            await writer.drain()
+        except (OSError, ValueError, AttributeError):
+            pass
+        finally:
+            writer.close()
+
+    async def _relay_events(self, after: Optional[int], writer: asyncio.StreamWriter):
+        events: asyncio.Queue = asyncio.Queue(maxsize=1000)
+        with self._lock:
+            self._relays.append(events)
+            backlog = [e for e in self.history if after is None or e['id'] > after]
+        try:
+            for event in backlog:
+                writer.write(_relay_line(event))
+            while True:
+                await writer.drain()
+                writer.write(_relay_line(await events.get()))
+        finally:
+            with self._lock:
+                if events in self._relays:
+                    self._relays.remove(events)
+
+    async def _forward(self, message: Dict[str, Any]) -> Any:
+        """Wykonaj żądanie w procesie lidera"""
+        reader, writer = await asyncio.open_unix_connection(self.socket_path)
+        try:
+            writer.write(_relay_line(message))
+            await writer.drain()
+            line = await asyncio.wait_for(reader.readline(), self.request_timeout)
+        except asyncio.TimeoutError:
+            raise ModbusTimeout(f"Brak wyniku żądania w {self.request_timeout:.1f} s")
+        finally:
+            writer.close()
+        try:
+            reply = json.loads(line)
+        except ValueError:
+            raise ModbusError("Proces obsługujący magistrale zamknął połączenie")
+        if 'error' in reply:
+            error = RELAY_ERRORS.get(reply.get('kind'), ModbusError)(reply['error'])
+            error.event_id = reply.get('event_id')
+            raise error
+        return reply['result']
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        self.start()
+        return self._loop
+
+    async def submit(self, frame: bytes, bus: str = 'default') -> Dict[str, Any]:
+        if bus not in self.bus_urls:
+            raise KeyError(bus)
+        if not self.leader:
+            try:
+                return await self._forward({'op': 'request', 'frame': frame.hex(), 'bus': bus})
+            except OSError:
+                # Lider nie odpowiada - przejmujemy magistrale albo zgłaszamy błąd
+                if not await self._try_lead():
+                    raise ModbusError("Bramka Modbus w innym workerze jest niedostępna")
+        return await self.buses[bus].submit(frame)
+
+    def request(self, frame: bytes, bus: str = 'default') -> Dict[str, Any]:
+        """Wyślij ramkę i czekaj na odpowiedź (z wątku spoza pętli)"""
+        if bus not in self.bus_urls:
+            raise KeyError(bus)
+        future = asyncio.run_coroutine_threadsafe(self.submit(frame, bus), self.loop)
+        try:
+            return future.result(timeout=self.request_timeout)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            raise ModbusTimeout(f"Brak wyniku żądania w {self.request_timeout:.1f} s")
+
+    @property
+    def request_timeout(self) -> float:
+        """Najdłuższy czas obsługi żądania: kolejka, ramka przed nami (połączenie, odpowiedź,
+        odrzucenie spóźnionej odpowiedzi - 5 x timeout) i nasza własna ramka, z zapasem"""
+        return self.queue_timeout + 2 * (5 * self.timeout + self.frame_gap) + 1
+
+    def publish(self, event_type: str, bus: str, **data: Any) -> Dict[str, Any]:
+        """Zapisz zdarzenie w historii i roześlij do subskrybentów strumienia (w pętli bramki)"""
+        with self._lock:
+            event = {'id': self._next_id, 'type': event_type, 'bus': bus,
+                     'time': datetime.now().isoformat(timespec='milliseconds'), **data}
+            self._next_id += 1
+        self._deliver(event)
+        return event
+
+    def _deliver(self, event: Dict[str, Any]):
+        """Zdarzenie własne lub lidera: historia, strumienie SSE i workery podłączone do lidera"""
+        with self._lock:
+            # Numeracja kontynuowana po przejęciu magistral - Last-Event-ID dalej działa
+            self._next_id = max(self._next_id, event['id'] + 1)
+            self.history.append(event)
+            subscribers = list(self._subscribers)
+            relays = list(self._relays)
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait(event)
+            except queue.Full:
+                pass
+        for relay in relays:
+            try:
+                relay.put_nowait(event)
+            except asyncio.QueueFull:
+                pass
+
+    def stream(self, last_event_id: Optional[int] = None, heartbeat: float = 15.0,
+               queue_size: int = 1000) -> Iterator[str]:
+        """Generator strumienia SSE: zaległe zdarzenia z historii od last_event_id, potem na żywo"""
+        subscriber: queue.Queue = queue.Queue(maxsize=queue_size)
+        with self._lock:
+            self._subscribers.append(subscriber)
+            backlog = [e for e in self.history if last_event_id is not None and e['id'] > last_event_id]
+        try:
+            yield "retry: 3000\n\n"
+            for event in backlog:
+                yield format_sse(event)
+            while True:
+                try:
+                    yield format_sse(subscriber.get(timeout=heartbeat))
+                except queue.Empty:
+                    yield ": keep-alive\n\n"
+        finally:
+            with self._lock:
+                if subscriber in self._subscribers:
+                    self._subscribers.remove(subscriber)
+
+    def stats(self) -> Dict[str, Any]:
+        """Statystyki magistral (z wątku spoza pętli; w pozostałych workerach - od lidera)"""
+        with self._lock:
+            subscribers = len(self._subscribers)
+        running = self._thread is not None and self._thread.is_alive() and self._pid == os.getpid()
+        buses = {
+            name: dict(bus.stats, url=bus.url, connected=bus.connected, queued=bus.queue.qsize())
+            for name, bus in self.buses.items()
+        }
+        if running and not self.leader:
+            future = asyncio.run_coroutine_threadsafe(self._forward({'op': 'stats'}), self._loop)
+            try:
+                buses = future.result(timeout=self.timeout + 1)['buses']
+            except Exception:
+                future.cancel()
+        return {
+            'running': running,
+            'leader': self.leader,
+            'subscribers': subscribers,
+            'buses': buses,
+        }
+
+def _relay_line(message: Dict[str, Any]) -> bytes:
+    return json.dumps(message, ensure_ascii=False).encode('utf-8') + b'\n'
+
+def format_sse(event: Dict[str, Any]) -> str:
+    return f"id: {event['id']}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+
+class ModbusSimulator:
+    """Symulowany slave Modbus RTU (rejestry w pamięci) do testów bramki.
+
+    Na jednym porcie przyjmuje połączenia WebSocket (jak kontroler ESP) oraz
+    surowe RTU po TCP. Obsługuje funkcje 03, 04, 06 i 16.
+    """
+
+    def __init__(self, slave_ids=(1,), delay: float = 0.0):
+        self.registers: Dict[int, Dict[int, int]] = {slave_id: {} for slave_id in slave_ids}
+        self.delay = delay
+        self.requests = 0
+        self.connections = 0
+        self.max_connections = 0
+        self._server = None
+        self._writers = set()
+
+    def handle(self, frame: bytes) -> Optional[bytes]:
+        """Odpowiedź na ramkę żądania; None gdy slave nie odpowiada"""
+        if not crc_ok(frame):
+            return None
+        slave, function = frame[0], frame[1]
+        if slave != 0 and slave not in self.registers:
+            return None
+        self.requests += 1
+        targets = list(self.registers.values()) if slave == 0 else [self.registers[slave]]
+
+        if function in (3, 4) and slave != 0:
+            address, count = struct.unpack('>HH', frame[2:6])
+            if not 1 <= count <= 125:
+                return with_crc(bytes([slave, function | 0x80, 3]))
+            data = b''.join(targets[0].get(address + i, 0).to_bytes(2, 'big') for i in range(count))
+            return with_crc(bytes([slave, function, len(data)]) + data)
+        if function == 6:
+            address, value = struct.unpack('>HH', frame[2:6])
+            for registers in targets:
+                registers[address] = value
+            return frame if slave != 0 else None
+        if function == 16:
+            address, count = struct.unpack('>HH', frame[2:6])
+            values = struct.unpack(f'>{count}H', frame[7:7 + count * 2])
+            for registers in targets:
+                for i, value in enumerate(values):
+                    registers[address + i] = value
+            return with_crc(frame[:6]) if slave != 0 else None
+        return with_crc(bytes([slave, function | 0x80, 1])) if slave != 0 else None
+
+    async def start(self, host: str = '127.0.0.1', port: int = 0) -> int:
+        self._server = await asyncio.start_server(self._client, host, port)
+        return self._server.sockets[0].getsockname()[1]
+
+    async def close(self):
+        """Zatrzymaj symulator i zerwij otwarte połączenia (jak restart kontrolera)"""
+        if self._server is not None:
+            self._server.close()
+            for writer in list(self._writers):
+                writer.close()
+            await self._server.wait_closed()
+
+    async def _respond(self, frame: bytes) -> Optional[bytes]:
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        return self.handle(frame)
+
+    async def _client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.connections += 1
+        self.max_connections = max(self.max_connections, self.connections)
+        self._writers.add(writer)
+        try:
+            start = await reader.read(4)
+            if start == b'GET ':
+                await self._serve_websocket(start, reader, writer)
+            else:
+                await self._serve_tcp(start, reader, writer)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self.connections -= 1
+            self._writers.discard(writer)
+            writer.close()
+
+    async def _serve_websocket(self, start: bytes, reader, writer):
+        head = (start + await reader.readuntil(b'\r\n\r\n')).decode('latin-1')
+        key = next(line.split(':', 1)[1].strip() for line in head.split('\r\n')
+                   if line.lower().startswith('sec-websocket-key:'))
+        writer.write((
+            "HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+            f"Sec-WebSocket-Accept: {_ws_accept(key)}\r\n\r\n"
+        ).encode('ascii'))
+        while True:
+            _, opcode, payload = await _read_ws_frame(reader)
+            if opcode == 0x8:
+                return
+            try:
+                frame = bytes.fromhex(payload.decode('ascii')) if opcode == 0x1 else payload
+            except ValueError:
+                continue
+            response = await self._respond(frame)
+            if response is not None:
+                writer.write(_ws_frame(0x1, response.hex().upper().encode('ascii'), mask=False))
+                await writer.drain()
+
+    async def _serve_tcp(self, buffer: bytes, reader, writer):
+        while True:
+            expected = request_length(buffer)
+            if expected is None and crc_ok(buffer):
+                # Nieznana funkcja - ramką jest cały bufor z poprawnym CRC
+                expected = len(buffer)
+            if expected is not None and len(buffer) >= expected:
+                frame, buffer = buffer[:expected], buffer[expected:]
+                response = await self._respond(frame)
+                if response is not None:
+                    writer.write(response)
+                    await writer.drain()
+                continue
+            chunk = await reader.read(512)
+            if not chunk:
+                return
+            buffer += chunk
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    if len(sys.argv) < 2 or sys.argv[1] != 'simulate':
+        print("Użycie: python modbus_gateway.py simulate [port]")
+        sys.exit(1)
+
+    async def main():
+        simulator = ModbusSimulator(slave_ids=(1, 100, 150, 200))
+        port = await simulator.start('0.0.0.0', int(sys.argv[2]) if len(sys.argv) > 2 else 8502)
+        logger.info(f"✅ Symulator Modbus na porcie {port} (ws://127.0.0.1:{port}/ lub tcp://127.0.0.1:{port})")
+        await asyncio.Event().wait()
+
+    asyncio.run(main())
@@ -0,0 +1,359 @@
+# modbus_polling.py
+"""Cykliczny odczyt rejestrów urządzeń Modbus przez bramkę (modbus_gateway).
+
+Mapa rejestrów jest w modbus_points.json: urządzenia (slave, magistrala) i ich
+punkty pomiarowe z własnym interwałem. Punkty wymagalne w danej chwili są
+łączone w bloki sąsiednich rejestrów czytane jedną ramką funkcji 03/04, a
+przy odczycie bloku odświeżane są też pozostałe punkty, które się w nim
+mieszczą. Slave bez odpowiedzi jest odpytywany coraz rzadziej (wykładniczo,
+do max_backoff), więc nie zajmuje magistrali timeoutami.
+"""
+import os
+import json
+import time
+import struct
+import asyncio
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple, Any
+import logging
+
+from modbus_gateway import ModbusError, with_crc
+
+try:
+    import fcntl
+except ImportError:  # Windows - jeden proces serwera, blokada niepotrzebna
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+POINTS_FILE = 'modbus_points.json'
+LOCK_FILE = 'cache/modbus_polling.lock'
+# Rejestry na punkt wg typu wartości
+TYPE_REGISTERS = {'uint16': 1, 'int16': 1, 'uint32': 2, 'int32': 2, 'float32': 2}
+# Limit rejestrów w jednej ramce odczytu (Modbus pozwala na 125)
+MAX_BLOCK_REGISTERS = 64
+# Przerwa (w rejestrach) między punktami, którą opłaca się doczytać zamiast wysyłać osobną ramkę
+MAX_BLOCK_GAP = 8
+
+class Point:
+    """Punkt pomiarowy: rejestr(y) jednego slave'a z interwałem odczytu"""
+
+    def __init__(self, device: Dict[str, Any], config: Dict[str, Any]):
+        self.device = device['name']
+        self.bus = device.get('bus', 'default')
+        self.slave = int(device['slave'])
+        self.word_order = device.get('word_order', 'big')
+        self.name = config['name']
+        self.address = int(config['address'])
+        self.type = config.get('type', 'uint16')
+        if self.type not in TYPE_REGISTERS:
+            raise ValueError(f"Nieznany typ punktu {self.device}.{self.name}: {self.type}")
+        self.count = TYPE_REGISTERS[self.type]
+        self.function = int(config.get('function', device.get('function', 3)))
+        self.interval = float(config.get('interval', device.get('interval', 10)))
+        self.scale = float(config.get('scale', 1))
+        self.unit = config.get('unit')
+        self.next_due = 0.0
+        self.value = None
+        self.updated_at = None
+
+    @property
+    def key(self) -> Tuple[str, int, int]:
+        return (self.bus, self.slave, self.function)
+
+    @property
+    def end(self) -> int:
+        return self.address + self.count
+
+    def decode(self, registers: List[int]) -> float:
+        if self.count == 2 and self.word_order == 'little':
+            registers = registers[::-1]
+        raw = b''.join(register.to_bytes(2, 'big') for register in registers)
+        value = struct.unpack({'uint16': '>H', 'int16': '>h', 'uint32': '>I',
+                               'int32': '>i', 'float32': '>f'}[self.type], raw)[0]
+        return round(value * self.scale, 6) if self.scale != 1 else value
+
+class Block:
+    """Ciągły zakres rejestrów jednego slave'a czytany jedną ramką"""
+
+    def __init__(self, point: Point):
+        self.bus, self.slave, self.function = point.key
+        self.address = point.address
+        self.end = point.end
+        self.points = [point]
+
+    @property
+    def count(self) -> int:
+        return self.end - self.address
+
+    def frame(self) -> bytes:
+        return with_crc(struct.pack('>BBHH', self.slave, self.function, self.address, self.count))
+
+def plan_blocks(points: List[Point], max_gap: int = MAX_BLOCK_GAP,
+                max_registers: int = MAX_BLOCK_REGISTERS) -> List[Block]:
+    """Połącz punkty w bloki: ten sam slave i funkcja, przerwy do max_gap rejestrów"""
+    blocks: List[Block] = []
+    current: Optional[Block] = None
+    for point in sorted(points, key=lambda p: (p.key, p.address)):
+        if (current is not None and point.key == (current.bus, current.slave, current.function)
+                and point.address - current.end <= max_gap
+                and max(current.end, point.end) - current.address <= max_registers):
+            current.end = max(current.end, point.end)
+            current.points.append(point)
+            continue
+        current = Block(point)
+        blocks.append(current)
+    return blocks
+
+class SlaveState:
+    """Dostępność slave'a i odroczenie kolejnych prób po błędach"""
+
+    def __init__(self):
+        self.failures = 0
+        self.retry_at = 0.0
+        self.last_error = None
+        self.last_success = None
+
+    @property
+    def online(self) -> bool:
+        return self.failures == 0 and self.last_success is not None
+
+class PollingEngine:
+    """Harmonogram odczytów działający jako zadanie w pętli bramki Modbus.
+
+    Słuchacze (add_listener) dostają po każdym bloku listę próbek
+    {'series', 'device', 'point', 'value', 'unit', 'interval', 'ts', 'time'}
+    w formacie TelemetryStore.record.
+    """
+
+    def __init__(self, gateway, points_file: str = POINTS_FILE, lock_path: str = LOCK_FILE,
+                 base_backoff: float = 5.0, max_backoff: float = 300.0, reload_interval: float = 10.0):
+        self.gateway = gateway
+        self.points_file = points_file
+        self.lock_path = lock_path
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.reload_interval = reload_interval
+        self.points: List[Point] = []
+        self.slaves: Dict[Tuple[str, int], SlaveState] = {}
+        self._by_key: Dict[Tuple[str, int, int], List[Point]] = {}
+        self._listeners: List[Callable[[List[Dict[str, Any]]], None]] = []
+        self._config_mtime = None
+        self._last_reload_check = 0.0
+        self._task = None
+        self._pid = None
+        self._lock_file = None
+        self._stats = {
+            'leader': False,
+            'transactions': 0,
+            'points_read': 0,
+            'errors': 0,
+            'skipped_offline': 0,
+        }
+
+    def add_listener(self, listener: Callable[[List[Dict[str, Any]]], None]):
+        self._listeners.append(listener)
+
+    def start(self):
+        """Uruchom zadanie w pętli bramki (ponownie po fork()); bez mapy rejestrów nic nie robi"""
+        if self._pid == os.getpid() or not os.path.exists(self.points_file):
+            return
+        self._pid = os.getpid()
+        self._stats['leader'] = False
+        self._task = asyncio.run_coroutine_threadsafe(self.run(), self.gateway.loop)
+
+    def _acquire_leadership(self) -> bool:
+        """Tylko jeden proces odpytuje urządzenia - blokada na pliku lock_path"""
+        if fcntl is None:
+            return True
+        os.makedirs(os.path.dirname(self.lock_path) or '.', exist_ok=True)
+        lock_file = open(self.lock_path, 'a')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self._lock_file = lock_file
+        return True
+
+    def load(self):
+        """Wczytaj mapę rejestrów; przy błędzie zostaje poprzednia"""
+        try:
+            mtime = os.path.getmtime(self.points_file)
+        except OSError:
+            if self.points:
+                logger.warning(f"⚠️ Brak pliku {self.points_file} - odczyty cykliczne wyłączone")
+            self.points, self._by_key, self._config_mtime = [], {}, None
+            return
+        if mtime == self._config_mtime:
+            return
+        try:
+            with open(self.points_file, encoding='utf-8') as f:
+                config = json.load(f)
+            points = [Point(device, point) for device in config.get('devices', [])
+                      if device.get('enabled', True) for point in device.get('points', [])]
+        except (OSError, ValueError, KeyError) as e:
+            logger.error(f"❌ Błąd mapy rejestrów {self.points_file}: {e}")
+            self._config_mtime = mtime
+            return
+
+        unknown = {point.bus for point in points} - set(self.gateway.bus_urls)
+        if unknown:
+            logger.warning(f"⚠️ Punkty na nieznanych magistralach pominięte: {', '.join(sorted(unknown))}")
+            points = [point for point in points if point.bus not in unknown]
+
+        # Zachowaj ostatnie wartości punktów, które nie zmieniły definicji
+        previous = {(p.device, p.name): p for p in self.points}
+        for point in points:
+            old = previous.get((point.device, point.name))
+            if old is not None and (old.key, old.address, old.type) == (point.key, point.address, point.type):
+                point.value, point.updated_at = old.value, old.updated_at
+
+        by_key: Dict[Tuple[str, int, int], List[Point]] = {}
+        for point in points:
+            by_key.setdefault(point.key, []).append(point)
+        self.points, self._by_key, self._config_mtime = points, by_key, mtime
+        logger.info(f"✅ Mapa rejestrów: {len(points)} punktów, "
+                    f"{len({(p.bus, p.slave) for p in points})} urządzeń")
+
+    def _slave(self, bus: str, slave: int) -> SlaveState:
+        state = self.slaves.get((bus, slave))
+        if state is None:
+            state = self.slaves[(bus, slave)] = SlaveState()
+        return state
+
+    async def run(self):
+        while not self._acquire_leadership():
+            # Inny worker odpytuje; przejmujemy zadanie, gdy zakończy pracę
+            await asyncio.sleep(30)
+        self._stats['leader'] = True
+        while True:
+            try:
+                now = time.monotonic()
+                if now - self._last_reload_check >= self.reload_interval:
+                    self._last_reload_check = now
+                    self.load()
+                await self.poll_due(now)
+            except Exception as e:
+                self._stats['errors'] += 1
+                logger.error(f"❌ Błąd cyklicznych odczytów Modbus: {e}")
+            await asyncio.sleep(self._sleep_time())
+
+    def _sleep_time(self) -> float:
+        if not self.points:
+            return self.reload_interval
+        now = time.monotonic()
+        next_due = min(max(point.next_due, self._slave(point.bus, point.slave).retry_at)
+                       for point in self.points)
+        return min(max(next_due - now, 0.05), self.reload_interval)
+
+    async def poll_due(self, now: float):
+        """Odczytaj wymagalne punkty; magistrale równolegle, bloki jednej magistrali po kolei"""
+        due = []
+        for point in self.points:
+            if point.next_due > now:
+                continue
+            if self._slave(point.bus, point.slave).retry_at > now:
+                self._stats['skipped_offline'] += 1
+                continue
+            due.append(point)
+        if not due:
+            return
+
+        by_bus: Dict[str, List[Block]] = {}
+        for block in plan_blocks(due):
+            by_bus.setdefault(block.bus, []).append(block)
+        await asyncio.gather(*(self._read_blocks(blocks) for blocks in by_bus.values()))
+
+    async def _read_blocks(self, blocks: List[Block]):
+        for block in blocks:
+            state = self._slave(block.bus, block.slave)
+            # Poprzedni blok tego slave'a mógł się właśnie nie udać
+            if state.retry_at > time.monotonic():
+                continue
+            await self._read_block(block, state)
+
+    async def _read_block(self, block: Block, state: SlaveState):
+        self._stats['transactions'] += 1
+        try:
+            result = await self.gateway.submit(block.frame(), block.bus)
+            if result['exception'] is not None:
+                raise ModbusError(f"wyjątek Modbus {result['exception']}")
+            response = bytes.fromhex(result['response'])
+            data = response[3:3 + response[2]]
+            if len(data) != block.count * 2:
+                raise ModbusError(f"odpowiedź ma {len(data)} B zamiast {block.count * 2} B")
+        except ModbusError as e:
+            self._fail(block, state, str(e))
+            return
+
+        registers = list(struct.unpack(f'>{block.count}H', data))
+        now = time.monotonic()
+        ts = int(time.time())
+        timestamp = datetime.fromtimestamp(ts).isoformat()
+        samples = []
+        # Wszystkie punkty mieszczące się w odczytanym zakresie, także te jeszcze niewymagalne
+        for point in self._by_key.get((block.bus, block.slave, block.function), []):
+            if point.address < block.address or point.end > block.end:
+                continue
+            offset = point.address - block.address
+            point.value = point.decode(registers[offset:offset + point.count])
+            point.updated_at = timestamp
+            point.next_due = now + point.interval
+            samples.append({'series': f"{point.device}.{point.name}", 'device': point.device,
+                            'point': point.name, 'value': point.value, 'unit': point.unit,
+                            'interval': point.interval, 'ts': ts, 'time': timestamp})
+        self._stats['points_read'] += len(samples)
+
+        if state.failures:
+            logger.info(f"✅ Modbus: slave {block.slave} ({block.bus}) znów odpowiada")
+        state.failures = 0
+        state.retry_at = 0.0
+        state.last_error = None
+        state.last_success = timestamp
+
+        for listener in self._listeners:
+            try:
+                listener(samples)
+            except Exception as e:
+                logger.error(f"❌ Błąd odbiorcy odczytów Modbus: {e}")
+
+    def _fail(self, block: Block, state: SlaveState, error: str):
+        self._stats['errors'] += 1
+        state.failures += 1
+        state.last_error = error
+        delay = min(self.base_backoff * 2 ** (state.failures - 1), self.max_backoff)
+        state.retry_at = time.monotonic() + delay
+        if state.failures == 1:
+            logger.warning(f"⚠️ Modbus: slave {block.slave} ({block.bus}) nie odpowiada: {error}")
+
+    def values(self) -> List[Dict[str, Any]]:
+        """Ostatnie wartości wszystkich punktów"""
+        return [{
+            'device': point.device,
+            'point': point.name,
+            'bus': point.bus,
+            'slave': point.slave,
+            'address': point.address,
+            'value': point.value,
+            'unit': point.unit,
+            'interval': point.interval,
+            'updated_at': point.updated_at,
+            'online': self._slave(point.bus, point.slave).online,
+        } for point in self.points]
+
+    def stats(self) -> Dict[str, Any]:
+        stats = dict(self._stats)
+        stats['points'] = len(self.points)
+        stats['points_per_transaction'] = (round(stats['points_read'] / stats['transactions'], 2)
+                                           if stats['transactions'] else None)
+        stats['slaves'] = {
+            f"{bus}/{slave}": {
+                'online': state.online,
+                'failures': state.failures,
+                'last_error': state.last_error,
+                'last_success': state.last_success,
+                'retry_in': round(max(state.retry_at - time.monotonic(), 0), 1),
+            } for (bus, slave), state in self.slaves.items()
+        }
+        return stats
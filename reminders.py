@@ -0,0 +1,124 @@
+# reminders.py
+import os
+import heapq
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Tuple, Any
+import logging
+
+logger = logging.getLogger(__name__)
+
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+def _to_epoch(timestamp: str) -> float:
+    return datetime.strptime(timestamp, TIMESTAMP_FORMAT).replace(tzinfo=timezone.utc).timestamp()
+
+class ReminderScheduler:
+    """Wykonywanie przypomnień notatek (notes.remind_at) w wątku w tle.
+
+    Kopiec trzyma terminy z najbliższego horyzontu, więc wątek śpi dokładnie do
+    najbliższego przypomnienia. Kopiec jest przeładowywany z indeksu częściowego
+    tylko gdy zmieni się licznik wersji tabeli notes. Przejęcie przypomnienia
+    odbywa się w bazie (claim_due_reminders), więc przy wielu workerach każde
+    przypomnienie trafia do alertów dokładnie raz.
+    """
+
+    def __init__(self, db, broker=None, horizon: float = 3600, poll_interval: float = 5.0,
+                 batch_size: int = 100):
+        self.db = db
+        self.broker = broker
+        self.horizon = horizon
+        self.poll_interval = poll_interval
+        self.batch_size = batch_size
+        self._heap: List[Tuple[float, int]] = []
+        self._notes_version = None
+        self._loaded_until = 0.0
+        self._wakeup = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._stats = {
+            'fired': 0,
+            'reloads': 0,
+            'errors': 0,
+            'last_fired': None,
+        }
+
+    def start(self):
+        """Uruchom wątek (ponownie po fork() - wątki nie przechodzą do procesu potomnego)"""
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._heap = []
+            self._notes_version = None
+            self._thread = threading.Thread(target=self._run, name='note-reminders', daemon=True)
+            self._thread.start()
+
+    def notify(self):
+        """Wybudź wątek po zmianie notatki w tym procesie"""
+        self._wakeup.set()
+
+    def _run(self):
+        while True:
+            try:
+                timeout = self._tick()
+            except Exception as e:
+                self._stats['errors'] += 1
+                logger.error(f"❌ Błąd harmonogramu przypomnień: {e}")
+                timeout = self.poll_interval
+            self._wakeup.wait(timeout)
+            self._wakeup.clear()
+
+    def _tick(self) -> float:
+        """Jeden obieg: przeładuj kopiec jeśli trzeba, wykonaj wymagalne; zwraca czas snu"""
+        now = time.time()
+        version = self.db.get_change_versions(['notes']).get('notes')
+        if version != self._notes_version or now >= self._loaded_until:
+            self._reload(now)
+            self._notes_version = version
+
+        if self._heap and self._heap[0][0] <= now:
+            # Najpierw przejęcie w bazie - gdy się nie uda, terminy zostają w kopcu
+            # i kolejny obieg (po poll_interval) spróbuje ponownie
+            self._fire()
+            while self._heap and self._heap[0][0] <= now:
+                heapq.heappop(self._heap)
+            # Zapis do notes zmienił wersję - kolejny obieg przeładuje kopiec
+            return 0
+
+        sleep = self.poll_interval
+        if self._heap:
+            sleep = min(sleep, self._heap[0][0] - now)
+        return max(sleep, 0)
+
+    def _reload(self, now: float):
+        until = datetime.fromtimestamp(now + self.horizon, timezone.utc).strftime(TIMESTAMP_FORMAT)
+        pending = self.db.get_upcoming_reminders(until)
+        self._heap = [(_to_epoch(row['remind_at']), row['id']) for row in pending]
+        heapq.heapify(self._heap)
+        self._loaded_until = now + self.horizon / 2
+        self._stats['reloads'] += 1
+
+    def _fire(self):
+        while True:
+            claimed = self.db.claim_due_reminders(limit=self.batch_size)
+            if claimed:
+                self._stats['fired'] += len(claimed)
+                self._stats['last_fired'] = datetime.now().isoformat()
+                if self.broker is not None:
+                    self.broker.notify()
+            if len(claimed) < self.batch_size:
+                return
+
+    def stats(self) -> Dict[str, Any]:
+        heap = self._heap
+        stats = dict(self._stats)
+        stats['pending_in_horizon'] = len(heap)
+        stats['next_due'] = (datetime.fromtimestamp(heap[0][0], timezone.utc).strftime(TIMESTAMP_FORMAT)
+                             if heap else None)
+        stats['running'] = self._thread is not None and self._thread.is_alive()
+        return stats
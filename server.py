@@ -1,9 +1,33 @@
 # server.py
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, request, jsonify, send_file, Response, stream_with_context, make_response
+from werkzeug.exceptions import RequestedRangeNotSatisfiable
+from werkzeug.wsgi import wrap_file
 from flask_cors import CORS
-from database import DashboardDB
+from database import (DashboardDB, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, PoolTimeout, build_fts_query,
+                      decode_cursor, encode_cursor, next_cursor, normalize_alert_time)
+import warehouse_io
+import events
+import reminders
+import static_assets
+import bundles
+import file_index
+import fast_json
+import modbus_gateway
+import modbus_polling
+import telemetry
+import analytics
+import device_monitor
+import thumbnails
 import os
 import glob
+import sqlite3
+import json
+import hashlib
+import mimetypes
+import math
+from urllib.parse import quote
+from datetime import datetime, timezone
+from functools import wraps
 import logging
 from typing import Dict, Any, Optional
 
@@ -12,6 +36,8 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
+# jsonify i request.get_json przez orjson (gdy dostępny)
+app.json = fast_json.FastJSONProvider(app)
 CORS(app)
 
 # Inicjalizacja bazy danych
@@ -22,9 +48,151 @@ except Exception as e:
     logger.error(f"❌ Błąd inicjalizacji bazy danych: {e}")
     db = None
 
+# Kanał zdarzeń SSE (wątek rozsyłający startuje przy pierwszym kliencie)
+broker = events.EventBroker(db) if db is not None else None
+# Przypomnienia notatek (wątek startuje w każdym workerze przy pierwszym żądaniu)
+reminder_scheduler = reminders.ReminderScheduler(db, broker) if db is not None else None
+
+@app.before_request
+def start_background_workers():
+    if reminder_scheduler is not None:
+        reminder_scheduler.start()
+    file_search.start()
+    modbus_poller.start()
+    if availability_monitor is not None:
+        availability_monitor.start()
+
 # Stała katalogu FILES
 FILES_DIRECTORY = "FILES"
 
+# Wysyłanie plików z FILES przez serwer przed aplikacją (za nginx/Apache):
+# DASHBOARD_FILE_OFFLOAD=x-accel-redirect lub x-sendfile; domyślnie strumień z Pythona
+FILE_OFFLOAD = os.environ.get('DASHBOARD_FILE_OFFLOAD', '').lower()
+# Lokalizacja internal w nginx wskazująca na katalog FILES (alias .../FILES/)
+FILE_ACCEL_PREFIX = os.environ.get('DASHBOARD_FILE_ACCEL_PREFIX', '/internal/files/')
+# Rozmiar porcji przy strumieniowaniu - pamięć na żądanie nie zależy od rozmiaru pliku
+FILE_CHUNK_SIZE = 256 * 1024
+
+# Listingi katalogów FILES w pamięci (unieważniane przez inotify lub odpytywanie)
+directory_cache = file_index.DirectoryCache()
+# Trwały indeks całego drzewa FILES do wyszukiwania (budowany w tle)
+file_search = file_index.FileSearchIndex(FILES_DIRECTORY)
+# Miniatury dla galerii (pula procesów i cache na dysku; bez Pillow - oryginały)
+thumbnail_service = thumbnails.ThumbnailService(os.path.join(app.root_path, thumbnails.THUMBNAIL_DIRECTORY))
+
+# Bramka Modbus - jedno połączenie z kontrolerem na magistralę zamiast gniazda z każdej konsoli
+# DASHBOARD_MODBUS_BUSES="default=ws://control.local:81/,rs485b=tcp://10.0.0.5:502"
+# Przy wielu workerach magistrale obsługuje jeden proces (blokada), pozostałe przekazują mu żądania
+modbus = modbus_gateway.ModbusGateway(modbus_gateway.parse_bus_config(
+    os.environ.get('DASHBOARD_MODBUS_BUSES', modbus_gateway.DEFAULT_BUSES)),
+    lock_path=os.path.join(app.root_path, modbus_gateway.LOCK_FILE))
+# Cykliczne odczyty punktów z modbus_points.json (zadanie w pętli bramki, jeden worker)
+modbus_poller = modbus_polling.PollingEngine(
+    modbus, os.path.join(app.root_path, modbus_polling.POINTS_FILE),
+    os.path.join(app.root_path, modbus_polling.LOCK_FILE))
+# Historia odczytów (telemetry.db) z agregatami 1 min / 1 h / 1 dzień
+telemetry_store = telemetry.TelemetryStore()
+modbus_poller.add_listener(telemetry_store.record)
+# Dostępność urządzeń sprawdzana przez serwer (jeden worker), wynik w tabeli device_status
+# DASHBOARD_DEVICES="control=http://control.local/ping,kwiatomat=tcp://kwiatomat.local:80"
+availability_monitor = device_monitor.DeviceMonitor(
+    db, device_monitor.parse_device_config(os.environ.get('DASHBOARD_DEVICES', device_monitor.DEFAULT_DEVICES)),
+    lock_path=os.path.join(app.root_path, device_monitor.LOCK_FILE)) if db is not None else None
+
+# Zbudowane zasoby statyczne (data/dist) - manifest wczytany raz przy starcie
+PRODUCTION = static_assets.is_production()
+assets = static_assets.AssetStore(app.root_path)
+_index_cache = {'mtime': None, 'html': None}
+
+# Fragmenty zakładek w pamięci; w trybie deweloperskim przeładowywane po zmianie plików
+fragments = bundles.FragmentIndex(app.root_path, auto_reload=not PRODUCTION)
+# W produkcji lista plików statycznych jest budowana raz (bez stat() na każde żądanie)
+static_files = static_assets.index_static_files(app.root_path) if PRODUCTION else None
+
+def send_asset(entry: Dict[str, Any], immutable: bool):
+    """Wyślij zbudowany zasób w wariancie wybranym wg Accept-Encoding"""
+    encoding = assets.choose_encoding(entry, request.headers.get('Accept-Encoding', ''))
+    response = send_file(
+        assets.file_for(entry, encoding),
+        mimetype=assets.content_type(entry),
+        conditional=True,
+        etag=f"{entry['hash']}-{encoding or 'identity'}"
+    )
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.headers['Vary'] = 'Accept-Encoding'
+    # Nazwa z hashem nigdy nie zmienia treści; zwykła ścieżka musi być walidowana
+    response.headers['Cache-Control'] = static_assets.IMMUTABLE_CACHE_CONTROL if immutable else 'no-cache'
+    return response
+
+def send_thumbnail(path: str):
+    """Miniatura z cache (ETag = klucz miniatury); None gdy nie udało się jej wygenerować"""
+    stat = os.stat(path)
+    etag = thumbnail_service.key(path, stat)
+    # ?v=<mtime> z listingu zmienia się razem z plikiem - wtedy przeglądarka nie musi walidować
+    cache_control = 'private, max-age=86400' if request.args.get('v') else 'no-cache'
+    if request.if_none_match.contains(etag):
+        response = make_response('', 304)
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = cache_control
+        return response
+    
+    cached = thumbnail_service.get(path, stat)
+    if cached is None:
+        return None
+    response = send_file(cached, mimetype=thumbnail_service.mimetype, conditional=True, etag=etag)
+    response.headers['Cache-Control'] = cache_control
+    return response
+
+def send_large_file(path: str):
+    """Wyślij plik z FILES z obsługą Range/If-Range i walidacją ETag/Last-Modified.
+
+    W trybie x-accel-redirect/x-sendfile odpowiedź zawiera tylko nagłówek, a plik
+    (razem z zakresami) wysyła nginx/Apache. W przeciwnym razie plik jest
+    strumieniowany porcjami FILE_CHUNK_SIZE (lub przez wsgi.file_wrapper serwera,
+    np. sendfile() w gunicornie).
+    """
+    mimetype = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+    if FILE_OFFLOAD == 'x-accel-redirect':
+        relative = os.path.relpath(os.path.abspath(path), os.path.abspath(FILES_DIRECTORY))
+        response = Response(mimetype=mimetype)
+        response.headers['X-Accel-Redirect'] = FILE_ACCEL_PREFIX + quote(relative.replace(os.sep, '/'))
+        return response
+    if FILE_OFFLOAD == 'x-sendfile':
+        response = Response(mimetype=mimetype)
+        response.headers['X-Sendfile'] = os.path.abspath(path)
+        return response
+    
+    file = open(path, 'rb')
+    try:
+        stat = os.fstat(file.fileno())
+        response = Response(wrap_file(request.environ, file, buffer_size=FILE_CHUNK_SIZE),
+                            mimetype=mimetype, direct_passthrough=True)
+        response.content_length = stat.st_size
+        response.last_modified = stat.st_mtime
+        response.set_etag(f"{stat.st_mtime_ns:x}-{stat.st_size:x}")
+        response.headers['Cache-Control'] = 'no-cache'
+        # Kilka zakresów naraz (multipart/byteranges) nie jest obsługiwane - wtedy cały plik
+        single_range = ',' not in request.headers.get('Range', '')
+        return response.make_conditional(request, accept_ranges=True,
+                                         complete_length=stat.st_size if single_range else None)
+    except RequestedRangeNotSatisfiable as e:
+        file.close()
+        return e.get_response()
+    except Exception:
+        file.close()
+        raise
+
+def render_index() -> str:
+    """app.html z odwołaniami do zasobów z hashem (przeliczane tylko po zmianie pliku)"""
+    path = os.path.join(app.root_path, 'app.html')
+    mtime = os.stat(path).st_mtime
+    if _index_cache['mtime'] != mtime:
+        with open(path, encoding='utf-8') as f:
+            _index_cache['html'] = assets.rewrite_html(f.read())
+        _index_cache['mtime'] = mtime
+    return _index_cache['html']
+
 def safe_path_check(path: str, base_directory: str) -> bool:
     """Bezpieczne sprawdzenie ścieżki przed path traversal"""
     try:
@@ -40,12 +208,117 @@ def get_db_connection():
         raise Exception("Baza danych nie jest dostępna")
     return db.get_connection()
 
+def get_page_params(table: str) -> Optional[Dict[str, Any]]:
+    """Parametry stronicowania (?limit=&cursor=) lub None dla pełnej listy; ValueError przy błędzie"""
+    if 'limit' not in request.args and 'cursor' not in request.args:
+        return None
+    
+    limit = request.args.get('limit', DEFAULT_PAGE_SIZE, type=int)
+    if limit is None or limit < 1:
+        raise ValueError("Limit must be a positive integer")
+    limit = min(limit, MAX_PAGE_SIZE)
+    
+    cursor = request.args.get('cursor')
+    after = decode_cursor(table, cursor) if cursor else None
+    return {'limit': limit, 'after': after}
+
+def server_error(error: Exception):
+    """Odpowiedź na błąd w handlerze: 503 gdy zabrakło połączeń w puli (klient może ponowić), inaczej 500"""
+    if isinstance(error, PoolTimeout):
+        return jsonify({'success': False, 'error': 'Database busy'}), 503, {'Retry-After': '1'}
+    return jsonify({'success': False, 'error': 'Internal server error'}), 500
+
+def list_response(table: str, rows, page: Optional[Dict[str, Any]], has_more: Optional[bool] = None):
+    """Odpowiedź listy z tokenem kolejnej strony, gdy użyto stronicowania.
+
+    has_more - wynik odczytu limit+1 wierszy; bez niego pełna strona oznacza możliwy ciąg dalszy.
+    """
+    rows = rows or []
+    response = {
+        'success': True,
+        'data': rows,
+        'total': len(rows)
+    }
+    if page is not None:
+        if has_more is None:
+            response['next_cursor'] = next_cursor(table, rows, page['limit'])
+        else:
+            response['next_cursor'] = encode_cursor(table, rows[-1]) if has_more and rows else None
+            response['has_more'] = has_more
+        response['limit'] = page['limit']
+    return jsonify(response)
+
+def stream_list_response(batches):
+    """Pełna lista strumieniowo (porcje RowBatches) - stała pamięć niezależnie od rozmiaru tabeli"""
+    return Response(fast_json.stream_list(batches), mimetype='application/json')
+
+def conditional(*tables: str):
+    """Obsługa ETag/Last-Modified na podstawie wersji tabel z change_versions.
+
+    Gdy klient ma aktualną wersję (If-None-Match), zwracane jest 304 bez
+    wykonywania zapytania i budowania JSON-a.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if db is None:
+                return view(*args, **kwargs)
+            
+            try:
+                versions = db.get_change_versions(tables)
+            except PoolTimeout as e:
+                return server_error(e)
+            except Exception as e:
+                logger.warning(f"⚠️ Brak wersji tabel {tables}: {e}")
+                return view(*args, **kwargs)
+            
+            # ETag zależy od wersji tabel i parametrów zapytania (inne filtry = inna treść)
+            version_key = ';'.join(f"{table}:{versions.get(table, (0, None))[0]}" for table in tables)
+            digest = hashlib.sha1(
+                f"{request.path}?{request.query_string.decode('latin-1')}|{version_key}".encode('utf-8')
+            ).hexdigest()[:20]
+            etag = f"{'-'.join(tables)}-{digest}"
+            
+            timestamps = [
+                datetime.strptime(updated_at, '%Y-%m-%d %H:%M:%S').replace(tzinfo=timezone.utc)
+                for _, updated_at in versions.values() if updated_at
+            ]
+            last_modified = max(timestamps) if timestamps else None
+            
+            not_modified = False
+            if request.if_none_match:
+                not_modified = request.if_none_match.contains(etag)
+            elif last_modified is not None and request.if_modified_since is not None:
+                not_modified = last_modified <= request.if_modified_since
+            
+            if not_modified:
+                response = make_response('', 304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            
+            response.set_etag(etag)
+            if last_modified is not None:
+                response.last_modified = last_modified
+            # Przeglądarka może trzymać odpowiedź, ale musi ją zawsze walidować
+            response.headers['Cache-Control'] = 'no-cache'
+            return response
+        return wrapper
+    return decorator
+
 @app.route('/')
 def index():
     """Strona główna - serwuje app.html"""
     try:
-        if os.path.exists('app.html'):
-            return send_file('app.html')
+        if os.path.exists(os.path.join(app.root_path, 'app.html')):
+            if not assets.available:
+                return send_file('app.html')
+            response = make_response(render_index())
+            response.headers['Content-Type'] = 'text/html; charset=utf-8'
+            response.headers['Cache-Control'] = 'no-cache'
+            response.add_etag()
+            return response.make_conditional(request)
         else:
             return """
             <html>
@@ -83,7 +356,7 @@ def index():
             """, 404
     except Exception as e:
         logger.error(f"Błąd strony głównej: {e}")
-        return jsonify({'success': False, 'error': 'Internal server error'}), 500
+        return server_error(e)
 
 @app.route('/<path:filename>')
 def serve_static(filename):
@@ -93,13 +366,52 @@ def serve_static(filename):
         if '..' in filename or filename.startswith('/'):
             return "Access denied", 403
         
-        if os.path.exists(filename) and os.path.isfile(filename):
+        # Mapy źródeł tylko w trybie deweloperskim
+        if PRODUCTION and filename.endswith('.map'):
+            return "File not found", 404
+        
+        asset = assets.lookup(filename)
+        if asset is not None:
+            return send_asset(*asset)
+        
+        if static_files is not None:
+            exists = filename in static_files
+        else:
+            exists = os.path.isfile(os.path.join(app.root_path, filename))
+        if exists:
             return send_file(filename)
         else:
             return "File not found", 404
     except Exception as e:
         logger.error(f"Błąd serwowania pliku {filename}: {e}")
-        return jsonify({'success': False, 'error': 'Internal server error'}), 500
+        return server_error(e)
+
+# PACZKI ZAKŁADEK
+@app.route('/api/bundle')
+@app.route('/api/bundle/<tab>')
+def get_bundle(tab=None):
+    """Wszystkie fragmenty (app.html + app.js) zakładki lub całej powłoki w jednej odpowiedzi"""
+    try:
+        bundle = fragments.bundle(tab)
+        if bundle is None:
+            return jsonify({'success': False, 'error': f'Unknown tab: {tab}'}), 404
+        
+        encoding = static_assets.negotiate_encoding(request.headers.get('Accept-Encoding', ''), ('gzip',))
+        response = Response(bundle['gzip'] if encoding else bundle['body'], mimetype='application/json')
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        response.headers['Vary'] = 'Accept-Encoding'
+        response.set_etag(f"{bundle['version']}-{encoding or 'identity'}")
+        # ?v=<wersja> wskazuje konkretną treść - można ją trzymać bez walidacji
+        if request.args.get('v') == bundle['version']:
+            response.headers['Cache-Control'] = static_assets.IMMUTABLE_CACHE_CONTROL
+        else:
+            response.headers['Cache-Control'] = 'no-cache'
+        return response.make_conditional(request)
+    
+    except Exception as e:
+        logger.error(f"Error in get_bundle: {str(e)}")
+        return server_error(e)
 
 # PLIKI - NOWY ENDPOINT
 @app.route('/api/files')
@@ -128,55 +440,34 @@ def get_files():
                 'total_dirs': 0
             }), 404
         
-        # Lista do przechowywania wyników
-        files_list = []
-        directories_list = []
-        
         # Pobranie listy rozszerzeń do filtrowania
         extensions = []
         if file_types:
             extensions = [ext.strip().lower() for ext in file_types.split(',') if ext.strip()]
             extensions = [ext if ext.startswith('.') else f'.{ext}' for ext in extensions]
         
-        # Odczyt katalogu
+        # Sortowanie i stronicowanie
+        sort = request.args.get('sort', 'name')
+        if sort not in file_index.SORT_KEYS:
+            return jsonify({'success': False, 'error': f'Invalid sort (allowed: {", ".join(file_index.SORT_KEYS)})'}), 400
+        descending = request.args.get('order', 'asc').lower() == 'desc'
+        limit = request.args.get('limit', type=int)
+        offset = request.args.get('offset', 0, type=int)
+        if (limit is not None and limit < 1) or offset < 0:
+            return jsonify({'success': False, 'error': 'Invalid limit or offset'}), 400
+        
+        # Odczyt katalogu (z cache, skan tylko po zmianie)
         try:
-            with os.scandir(base_path) as entries:
-                for entry in entries:
-                    try:
-                        if entry.is_dir():
-                            directories_list.append({
-                                'name': entry.name,
-                                'path': entry.path,
-                                'type': 'directory',
-                                'size': None
-                            })
-                        elif entry.is_file():
-                            file_ext = os.path.splitext(entry.name)[1].lower()
-                            
-                            # Filtrowanie po rozszerzeniach
-                            if extensions and file_ext not in extensions:
-                                continue
-                            
-                            stat_info = entry.stat()
-                            files_list.append({
-                                'name': entry.name,
-                                'path': entry.path,
-                                'type': 'file',
-                                'extension': file_ext,
-                                'size': stat_info.st_size,
-                                'modified': stat_info.st_mtime
-                            })
-                    except (OSError, PermissionError):
-                        continue  # Pomijanie problematycznych plików/katalogów
+            listing = directory_cache.listing(base_path)
         except (OSError, PermissionError) as e:
             return jsonify({
                 'success': False,
                 'error': f'Cannot access directory: {str(e)}'
             }), 403
         
-        # Sortowanie wyników
-        directories_list.sort(key=lambda x: x['name'].lower())
-        files_list.sort(key=lambda x: x['name'].lower())
+        matched_files = directory_cache.files_view(listing, sort, descending, extensions)
+        files_list = matched_files[offset:offset + limit] if limit is not None else matched_files[offset:]
+        directories_list = listing['directories']
         
         return jsonify({
             'success': True,
@@ -186,8 +477,12 @@ def get_files():
                 'current_directory': base_path,
                 'parent_directory': os.path.dirname(base_path) if base_path != FILES_DIRECTORY else None
             },
-            'total_files': len(files_list),
+            'total_files': len(matched_files),
             'total_dirs': len(directories_list),
+            'offset': offset,
+            'limit': limit,
+            'sort': sort,
+            'order': 'desc' if descending else 'asc',
             'filters': {
                 'file_types': file_types,
                 'extensions': extensions
@@ -196,10 +491,65 @@ def get_files():
     
     except Exception as e:
         logger.error(f"Error in get_files: {str(e)}")
-        return jsonify({'success': False, 'error': 'Internal server error'}), 500
+        return server_error(e)
+
+@app.route('/api/files/search')
+def search_files():
+    """Wyszukiwanie w całym drzewie FILES: q (fragment nazwy), prefix, type, dir, rozmiar i data"""
+    try:
+        text = request.args.get('q', '').strip()
+        prefix = request.args.get('prefix', '').strip()
+        file_types = request.args.get('type', '')
+        extensions = [ext.strip().lower() for ext in file_types.split(',') if ext.strip()]
+        extensions = [ext if ext.startswith('.') else f'.{ext}' for ext in extensions]
+        
+        directory = None
+        subdirectory = request.args.get('dir', '')
+        if subdirectory:
+            safe_subdir = subdirectory.replace('..', '').replace('//', '/').strip('/')
+            if safe_subdir:
+                directory = os.path.join(FILES_DIRECTORY, safe_subdir)
+        
+        sort = request.args.get('sort', 'name')
+        if sort not in file_index.SEARCH_SORT:
+            return jsonify({'success': False, 'error': f'Invalid sort (allowed: {", ".join(file_index.SEARCH_SORT)})'}), 400
+        
+        try:
+            min_size = request.args.get('min_size', type=int)
+            max_size = request.args.get('max_size', type=int)
+            modified_after = file_index.parse_timestamp(request.args.get('modified_after'))
+            modified_before = file_index.parse_timestamp(request.args.get('modified_before'))
+        except ValueError as e:
+            return jsonify({'success': False, 'error': f'Invalid date: {e}'}), 400
+        
+        limit = request.args.get('limit', 100, type=int)
+        offset = request.args.get('offset', 0, type=int)
+        if not 1 <= limit <= file_index.MAX_SEARCH_LIMIT or offset < 0:
+            return jsonify({'success': False, 'error': f'Limit must be between 1 and {file_index.MAX_SEARCH_LIMIT}'}), 400
+        
+        results, has_more = file_search.search(
+            text=text or None, prefix=prefix or None, extensions=extensions, directory=directory,
+            min_size=min_size, max_size=max_size,
+            modified_after=modified_after, modified_before=modified_before,
+            sort=sort, limit=limit, offset=offset
+        )
+        
+        return jsonify({
+            'success': True,
+            'data': results,
+            'total': len(results),
+            'has_more': has_more,
+            'offset': offset,
+            'limit': limit
+        })
+    
+    except Exception as e:
+        logger.error(f"Error in search_files: {str(e)}")
+        return server_error(e)
 
 # ALERTY
 @app.route('/api/alerts')
+@conditional('alerts')
 def get_alerts():
     try:
         if db is None:
@@ -208,23 +558,26 @@ def get_alerts():
         unread_only = request.args.get('unread_only', 'false').lower() == 'true'
         priority = request.args.get('priority', type=int)
         
+        try:
+            page = get_page_params('alerts')
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        
         alerts = db.get_alerts(
             unread_only=unread_only,
-            priority=priority
+            priority=priority,
+            **(page or {})
         )
         
-        return jsonify({
-            'success': True,
-            'data': alerts or [],
-            'total': len(alerts) if alerts else 0
-        })
+        return list_response('alerts', alerts, page)
     
     except Exception as e:
         logger.error(f"Error in get_alerts: {str(e)}")
-        return jsonify({'success': False, 'error': 'Internal server error'}), 500
+        return server_error(e)
 
 # PRACE
 @app.route('/api/works')
+@conditional('works')
 def get_works():
     try:
         if db is None:
@@ -234,37 +587,65 @@ def get_works():
         priority = request.args.get('priority', type=int)
         overdue_only = request.args.get('overdue_only', 'false').lower() == 'true'
         
+        try:
+            page = get_page_params('works')
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        
         works = db.get_works(
             status=status,
             priority=priority,
-            overdue_only=overdue_only
+            overdue_only=overdue_only,
+            stream=page is None,
+            **(page or {})
         )
         
-        return jsonify({
-            'success': True,
-            'data': works or [],
-            'total': len(works) if works else 0
-        })
+        if page is None:
+            return stream_list_response(works)
+        return list_response('works', works, page)
     except Exception as e:
         logger.error(f"Error in get_works: {str(e)}")
-        return jsonify({'success': False, 'error': 'Internal server error'}), 500
+        return server_error(e)
 
 # NOTATKI - ROZBUDOWANE
 @app.route('/api/notes')
+@conditional('notes')
 def get_notes():
     try:
         if db is None:
             return jsonify({'success': False, 'error': 'Database not available'}), 503
             
-        notes = db.get_notes()
-        return jsonify({
-            'success': True,
-            'data': notes or [],
-            'total': len(notes) if notes else 0
-        })
+        try:
+            page = get_page_params('notes')
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        
+        if page is None:
+            return stream_list_response(db.get_notes(stream=True))
+        
+        notes = db.get_notes(**page)
+        return list_response('notes', notes, page)
     except Exception as e:
         logger.error(f"Error in get_notes: {str(e)}")
-        return jsonify({'success': False, 'error': 'Internal server error'}), 500
+        return server_error(e)
+
+@app.route('/api/notes/search')
+@conditional('notes')
+def search_notes():
+    try:
+        if db is None:
+            return jsonify({'success': False, 'error': 'Database not available'}), 503
+        
+        search = request.args.get('q', '').strip()
+        if not search:
+            return jsonify({'success': False, 'error': 'Query parameter q is required'}), 400
+        
+        limit = min(request.args.get('limit', DEFAULT_PAGE_SIZE, type=int) or DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE)
+        notes = db.search_notes(search, limit=limit)
+        return list_response('notes', notes, None)
+    except Exception as e:
+        logger.error(f"Error in search_notes: {str(e)}")
+        return server_error(e)
 
 @app.route('/api/notes', methods=['POST'])
 def add_note():
@@ -286,6 +667,11 @@ def add_note():
             logger.error("❌ Nazwa zbyt długa")
             return jsonify({'success': False, 'error': 'Name too long (max 255 characters)'}), 400
         
+        try:
+            normalize_alert_time(data.get('alert_time'))
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        
         logger.info(f"📝 Wywołanie db.add_note z parametrami: name={data['name']}, text={data.get('text', '')}")
         
         note_id = db.add_note(
@@ -296,6 +682,7 @@ def add_note():
             alert_time=data.get('alert_time', '')
         )
         
+        reminder_scheduler.notify()
         logger.info(f"✅ Notatka dodana pomyślnie, ID: {note_id}")
         
         return jsonify({
@@ -310,6 +697,25 @@ def add_note():
         logger.error(f"❌ Traceback: {traceback.format_exc()}")
         return jsonify({'success': False, 'error': f'Internal server error: {str(e)}'}), 500
 
+@app.route('/api/notes/<int:note_id>')
+@conditional('notes')
+def get_note(note_id):
+    try:
+        if db is None:
+            return jsonify({'success': False, 'error': 'Database not available'}), 503
+        
+        note = db.get_note(note_id)
+        if note is None:
+            return jsonify({'success': False, 'error': 'Note not found'}), 404
+        
+        return jsonify({
+            'success': True,
+            'data': note
+        })
+    except Exception as e:
+        logger.error(f"Error in get_note: {str(e)}")
+        return server_error(e)
+
 @app.route('/api/notes/<int:note_id>', methods=['PUT'])
 def update_note(note_id):
     try:
@@ -322,70 +728,40 @@ def update_note(note_id):
         if not data:
             return jsonify({'success': False, 'error': 'No data provided'}), 400
         
-        # Sprawdź czy notatka istnieje przed aktualizacją
-        notes = db.get_notes()
-        note_exists = any(note.get('id') == note_id for note in (notes or []))
-        if not note_exists:
-            logger.error(f"❌ Notatka {note_id} nie istnieje")
-            return jsonify({'success': False, 'error': 'Note not found'}), 404
+        fields = ('name', 'text', 'is_alert', 'is_planing', 'alert_time')
+        if not any(data.get(field) is not None for field in fields):
+            return jsonify({'success': False, 'error': 'No fields to update'}), 400
         
-        logger.info(f"📝 Wywołanie db.update_note dla ID: {note_id}")
+        try:
+            normalize_alert_time(data.get('alert_time'))
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
         
-        # Użyj metody update_note jeśli istnieje, w przeciwnym razie fallback SQL
-        if hasattr(db, 'update_note'):
-            success = db.update_note(
-                note_id=note_id,
-                name=data.get('name'),
-                text=data.get('text'),
-                is_alert=data.get('is_alert'),
-                is_planing=data.get('is_planing'),
-                alert_time=data.get('alert_time')
-            )
-            if not success:
-                logger.error(f"❌ db.update_note zwróciło False dla ID: {note_id}")
-                return jsonify({'success': False, 'error': 'Failed to update note'}), 500
-        else:
-            # Fallback: bezpośrednie SQL
-            logger.info("🔄 Używam fallback SQL dla update_note")
-            conn = get_db_connection()
-            cursor = conn.cursor()
-            
-            update_fields = []
-            params = []
-            
-            if 'name' in data:
-                update_fields.append("name = ?")
-                params.append(data['name'])
-            if 'text' in data:
-                update_fields.append("text = ?")
-                params.append(data['text'])
-            if 'is_alert' in data:
-                update_fields.append("is_alert = ?")
-                params.append(1 if data['is_alert'] else 0)
-            if 'is_planing' in data:
-                update_fields.append("is_planing = ?")
-                params.append(1 if data['is_planing'] else 0)
-            if 'alert_time' in data:
-                update_fields.append("alert_time = ?")
-                params.append(data['alert_time'])
-            
-            if not update_fields:
-                return jsonify({'success': False, 'error': 'No fields to update'}), 400
-                
-            update_fields.append("updated_at = datetime('now')")
-            params.append(note_id)
-            
-            query = f"UPDATE notes SET {', '.join(update_fields)} WHERE id = ?"
-            logger.info(f"🔄 Wykonuję zapytanie: {query} z parametrami: {params}")
-            cursor.execute(query, params)
-            conn.commit()
-            conn.close()
+        logger.info(f"📝 Wywołanie db.update_note dla ID: {note_id}")
         
+        # UPDATE ... RETURNING - brak wiersza oznacza brak notatki, bez wcześniejszego odczytu
+        note = db.update_note(
+            note_id=note_id,
+            name=data.get('name'),
+            text=data.get('text'),
+            is_alert=data.get('is_alert'),
+            is_planing=data.get('is_planing'),
+            alert_time=data.get('alert_time')
+        )
+        if note is None:
+            if not db.note_exists(note_id):
+                logger.error(f"❌ Notatka {note_id} nie istnieje")
+                return jsonify({'success': False, 'error': 'Note not found'}), 404
+            logger.error(f"❌ db.update_note nie zaktualizowało notatki ID: {note_id}")
+            return jsonify({'success': False, 'error': 'Failed to update note'}), 500
+        
+        reminder_scheduler.notify()
         logger.info(f"✅ Notatka {note_id} zaktualizowana pomyślnie")
         
         return jsonify({
             'success': True,
-            'message': 'Note updated successfully'
+            'message': 'Note updated successfully',
+            'data': note
         })
     
     except Exception as e:
@@ -398,7 +774,7 @@ def update_note(note_id):
 def debug_db_structure():
     """Endpoint do debugowania struktury bazy danych"""
     try:
-        conn = sqlite3.connect('dashboard.db')
+        conn = get_db_connection()
         cursor = conn.cursor()
         
         # Pobierz wszystkie tabele
@@ -410,7 +786,7 @@ def debug_db_structure():
             table_name = table[0]
             cursor.execute(f"PRAGMA table_info({table_name})")
             columns = cursor.fetchall()
-            structure[table_name] = columns
+            structure[table_name] = [tuple(column) for column in columns]
         
         conn.close()
         
@@ -422,11 +798,56 @@ def debug_db_structure():
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
     
+@app.route('/api/debug/db-pool')
+def debug_db_pool():
+    """Statystyki puli połączeń i checkpointów WAL"""
+    try:
+        if db is None:
+            return jsonify({'success': False, 'error': 'Database not available'}), 503
+        
+        return jsonify({
+            'success': True,
+            'data': db.pool_stats(),
+            'storage': db.storage_stats(),
+            'config_cache': db.config_cache.stats(),
+            'events': broker.stats() if broker is not None else None,
+            'reminders': reminder_scheduler.stats() if reminder_scheduler is not None else None,
+            'bundles': fragments.stats(),
+            'directory_cache': directory_cache.stats(),
+            'file_search': file_search.stats(),
+            'thumbnails': thumbnail_service.stats(),
+            'json_backend': fast_json.BACKEND,
+            'modbus': modbus.stats(),
+            'modbus_polling': modbus_poller.stats(),
+            'telemetry': telemetry_store.stats(),
+            'analytics_backend': analytics.BACKEND,
+            'device_monitor': availability_monitor.stats() if availability_monitor is not None else None
+        })
+    
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+    
+@app.route('/api/debug/query-plans')
+def debug_query_plans():
+    """Plany zapytań DashboardDB (EXPLAIN QUERY PLAN) z oznaczeniem pełnych skanów"""
+    try:
+        if db is None:
+            return jsonify({'success': False, 'error': 'Database not available'}), 503
+        
+        report = db.check_query_plans()
+        return jsonify({
+            'success': all(entry['ok'] for entry in report),
+            'data': report
+        })
+    
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+    
 @app.route('/api/test-note', methods=['POST'])
 def test_note():
     """Testowy endpoint do sprawdzenia zapisu notatki"""
     try:
-        conn = sqlite3.connect('dashboard.db')
+        conn = get_db_connection()
         cursor = conn.cursor()
         
         # Spróbuj bezpośrednio wstawić notatkę
@@ -460,10 +881,11 @@ def delete_note(note_id):
     
     except Exception as e:
         logger.error(f"Error in delete_note: {str(e)}")
-        return jsonify({'success': False, 'error': 'Internal server error'}), 500
+        return server_error(e)
 
 # PLANOWANIE - ROZBUDOWANE
 @app.route('/api/planing')
+@conditional('planning')
 def get_planing():
     try:
         if db is None:
@@ -477,7 +899,7 @@ def get_planing():
         })
     except Exception as e:
         logger.error(f"Error in get_planing: {str(e)}")
-        return jsonify({'success': False, 'error': 'Internal server error'}), 500
+        return server_error(e)
 
 @app.route('/api/planing', methods=['POST'])
 def add_planing():
@@ -503,7 +925,7 @@ def add_planing():
     
     except Exception as e:
         logger.error(f"Error in add_planing: {str(e)}")
-        return jsonify({'success': False, 'error': 'Internal server error'}), 500
+        return server_error(e)
 
 @app.route('/api/planing/<int:planing_id>', methods=['PUT'])
 def update_planing(planing_id):
@@ -532,7 +954,7 @@ def update_planing(planing_id):
     
     except Exception as e:
         logger.error(f"Error in update_planing: {str(e)}")
-        return jsonify({'success': False, 'error': 'Internal server error'}), 500
+        return server_error(e)
 
 @app.route('/api/planing/<int:planing_id>', methods=['DELETE'])
 def delete_planing(planing_id):
@@ -551,28 +973,42 @@ def delete_planing(planing_id):
     
     except Exception as e:
         logger.error(f"Error in delete_planing: {str(e)}")
-        return jsonify({'success': False, 'error': 'Internal server error'}), 500
+        return server_error(e)
 
 # NOWE ENDPOINTY: MAGAZYN
 @app.route('/api/warehouse')
+@conditional('warehouse')
 def get_warehouse():
     try:
         if db is None:
             return jsonify({'success': False, 'error': 'Database not available'}), 503
             
-        search = request.args.get('search')
-        
-        items = db.get_warehouse_items(search=search)
+        search = request.args.get('search', '').strip()
+        # Sama interpunkcja nie daje zapytania FTS - jak brak wyszukiwania
+        if search and build_fts_query(search) is None:
+            search = ''
         
-        return jsonify({
-            'success': True,
-            'data': items or [],
-            'total': len(items) if items else 0
-        })
+        try:
+            page = get_page_params('warehouse_search' if search else 'warehouse')
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        
+        if search:
+            # Wyszukiwanie FTS5 - wyniki wg trafności, kursor po (rank, id)
+            page = page or {'limit': DEFAULT_PAGE_SIZE, 'after': None}
+            items = db.search_warehouse_items(search, limit=page['limit'] + 1, after=page['after'])
+            has_more = len(items) > page['limit']
+            return list_response('warehouse_search', items[:page['limit']], page, has_more=has_more)
+        
+        if page is None:
+            return stream_list_response(db.get_warehouse_items(stream=True))
+        
+        items = db.get_warehouse_items(**page)
+        return list_response('warehouse', items, page)
     
     except Exception as e:
         logger.error(f"Error in get_warehouse: {str(e)}")
-        return jsonify({'success': False, 'error': 'Internal server error'}), 500
+        return server_error(e)
 
 
 @app.route('/api/warehouse', methods=['POST'])
@@ -591,29 +1027,21 @@ def add_warehouse_item():
         if not data.get('code'):
             return jsonify({'success': False, 'error': 'Code is required'}), 400
         
-        # Sprawdź czy kod już istnieje
-        existing_items = db.get_warehouse_items()
-        if existing_items:
-            code_exists = any(item.get('code') == data['code'] for item in existing_items)
-            if code_exists:
-                return jsonify({'success': False, 'error': 'Item with this code already exists'}), 400
-        
-        # Dodaj do bazy
-        conn = db.get_connection()
-        cursor = conn.cursor()
+        try:
+            quantity = int(data.get('quantity', 0))
+        except (ValueError, TypeError):
+            return jsonify({'success': False, 'error': 'Quantity must be a number'}), 400
         
-        cursor.execute(
-            "INSERT INTO warehouse (name, code, quantity, note) VALUES (?, ?, ?, ?)",
-            (
-                data['name'],
-                data['code'],
-                int(data.get('quantity', 0)),
-                data.get('note', '')
+        # Unikalność kodu pilnuje indeks UNIQUE - bez wczytywania całej tabeli
+        try:
+            item_id = db.add_warehouse_item(
+                name=data['name'],
+                code=data['code'],
+                quantity=quantity,
+                note=data.get('note', '')
             )
-        )
-        conn.commit()
-        item_id = cursor.lastrowid
-        conn.close()
+        except sqlite3.IntegrityError:
+            return jsonify({'success': False, 'error': 'Item with this code already exists'}), 400
         
         logger.info(f"✅ Dodano nowy element magazynu ID: {item_id}")
         
@@ -629,6 +1057,95 @@ def add_warehouse_item():
         logger.error(f"❌ Traceback: {traceback.format_exc()}")
         return jsonify({'success': False, 'error': f'Internal server error: {str(e)}'}), 500
 
+@app.route('/api/warehouse/import', methods=['POST'])
+def import_warehouse_items():
+    """Import masowy magazynu (CSV/NDJSON/JSON) - parsowanie strumieniowe i zapis partiami"""
+    try:
+        if db is None:
+            return jsonify({'success': False, 'error': 'Database not available'}), 503
+        
+        upload = request.files.get('file')
+        if upload is not None:
+            stream = upload.stream
+            fmt = request.args.get('format') or warehouse_io.detect_format(upload.mimetype, upload.filename)
+        else:
+            stream = request.stream
+            fmt = request.args.get('format') or warehouse_io.detect_format(request.content_type)
+        
+        if fmt not in warehouse_io.IMPORT_FORMATS:
+            return jsonify({
+                'success': False,
+                'error': f"Unsupported format, use one of: {', '.join(warehouse_io.IMPORT_FORMATS)}"
+            }), 400
+        
+        batch_size = min(max(request.args.get('batch_size', 1000, type=int) or 1000, 1), 10000)
+        rows = warehouse_io.PARSERS[fmt](stream)
+        reports = warehouse_io.import_items(db, rows, batch_size=batch_size)
+        
+        # Postęp na żywo jako NDJSON, gdy klient o to poprosi
+        if 'application/x-ndjson' in request.headers.get('Accept', ''):
+            def generate():
+                for report in reports:
+                    yield json.dumps(report, ensure_ascii=False) + '\n'
+            return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+        
+        summary = None
+        for summary in reports:
+            pass
+        summary.pop('type', None)
+        return jsonify({'success': summary['failed'] == 0, 'data': summary})
+    
+    except Exception as e:
+        logger.error(f"❌ Błąd w import_warehouse_items: {str(e)}")
+        return jsonify({'success': False, 'error': f'Internal server error: {str(e)}'}), 500
+
+@app.route('/api/warehouse/export')
+def export_warehouse_items():
+    """Eksport całego magazynu strumieniowo (CSV/NDJSON/JSON)"""
+    try:
+        if db is None:
+            return jsonify({'success': False, 'error': 'Database not available'}), 503
+        
+        fmt = request.args.get('format', 'csv').lower()
+        if fmt not in warehouse_io.EXPORT_FORMATS:
+            return jsonify({
+                'success': False,
+                'error': f"Unsupported format, use one of: {', '.join(warehouse_io.EXPORT_FORMATS)}"
+            }), 400
+        
+        content_types = {
+            'csv': 'text/csv',
+            'ndjson': 'application/x-ndjson',
+            'json': 'application/json'
+        }
+        chunks = warehouse_io.export_items(db.iter_warehouse_items(), fmt)
+        response = Response(stream_with_context(chunks), mimetype=content_types[fmt])
+        response.headers['Content-Disposition'] = f'attachment; filename=magazyn.{fmt}'
+        return response
+    
+    except Exception as e:
+        logger.error(f"Error in export_warehouse_items: {str(e)}")
+        return server_error(e)
+
+@app.route('/api/warehouse/<int:item_id>')
+@conditional('warehouse')
+def get_warehouse_item(item_id):
+    try:
+        if db is None:
+            return jsonify({'success': False, 'error': 'Database not available'}), 503
+        
+        item = db.get_warehouse_item(item_id)
+        if item is None:
+            return jsonify({'success': False, 'error': 'Item not found'}), 404
+        
+        return jsonify({
+            'success': True,
+            'data': item
+        })
+    except Exception as e:
+        logger.error(f"Error in get_warehouse_item: {str(e)}")
+        return server_error(e)
+
 @app.route('/api/warehouse/<int:item_id>/quantity', methods=['PUT'])
 def update_warehouse_quantity(item_id):
     """Aktualizuj ilość elementu w magazynie"""
@@ -650,27 +1167,17 @@ def update_warehouse_quantity(item_id):
         except (ValueError, TypeError):
             return jsonify({'success': False, 'error': 'Quantity must be a number'}), 400
         
-        # Sprawdź czy element istnieje
-        items = db.get_warehouse_items()
-        item_exists = any(item.get('id') == item_id for item in (items or []))
-        if not item_exists:
+        # UPDATE ... RETURNING - brak wiersza oznacza brak elementu
+        item = db.update_warehouse_quantity(item_id, quantity)
+        if item is None:
             return jsonify({'success': False, 'error': 'Item not found'}), 404
         
-        # Aktualizuj w bazie
-        conn = db.get_connection()
-        cursor = conn.cursor()
-        cursor.execute(
-            "UPDATE warehouse SET quantity = ?, updated_at = datetime('now') WHERE id = ?",
-            (quantity, item_id)
-        )
-        conn.commit()
-        conn.close()
-        
         logger.info(f"✅ Zaktualizowano ilość elementu {item_id}: {quantity}")
         
         return jsonify({
             'success': True,
-            'message': 'Quantity updated successfully'
+            'message': 'Quantity updated successfully',
+            'data': item
         })
     
     except Exception as e:
@@ -679,6 +1186,80 @@ def update_warehouse_quantity(item_id):
         logger.error(f"❌ Traceback: {traceback.format_exc()}")
         return jsonify({'success': False, 'error': f'Internal server error: {str(e)}'}), 500
 
+@app.route('/api/warehouse/<int:item_id>/adjust', methods=['POST'])
+def adjust_warehouse_quantity(item_id):
+    """Zmień stan elementu o delta (+n/-n) z zapisem w rejestrze ruchów"""
+    try:
+        if db is None:
+            return jsonify({'success': False, 'error': 'Database not available'}), 503
+        
+        data = request.get_json(silent=True) or {}
+        
+        try:
+            delta = int(data['delta'])
+        except KeyError:
+            return jsonify({'success': False, 'error': 'Delta is required'}), 400
+        except (ValueError, TypeError):
+            return jsonify({'success': False, 'error': 'Delta must be a number'}), 400
+        if delta == 0:
+            return jsonify({'success': False, 'error': 'Delta cannot be zero'}), 400
+        
+        # Klucz idempotencji z nagłówka lub z treści - ponowione żądanie nie zmienia stanu drugi raz
+        idempotency_key = request.headers.get('Idempotency-Key') or data.get('idempotency_key')
+        
+        result = db.adjust_warehouse_quantity(
+            item_id,
+            delta,
+            reason=data.get('reason'),
+            idempotency_key=idempotency_key
+        )
+        
+        status = result['status']
+        if status == 'not_found':
+            return jsonify({'success': False, 'error': 'Item not found'}), 404
+        if status == 'insufficient':
+            return jsonify({
+                'success': False,
+                'error': 'Insufficient quantity',
+                'quantity': result['quantity']
+            }), 409
+        if status == 'conflict':
+            return jsonify({'success': False, 'error': 'Idempotency key already used for a different change'}), 409
+        
+        return jsonify({
+            'success': True,
+            'id': item_id,
+            'quantity': result['quantity'],
+            'replayed': status == 'replayed'
+        })
+    
+    except Exception as e:
+        logger.error(f"❌ Błąd w adjust_warehouse_quantity: {str(e)}")
+        return server_error(e)
+
+@app.route('/api/warehouse/<int:item_id>/movements')
+def get_warehouse_movements(item_id):
+    """Historia ruchów elementu magazynu (stronicowana po id)"""
+    try:
+        if db is None:
+            return jsonify({'success': False, 'error': 'Database not available'}), 503
+        
+        limit = min(request.args.get('limit', DEFAULT_PAGE_SIZE, type=int) or DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE)
+        before_id = request.args.get('before_id', type=int)
+        
+        movements = db.get_warehouse_movements(item_id, limit=limit, before_id=before_id)
+        
+        return jsonify({
+            'success': True,
+            'data': movements,
+            'total': len(movements),
+            'next_before_id': movements[-1]['id'] if len(movements) == limit else None
+        })
+    
+    except Exception as e:
+        logger.error(f"Error in get_warehouse_movements: {str(e)}")
+        return server_error(e)
+
 @app.route('/api/warehouse/<int:item_id>', methods=['DELETE'])
 def delete_warehouse_item(item_id):
     """Usuń element z magazynu"""
@@ -688,21 +1269,9 @@ def delete_warehouse_item(item_id):
             
         logger.info(f"🗑️ DELETE /api/warehouse/{item_id}")
         
-        # Sprawdź czy element istnieje
-        items = db.get_warehouse_items()
-        item_exists = any(item.get('id') == item_id for item in (items or []))
-        if not item_exists:
+        if not db.delete_warehouse_item(item_id):
             return jsonify({'success': False, 'error': 'Item not found'}), 404
         
-        # Usuń z bazy
-        conn = db.get_connection()
-        cursor = conn.cursor()
-        cursor.execute("DELETE FROM warehouse WHERE id = ?", (item_id,))
-        conn.commit()
-        conn.close()
-        
-        logger.info(f"✅ Usunięto element magazynu ID: {item_id}")
-        
         return jsonify({
             'success': True,
             'message': 'Item deleted successfully'
@@ -738,7 +1307,7 @@ def get_users():
     
     except Exception as e:
         logger.error(f"Error in get_users: {str(e)}")
-        return jsonify({'success': False, 'error': 'Internal server error'}), 500
+        return server_error(e)
 
 @app.route('/api/users/<username>')
 def get_user(username):
@@ -762,7 +1331,7 @@ def get_user(username):
     
     except Exception as e:
         logger.error(f"Error in get_user: {str(e)}")
-        return jsonify({'success': False, 'error': 'Internal server error'}), 500
+        return server_error(e)
 
 @app.route('/api/users', methods=['POST'])
 def create_user():
@@ -795,10 +1364,11 @@ def create_user():
     
     except Exception as e:
         logger.error(f"Error in create_user: {str(e)}")
-        return jsonify({'success': False, 'error': 'Internal server error'}), 500
+        return server_error(e)
 
 # NOWE ENDPOINTY: KONFIGURACJA
 @app.route('/api/config')
+@conditional('config')
 def get_all_config():
     try:
         if db is None:
@@ -814,9 +1384,10 @@ def get_all_config():
     
     except Exception as e:
         logger.error(f"Error in get_all_config: {str(e)}")
-        return jsonify({'success': False, 'error': 'Internal server error'}), 500
+        return server_error(e)
 
 @app.route('/api/config/<key>')
+@conditional('config')
 def get_config(key):
     try:
         if db is None:
@@ -837,7 +1408,7 @@ def get_config(key):
     
     except Exception as e:
         logger.error(f"Error in get_config: {str(e)}")
-        return jsonify({'success': False, 'error': 'Internal server error'}), 500
+        return server_error(e)
 
 @app.route('/api/config/<key>', methods=['PUT'])
 def set_config(key):
@@ -859,7 +1430,7 @@ def set_config(key):
     
     except Exception as e:
         logger.error(f"Error in set_config: {str(e)}")
-        return jsonify({'success': False, 'error': 'Internal server error'}), 500
+        return server_error(e)
     
 @app.route('/api/file-content')
 def serve_file_content():
@@ -885,11 +1456,16 @@ def serve_file_content():
         if file_ext not in allowed_extensions:
             return "File type not allowed", 403
         
-        return send_file(safe_path)
+        if thumbnail and file_ext in thumbnails.THUMBNAIL_EXTENSIONS and thumbnail_service.available:
+            response = send_thumbnail(safe_path)
+            if response is not None:
+                return response
+        
+        return send_large_file(safe_path)
     
     except Exception as e:
         logger.error(f"Error in serve_file_content: {str(e)}")
-        return jsonify({'success': False, 'error': 'Internal server error'}), 500
+        return server_error(e)
     
 @app.route('/api/alerts/<int:alert_id>/read', methods=['POST'])
 def mark_alert_as_read(alert_id):
@@ -912,6 +1488,7 @@ def mark_alert_as_read(alert_id):
         )
         conn.commit()
         conn.close()
+        broker.notify()
         
         return jsonify({
             'success': True,
@@ -921,16 +1498,293 @@ def mark_alert_as_read(alert_id):
     
     except Exception as e:
         logger.error(f"Error in mark_alert_as_read: {str(e)}")
-        return jsonify({'success': False, 'error': 'Internal server error'}), 500
+        return server_error(e)
+
+# ZDARZENIA (Server-Sent Events)
+@app.route('/api/events')
+def event_stream():
+    """Strumień SSE: alert_created, alert_read, note_reminder, device_status.
+
+    Po ponownym połączeniu przeglądarka wysyła nagłówek Last-Event-ID i dostaje
+    zaległe zdarzenia z tabeli events (wszystkie, porcjami). Gdy część z nich usunęła
+    już retencja, najpierw dostaje zdarzenie reset. Filtr typów: ?types=alert_created,alert_read
+    """
+    try:
+        if db is None:
+            return jsonify({'success': False, 'error': 'Database not available'}), 503
+        
+        last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+        if last_event_id is not None:
+            try:
+                last_event_id = int(last_event_id)
+            except ValueError:
+                return jsonify({'success': False, 'error': 'Invalid Last-Event-ID'}), 400
+        
+        types = None
+        if request.args.get('types'):
+            types = {t.strip() for t in request.args['types'].split(',') if t.strip()}
+            unknown = types - set(events.EVENT_TYPES)
+            if unknown:
+                return jsonify({'success': False, 'error': f'Unknown event types: {", ".join(sorted(unknown))}'}), 400
+        
+        response = Response(
+            stream_with_context(broker.stream(last_event_id, types)),
+            mimetype='text/event-stream'
+        )
+        response.headers['Cache-Control'] = 'no-cache'
+        # Wyłącza buforowanie odpowiedzi w nginx
+        response.headers['X-Accel-Buffering'] = 'no'
+        return response
+    
+    except Exception as e:
+        logger.error(f"Error in event_stream: {str(e)}")
+        return server_error(e)
+
+# BRAMKA MODBUS
+@app.route('/api/modbus/request', methods=['POST'])
+def modbus_request():
+    """Wyślij ramkę RTU (hex) przez bramkę i zwróć odpowiedź slave'a"""
+    try:
+        data = request.get_json(silent=True) or {}
+        
+        if not data.get('frame'):
+            return jsonify({'success': False, 'error': 'Frame is required'}), 400
+        
+        bus = data.get('bus', 'default')
+        if bus not in modbus.bus_urls:
+            return jsonify({'success': False, 'error': f'Unknown bus: {bus}'}), 400
+        
+        try:
+            frame = modbus_gateway.parse_frame(str(data['frame']), append_crc=bool(data.get('append_crc')))
+        except modbus_gateway.ModbusError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        
+        try:
+            result = modbus.request(frame, bus)
+        except modbus_gateway.ModbusTimeout as e:
+            return jsonify({'success': False, 'error': str(e), 'event_id': e.event_id}), 504
+        except modbus_gateway.ModbusError as e:
+            return jsonify({'success': False, 'error': str(e), 'event_id': e.event_id}), 503
+        
+        return jsonify({'success': True, 'data': result})
+    
+    except Exception as e:
+        logger.error(f"Error in modbus_request: {str(e)}")
+        return server_error(e)
+
+@app.route('/api/modbus/stream')
+def modbus_stream():
+    """Strumień SSE całego ruchu bramki (żądania, odpowiedzi, błędy, stan połączenia)"""
+    try:
+        last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+        if last_event_id is not None:
+            try:
+                last_event_id = int(last_event_id)
+            except ValueError:
+                return jsonify({'success': False, 'error': 'Invalid Last-Event-ID'}), 400
+        
+        modbus.start()
+        response = Response(stream_with_context(modbus.stream(last_event_id)), mimetype='text/event-stream')
+        response.headers['Cache-Control'] = 'no-cache'
+        response.headers['X-Accel-Buffering'] = 'no'
+        return response
+    
+    except Exception as e:
+        logger.error(f"Error in modbus_stream: {str(e)}")
+        return server_error(e)
+
+@app.route('/api/modbus/history')
+def modbus_history():
+    """Ostatnie zdarzenia bramki (najnowsze na końcu)"""
+    try:
+        limit = min(request.args.get('limit', DEFAULT_PAGE_SIZE, type=int) or DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE)
+        modbus.start()
+        history = list(modbus.history)[-limit:]
+        return jsonify({'success': True, 'data': history, 'total': len(history)})
+    
+    except Exception as e:
+        logger.error(f"Error in modbus_history: {str(e)}")
+        return server_error(e)
+
+@app.route('/api/modbus/points')
+def modbus_points():
+    """Ostatnie wartości punktów odczytywanych cyklicznie"""
+    try:
+        points = modbus_poller.values()
+        return jsonify({'success': True, 'data': points, 'total': len(points),
+                        'leader': modbus_poller.stats()['leader']})
+    
+    except Exception as e:
+        logger.error(f"Error in modbus_points: {str(e)}")
+        return server_error(e)
+
+# TELEMETRIA
+@app.route('/api/telemetry', methods=['POST'])
+def record_telemetry():
+    """Dopisz próbki: {"samples": [{"series", "value", "ts"?, "unit"?}]} lub jedna próbka"""
+    try:
+        data = request.get_json(silent=True) or {}
+        samples = data.get('samples', [data] if 'series' in data else [])
+        
+        if not samples:
+            return jsonify({'success': False, 'error': 'Samples are required'}), 400
+        
+        for sample in samples:
+            if not isinstance(sample, dict) or not sample.get('series'):
+                return jsonify({'success': False, 'error': 'Series name is required'}), 400
+            value = sample.get('value')
+            if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value):
+                return jsonify({'success': False, 'error': f"Invalid value for {sample['series']}"}), 400
+            try:
+                sample['ts'] = telemetry.parse_time(sample.get('ts'))
+            except (ValueError, AttributeError):
+                return jsonify({'success': False, 'error': f"Invalid ts for {sample['series']}"}), 400
+        
+        telemetry_store.record(samples)
+        return jsonify({'success': True, 'total': len(samples)}), 202
+    
+    except Exception as e:
+        logger.error(f"Error in record_telemetry: {str(e)}")
+        return server_error(e)
+
+@app.route('/api/telemetry/series')
+def get_telemetry_series():
+    """Serie telemetrii z ostatnią wartością"""
+    try:
+        series = telemetry_store.get_series()
+        return jsonify({'success': True, 'data': series, 'total': len(series)})
+    
+    except Exception as e:
+        logger.error(f"Error in get_telemetry_series: {str(e)}")
+        return server_error(e)
+
+@app.route('/api/telemetry/series/<path:name>')
+def get_telemetry_range(name):
+    """Punkty serii w zakresie from-to; rozdzielczość dobierana do liczby punktów (points)"""
+    try:
+        try:
+            start = telemetry.parse_time(request.args.get('from'))
+            end = telemetry.parse_time(request.args.get('to'))
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        max_points = min(request.args.get('points', telemetry.DEFAULT_MAX_POINTS, type=int)
+                         or telemetry.DEFAULT_MAX_POINTS, 10000)
+        resolution = request.args.get('resolution', 'auto')
+        
+        try:
+            result = telemetry_store.query(name, start, end, resolution, max_points)
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        if result is None:
+            return jsonify({'success': False, 'error': 'Series not found'}), 404
+        
+        return jsonify({'success': True, 'data': result, 'total': len(result['points'])})
+    
+    except Exception as e:
+        logger.error(f"Error in get_telemetry_range: {str(e)}")
+        return server_error(e)
+
+# ANALIZY
+def analytics_range(default_days: int = 30) -> tuple:
+    """Zakres from/to z parametrów zapytania (domyślnie ostatnie default_days dni)"""
+    end = telemetry.parse_time(request.args.get('to'))
+    end = int(datetime.now().timestamp()) + 1 if end is None else end
+    start = telemetry.parse_time(request.args.get('from'))
+    return (end - default_days * 86400 if start is None else start), end
+
+@app.route('/api/analytics/telemetry/<path:name>')
+def get_telemetry_analytics(name):
+    """Statystyki serii (min/max/średnia, percentyle=50,95) w grupach hour/day/week/month"""
+    try:
+        try:
+            start, end = analytics_range()
+            percentiles = [float(p) for p in request.args.get('percentiles', '').split(',') if p.strip()]
+            if any(not 0 <= p <= 100 for p in percentiles):
+                raise ValueError('Percentiles must be between 0 and 100')
+            result = analytics.telemetry_report(telemetry_store, name, start, end,
+                                                request.args.get('group', 'day'), percentiles,
+                                                request.args.get('source', 'auto'))
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        if result is None:
+            return jsonify({'success': False, 'error': 'Series not found'}), 404
+        
+        return jsonify({'success': True, 'data': result, 'total': len(result['groups'])})
+    
+    except Exception as e:
+        logger.error(f"Error in get_telemetry_analytics: {str(e)}")
+        return server_error(e)
+
+@app.route('/api/analytics/consumption/<path:name>')
+def get_consumption_analytics(name):
+    """Zużycie z licznika narastającego (np. energii) w grupach, domyślnie dziennie"""
+    try:
+        try:
+            start, end = analytics_range()
+            result = analytics.consumption_report(telemetry_store, name, start, end,
+                                                  request.args.get('group', 'day'))
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        if result is None:
+            return jsonify({'success': False, 'error': 'Series not found'}), 404
+        
+        return jsonify({'success': True, 'data': result, 'total': len(result['groups'])})
+    
+    except Exception as e:
+        logger.error(f"Error in get_consumption_analytics: {str(e)}")
+        return server_error(e)
+
+@app.route('/api/analytics/warehouse')
+def get_warehouse_analytics():
+    """Przychody, rozchody i saldo ruchów magazynowych w grupach (item_id - jeden element)"""
+    if db is None:
+        return jsonify({'success': False, 'error': 'Database not available'}), 503
+    
+    try:
+        try:
+            start, end = analytics_range()
+            result = analytics.warehouse_report(db, start, end, request.args.get('group', 'day'),
+                                                request.args.get('item_id', type=int))
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        
+        return jsonify({'success': True, 'data': result, 'total': len(result['groups'])})
+    
+    except Exception as e:
+        logger.error(f"Error in get_warehouse_analytics: {str(e)}")
+        return server_error(e)
+
+# URZĄDZENIA
+@app.route('/api/devices/status')
+def get_devices_status():
+    """Ostatni wynik monitora dostępności (online, opóźnienie, ostatnia odpowiedź)"""
+    if db is None:
+        return jsonify({'success': False, 'error': 'Database not available'}), 503
+    
+    try:
+        devices = db.get_device_status()
+        return jsonify({'success': True, 'data': devices, 'total': len(devices)})
+    
+    except Exception as e:
+        logger.error(f"Error in get_devices_status: {str(e)}")
+        return server_error(e)
 
 # Endpoint diagnostyczny
 @app.route('/api/health')
 def health_check():
-    """Endpoint do sprawdzania statusu API"""
+    """Endpoint do sprawdzania statusu API (z buforowanym stanem urządzeń)"""
     db_status = "available" if db is not None else "unavailable"
+    devices = None
+    if db is not None:
+        try:
+            devices = {device['name']: 'online' if device['online'] else 'offline'
+                       for device in db.get_device_status()}
+        except Exception as e:
+            logger.error(f"Error reading device status: {str(e)}")
     return jsonify({
         'status': 'healthy',
         'database': db_status,
+        'devices': devices,
         'timestamp': datetime.now().isoformat()
     })
 
@@ -952,6 +1806,7 @@ if __name__ == '__main__':
     print("  GET    /api/alerts")
     print("  GET    /api/works") 
     print("  GET    /api/notes")
+    print("  GET    /api/notes/search?q=")
     print("  POST   /api/notes")
     print("  PUT    /api/notes/{id}")
     print("  DELETE /api/notes/{id}")
@@ -962,13 +1817,32 @@ if __name__ == '__main__':
     print("  GET    /api/warehouse")
     print("  POST   /api/warehouse")
     print("  PUT    /api/warehouse/{id}/quantity")
+    print("  POST   /api/warehouse/{id}/adjust")
+    print("  POST   /api/warehouse/import")
+    print("  GET    /api/warehouse/export")
+    print("  GET    /api/warehouse/{id}/movements")
     print("  GET    /api/users")
     print("  GET    /api/users/{username}")
     print("  POST   /api/users")
     print("  GET    /api/config")
     print("  GET    /api/config/{key}")
     print("  PUT    /api/config/{key}")
+    print("  GET    /api/bundle")
+    print("  GET    /api/bundle/{tab}")
+    print("  GET    /api/events (SSE)")
     print("  GET    /api/files")
+    print("  GET    /api/files/search")
+    print("  POST   /api/modbus/request")
+    print("  GET    /api/modbus/stream (SSE)")
+    print("  GET    /api/modbus/history")
+    print("  GET    /api/modbus/points")
+    print("  POST   /api/telemetry")
+    print("  GET    /api/telemetry/series")
+    print("  GET    /api/telemetry/series/{name}")
+    print("  GET    /api/analytics/telemetry/{name}")
+    print("  GET    /api/analytics/consumption/{name}")
+    print("  GET    /api/analytics/warehouse")
+    print("  GET    /api/devices/status")
     print("  GET    /api/health")
     print("\n🚀 Serwer uruchomiony pomyślnie!")
     
@@ -25,6 +25,9 @@ if not exist "dashboard.db" (
     echo OK: Baza danych istnieje
 )
 
+echo Budowanie zasobow statycznych...
+python static_assets.py >nul
+
 echo Uruchamianie serwera...
 echo Serwer: http://localhost:8001
 echo.
@@ -0,0 +1,215 @@
+# static_assets.py
+"""Budowanie i serwowanie zasobów statycznych (JS/CSS).
+
+Krok budowania (python static_assets.py) zapisuje do data/dist kopie plików
+z hashem treści w nazwie oraz warianty .gz i .br (brotli, jeśli zainstalowany).
+Serwer ładuje manifest przy starcie: nazwy z hashem idą z Cache-Control
+immutable, zwykłe ścieżki z walidacją ETag, w obu przypadkach z wariantem
+skompresowanym wybranym wg Accept-Encoding.
+"""
+import os
+import re
+import sys
+import gzip
+import json
+import hashlib
+import mimetypes
+from typing import Dict, Optional, Any
+import logging
+
+try:
+    import brotli
+except ImportError:  # brotli jest opcjonalny - bez niego powstają tylko warianty gzip
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+ASSET_DIRECTORIES = ('data/js', 'data/css')
+ASSET_EXTENSIONS = ('.js', '.css', '.json', '.svg')
+DIST_DIRECTORY = 'data/dist'
+MANIFEST_FILE = os.path.join(DIST_DIRECTORY, 'manifest.json')
+
+# Pliki mniejsze nie zyskują na kompresji
+MIN_COMPRESS_SIZE = 1024
+HASH_LENGTH = 12
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+# Komentarz z mapą źródeł - usuwany z kopii produkcyjnych (mapy nie są serwowane)
+SOURCE_MAP_COMMENT = re.compile(rb'\n?/[/*][#@] sourceMappingURL=[^\n]*?(\*/)?\s*$')
+
+# Odwołania do zasobów w app.html: src="data/js/core.js?v=2.24"
+ASSET_REFERENCE = re.compile(r'''((?:src|href)=["'])\.?/?(data/[^"'?]+)(\?[^"']*)?(["'])''')
+
+def is_production() -> bool:
+    return os.environ.get('DASHBOARD_ENV', 'development').lower() == 'production'
+
+def _hashed_name(path: str, digest: str) -> str:
+    base, extension = os.path.splitext(path)
+    return f"{base}.{digest}{extension}"
+
+def _write_if_missing(path: str, content: bytes):
+    if os.path.exists(path):
+        return
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = path + '.tmp'
+    with open(temp_path, 'wb') as f:
+        f.write(content)
+    os.replace(temp_path, path)
+
+def build(root: str = '.') -> Dict[str, Any]:
+    """Zbuduj data/dist i manifest; pliki o niezmienionej treści nie są zapisywane ponownie"""
+    dist = os.path.join(root, DIST_DIRECTORY)
+    manifest: Dict[str, Any] = {'assets': {}, 'encodings': ['gzip'] + (['br'] if brotli else [])}
+    written = set()
+
+    for directory in ASSET_DIRECTORIES:
+        for dirpath, _, filenames in os.walk(os.path.join(root, directory)):
+            for filename in sorted(filenames):
+                if not filename.endswith(ASSET_EXTENSIONS):
+                    continue
+                source = os.path.join(dirpath, filename)
+                logical = os.path.relpath(source, root).replace(os.sep, '/')
+                with open(source, 'rb') as f:
+                    content = f.read()
+                if logical.endswith(('.js', '.css')):
+                    content = SOURCE_MAP_COMMENT.sub(b'\n', content)
+
+                digest = hashlib.sha256(content).hexdigest()[:HASH_LENGTH]
+                hashed = _hashed_name(logical, digest)
+                target = os.path.join(dist, os.path.relpath(hashed, 'data'))
+                _write_if_missing(target, content)
+                written.add(os.path.abspath(target))
+
+                encodings = []
+                if len(content) >= MIN_COMPRESS_SIZE:
+                    _write_if_missing(target + '.gz', gzip.compress(content, compresslevel=9, mtime=0))
+                    written.add(os.path.abspath(target + '.gz'))
+                    encodings.append('gzip')
+                    if brotli is not None:
+                        _write_if_missing(target + '.br', brotli.compress(content, quality=11))
+                        written.add(os.path.abspath(target + '.br'))
+                        encodings.append('br')
+
+                manifest['assets'][logical] = {
+                    'path': hashed,
+                    'file': os.path.relpath(target, root).replace(os.sep, '/'),
+                    'hash': digest,
+                    'size': len(content),
+                    'encodings': encodings,
+                }
+
+    # Usuń warianty z poprzednich buildów
+    removed = 0
+    for dirpath, _, filenames in os.walk(dist):
+        for filename in filenames:
+            path = os.path.abspath(os.path.join(dirpath, filename))
+            if path not in written and filename != os.path.basename(MANIFEST_FILE):
+                os.remove(path)
+                removed += 1
+
+    os.makedirs(dist, exist_ok=True)
+    with open(os.path.join(root, MANIFEST_FILE), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
+
+    if brotli is None:
+        logger.warning("⚠️ Brak modułu brotli - zbudowano tylko warianty gzip")
+    logger.info(f"✅ Zbudowano {len(manifest['assets'])} zasobów statycznych (usunięto {removed} starych plików)")
+    return manifest
+
+def index_static_files(root: str = '.', directory: str = 'data') -> set:
+    """Zbiór ścieżek plików pod data/ (bez data/dist) - zamiast os.path.exists na każde żądanie"""
+    files = set()
+    for dirpath, dirnames, filenames in os.walk(os.path.join(root, directory)):
+        dirnames[:] = [d for d in dirnames if os.path.join(dirpath, d) != os.path.join(root, DIST_DIRECTORY)]
+        for filename in filenames:
+            files.add(os.path.relpath(os.path.join(dirpath, filename), root).replace(os.sep, '/'))
+    return files
+
+def negotiate_encoding(accept_encoding: str, available) -> Optional[str]:
+    """Wybierz wariant wg Accept-Encoding (br przed gzip); None = bez kompresji"""
+    accepted = {}
+    for part in (accept_encoding or '').split(','):
+        name, _, params = part.strip().partition(';')
+        quality = 1.0
+        if params.strip().startswith('q='):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip().lower()] = quality
+    for encoding in ('br', 'gzip'):
+        if encoding in available and accepted.get(encoding, accepted.get('*', 0)) > 0:
+            return encoding
+    return None
+
+class AssetStore:
+    """Manifest zbudowanych zasobów załadowany do pamięci przy starcie serwera"""
+
+    def __init__(self, root: str = '.'):
+        self.root = root
+        self.by_logical: Dict[str, Dict[str, Any]] = {}
+        self.by_hashed: Dict[str, Dict[str, Any]] = {}
+        self.encodings = []
+        self.load()
+
+    def load(self):
+        path = os.path.join(self.root, MANIFEST_FILE)
+        try:
+            with open(path, encoding='utf-8') as f:
+                manifest = json.load(f)
+        except FileNotFoundError:
+            logger.warning("⚠️ Brak data/dist/manifest.json - zasoby serwowane bez kompresji "
+                           "(uruchom: python static_assets.py)")
+            return
+        except (OSError, ValueError) as e:
+            logger.error(f"❌ Błąd wczytywania manifestu zasobów: {e}")
+            return
+
+        self.by_logical = manifest.get('assets', {})
+        self.by_hashed = {entry['path']: entry for entry in self.by_logical.values()}
+        self.encodings = manifest.get('encodings', [])
+        logger.info(f"✅ Wczytano manifest zasobów statycznych ({len(self.by_logical)} plików)")
+
+    @property
+    def available(self) -> bool:
+        return bool(self.by_logical)
+
+    def lookup(self, path: str):
+        """Zwróć (wpis, immutable) dla ścieżki z hashem lub zwykłej; None gdy nieznana"""
+        path = path.lstrip('./')
+        entry = self.by_hashed.get(path)
+        if entry is not None:
+            return entry, True
+        entry = self.by_logical.get(path)
+        if entry is not None:
+            return entry, False
+        return None
+
+    def rewrite_html(self, html: str) -> str:
+        """Podmień odwołania do zasobów na nazwy z hashem (bez parametrów ?v=)"""
+        def replace(match):
+            entry = self.by_logical.get(match.group(2))
+            if entry is None:
+                return match.group(0)
+            return f"{match.group(1)}{entry['path']}{match.group(4)}"
+        return ASSET_REFERENCE.sub(replace, html)
+
+    def choose_encoding(self, entry: Dict[str, Any], accept_encoding: str) -> Optional[str]:
+        return negotiate_encoding(accept_encoding, entry['encodings'])
+
+    def file_for(self, entry: Dict[str, Any], encoding: Optional[str]) -> str:
+        path = os.path.join(self.root, entry['file'])
+        if encoding == 'br':
+            return path + '.br'
+        if encoding == 'gzip':
+            return path + '.gz'
+        return path
+
+    def content_type(self, entry: Dict[str, Any]) -> str:
+        return mimetypes.guess_type(entry['path'])[0] or 'application/octet-stream'
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    result = build(sys.argv[1] if len(sys.argv) > 1 else '.')
+    for logical, entry in sorted(result['assets'].items()):
+        print(f"  {logical} -> {entry['path']} [{', '.join(entry['encodings']) or 'identity'}]")
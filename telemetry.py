@@ -0,0 +1,406 @@
+# telemetry.py
+"""Historia odczytów urządzeń (temperatury, liczniki, stany przekaźników).
+
+Osobna baza SQLite (telemetry.db), żeby częste zapisy nie konkurowały z
+dashboard.db. Próbki leżą w tabeli WITHOUT ROWID z kluczem (seria, czas
+unix w sekundach) - wiersz to kilkanaście bajtów, a zakres czasu jednej
+serii jest ciągłym fragmentem B-drzewa. Trigger przy każdej nowej próbce
+aktualizuje agregaty 1 min / 1 h / 1 dzień (count, sum, min, max), więc
+wykres z miesiąca czyta kilkaset wierszy agregatu zamiast setek tysięcy
+próbek. Granice dni agregatów są w UTC.
+"""
+import os
+import time
+import queue
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple, Any, Union
+import logging
+
+from database import ConnectionPool, STORAGE_PROFILES
+
+logger = logging.getLogger(__name__)
+
+# Rozdzielczości agregatów w sekundach
+ROLLUP_RESOLUTIONS = (60, 3600, 86400)
+RESOLUTION_NAMES = {'raw': 0, '1m': 60, '1h': 3600, '1d': 86400}
+# Domyślna retencja w sekundach (None = bez limitu); 0 to próbki surowe
+DEFAULT_RETENTION = {
+    0: 35 * 86400,
+    60: 180 * 86400,
+    3600: 5 * 365 * 86400,
+    86400: None,
+}
+# Domyślna liczba punktów wykresu - wg niej wybierana jest rozdzielczość
+DEFAULT_MAX_POINTS = 2000
+# Nominalny odstęp próbek serii bez podanego interwału
+DEFAULT_INTERVAL = 10
+# Dopuszczalny zakres czasu próbek (1970 - koniec roku 9999) - mieści się w INTEGER SQLite
+MIN_TIME = 0
+MAX_TIME = 253402300799
+# Ponawianie partii, której nie udało się zapisać (baza zajęta) - odstęp rośnie do tej wartości
+MAX_RETRY_DELAY = 30.0
+
+# Schemat jest dopisywany (bez przebudowy) - dane nie są odtwarzalne
+TELEMETRY_SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS series (
+        id INTEGER PRIMARY KEY,
+        name TEXT NOT NULL UNIQUE,
+        unit TEXT,
+        interval REAL NOT NULL DEFAULT 10,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )""",
+    """CREATE TABLE IF NOT EXISTS samples (
+        series_id INTEGER NOT NULL,
+        ts INTEGER NOT NULL,
+        value REAL NOT NULL,
+        PRIMARY KEY (series_id, ts)
+    ) WITHOUT ROWID""",
+    """CREATE TABLE IF NOT EXISTS rollups (
+        resolution INTEGER NOT NULL,
+        series_id INTEGER NOT NULL,
+        bucket INTEGER NOT NULL,
+        count INTEGER NOT NULL,
+        sum REAL NOT NULL,
+        min REAL NOT NULL,
+        max REAL NOT NULL,
+        PRIMARY KEY (resolution, series_id, bucket)
+    ) WITHOUT ROWID""",
+    # Trigger nie działa dla pominiętych duplikatów (INSERT OR IGNORE) - agregaty nie liczą ich dwa razy
+    f"""CREATE TRIGGER IF NOT EXISTS samples_rollup AFTER INSERT ON samples BEGIN
+        INSERT INTO rollups (resolution, series_id, bucket, count, sum, min, max) VALUES
+        {', '.join(f"({r}, new.series_id, new.ts - new.ts % {r}, 1, new.value, new.value, new.value)"
+                   for r in ROLLUP_RESOLUTIONS)}
+        ON CONFLICT (resolution, series_id, bucket) DO UPDATE SET
+            count = count + 1,
+            sum = sum + excluded.sum,
+            min = min(min, excluded.min),
+            max = max(max, excluded.max);
+    END""",
+]
+
+def parse_time(value: Union[str, int, float, None]) -> Optional[int]:
+    """Czas unix z liczby lub daty ISO (bez strefy = czas lokalny serwera); ValueError poza MIN_TIME-MAX_TIME"""
+    if value is None or value == '':
+        return None
+    try:
+        if isinstance(value, (int, float)):
+            ts = int(value)
+        else:
+            try:
+                ts = int(float(value))
+            except ValueError:
+                ts = int(datetime.fromisoformat(value.replace('Z', '+00:00')).timestamp())
+    except (ValueError, OverflowError):
+        # OverflowError - nieskończoność; NaN i niepoprawny tekst - ValueError
+        raise ValueError(f"Nieprawidłowy czas: {value}")
+    if not MIN_TIME <= ts <= MAX_TIME:
+        raise ValueError(f"Czas poza zakresem: {value}")
+    return ts
+
+class TelemetryStore:
+    """Zapis próbek w tle (wątek z kolejką, zapis partiami) i zapytania o zakresy.
+
+    record() tylko wrzuca próbki do kolejki, więc można go wołać z pętli asyncio
+    bramki Modbus. Wątek zapisujący co prune_interval usuwa dane starsze niż
+    retencja danej rozdzielczości.
+    """
+
+    def __init__(self, db_path: str = 'telemetry.db', retention: Optional[Dict[int, Optional[int]]] = None,
+                 batch_size: int = 1000, flush_interval: float = 1.0, prune_interval: float = 3600):
+        self.db_path = db_path
+        self.retention = {**DEFAULT_RETENTION, **(retention or {})}
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.prune_interval = prune_interval
+        self.pool = ConnectionPool(db_path, max_size=4, pragmas=STORAGE_PROFILES['wal'])
+        self._series: Dict[str, int] = {}
+        self._queue: queue.Queue = queue.Queue()
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._stats = {
+            'written': 0,
+            'duplicates': 0,
+            'batches': 0,
+            'pruned': 0,
+            'errors': 0,
+            'retries': 0,
+            'rejected': 0,
+            'last_write': None,
+        }
+        self._init_schema()
+
+    def _init_schema(self):
+        conn = self.pool.acquire()
+        try:
+            for statement in TELEMETRY_SCHEMA:
+                conn.execute(statement)
+            conn.commit()
+        finally:
+            conn.close()
+
+    # --- zapis ---
+
+    def start(self):
+        """Uruchom wątek zapisu (ponownie po fork() - wątki nie przechodzą do procesu potomnego)"""
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._queue = queue.Queue()
+            self._thread = threading.Thread(target=self._run, name='telemetry-writer', daemon=True)
+            self._thread.start()
+
+    def record(self, samples: Iterable[Dict[str, Any]]):
+        """Dodaj próbki {'series', 'value', 'ts'?, 'unit'?, 'interval'?} do kolejki zapisu"""
+        self.start()
+        now = int(time.time())
+        for sample in samples:
+            # Czas nadany przy przyjęciu - ponowiony zapis partii nie tworzy drugiej próbki
+            self._queue.put(sample if sample.get('ts') is not None else {**sample, 'ts': now})
+
+    def _collect(self) -> List[Dict[str, Any]]:
+        """Próbki z kolejki: do batch_size lub flush_interval od pierwszej"""
+        batch = []
+        try:
+            batch.append(self._queue.get(timeout=self.flush_interval))
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                batch.append(self._queue.get(timeout=remaining))
+        except queue.Empty:
+            pass
+        return batch
+
+    def _run(self):
+        next_prune = time.monotonic() + 60
+        batch: List[Dict[str, Any]] = []
+        retry_delay = 1.0
+        while True:
+            if not batch:
+                batch = self._collect()
+            if batch:
+                try:
+                    self._write(batch)
+                    batch = []
+                    retry_delay = 1.0
+                except sqlite3.OperationalError as e:
+                    # Baza zajęta - próbki zostały już przyjęte (202), partia nie jest porzucana, tylko ponawiana
+                    self._stats['errors'] += 1
+                    self._stats['retries'] += 1
+                    logger.error(f"❌ Błąd zapisu telemetrii ({len(batch)} próbek, ponowienie za {retry_delay:.0f} s): {e}")
+                    time.sleep(retry_delay)
+                    retry_delay = min(retry_delay * 2, MAX_RETRY_DELAY)
+                    continue
+                except Exception as e:
+                    # Ponowienie nie pomoże - błędne próbki odrzuca już _write, tu tylko nieprzewidziany błąd
+                    self._stats['errors'] += 1
+                    logger.error(f"❌ Błąd zapisu telemetrii, odrzucono {len(batch)} próbek: {e}")
+                    batch = []
+            if time.monotonic() >= next_prune:
+                next_prune = time.monotonic() + self.prune_interval
+                try:
+                    self.prune()
+                except Exception as e:
+                    self._stats['errors'] += 1
+                    logger.error(f"❌ Błąd czyszczenia telemetrii: {e}")
+
+    def _write(self, batch: List[Dict[str, Any]]):
+        """Zapisz partię; błędna próbka nie blokuje pozostałych (zapis pojedynczo, błędne są odrzucane).
+
+        Tylko sqlite3.OperationalError (baza zajęta lub zablokowana) wychodzi na zewnątrz -
+        wtedy _run ponawia całą partię.
+        """
+        try:
+            self.append(batch)
+        except sqlite3.OperationalError:
+            raise
+        except Exception:
+            for sample in batch:
+                try:
+                    self.append([sample])
+                except sqlite3.OperationalError:
+                    raise
+                except Exception as e:
+                    self._stats['rejected'] += 1
+                    logger.warning(f"⚠️ Telemetria: odrzucono próbkę {sample!r}: {e}")
+
+    def _series_id(self, conn, name: str, unit: Optional[str] = None,
+                   interval: Optional[float] = None) -> int:
+        series_id = self._series.get(name)
+        if series_id is not None:
+            return series_id
+        # ON CONFLICT zamiast SELECT + INSERT - serię może równocześnie tworzyć inny proces
+        conn.execute(
+            "INSERT INTO series (name, unit, interval) VALUES (?, ?, ?) ON CONFLICT (name) DO NOTHING",
+            (name, unit, interval or DEFAULT_INTERVAL)
+        )
+        series_id = conn.execute("SELECT id FROM series WHERE name = ?", (name,)).fetchone()['id']
+        self._series[name] = series_id
+        return series_id
+
+    def append(self, samples: List[Dict[str, Any]]) -> int:
+        """Zapisz próbki w jednej transakcji; zwraca liczbę nowych (duplikaty czasu są pomijane)"""
+        now = int(time.time())
+        conn = self.pool.acquire()
+        try:
+            rows = []
+            for sample in samples:
+                series_id = self._series_id(conn, sample['series'], sample.get('unit'), sample.get('interval'))
+                ts = parse_time(sample.get('ts'))
+                rows.append((series_id, now if ts is None else ts, float(sample['value'])))
+            cursor = conn.executemany("INSERT OR IGNORE INTO samples (series_id, ts, value) VALUES (?, ?, ?)", rows)
+            written = cursor.rowcount
+            conn.commit()
+        except Exception:
+            # Wycofana transakcja mogła zawierać nowe serie
+            self._series.clear()
+            raise
+        finally:
+            conn.close()
+        self._stats['written'] += written
+        self._stats['duplicates'] += len(rows) - written
+        self._stats['batches'] += 1
+        self._stats['last_write'] = datetime.now().isoformat(timespec='seconds')
+        return written
+
+    def prune(self) -> int:
+        """Usuń próbki i agregaty starsze niż retencja ich rozdzielczości"""
+        now = int(time.time())
+        removed = 0
+        conn = self.pool.acquire()
+        try:
+            series_ids = [row[0] for row in conn.execute("SELECT id FROM series")]
+            for resolution, keep in self.retention.items():
+                if keep is None:
+                    continue
+                cutoff = now - keep
+                for series_id in series_ids:
+                    # Warunek po kluczu głównym - usuwany jest początek zakresu serii
+                    if resolution == 0:
+                        cursor = conn.execute("DELETE FROM samples WHERE series_id = ? AND ts < ?",
+                                              (series_id, cutoff))
+                    else:
+                        cursor = conn.execute(
+                            "DELETE FROM rollups WHERE resolution = ? AND series_id = ? AND bucket < ?",
+                            (resolution, series_id, cutoff))
+                    removed += cursor.rowcount
+            conn.commit()
+        finally:
+            conn.close()
+        self._stats['pruned'] += removed
+        if removed:
+            logger.info(f"✅ Telemetria: usunięto {removed} wierszy starszych niż retencja")
+        return removed
+
+    # --- odczyt ---
+
+    def get_series(self) -> List[Dict[str, Any]]:
+        """Serie z ostatnią wartością"""
+        conn = self.pool.acquire()
+        try:
+            return [dict(row) for row in conn.execute(
+                """SELECT s.id, s.name, s.unit, s.interval, last.ts AS last_ts, last.value AS last_value
+                FROM series s LEFT JOIN samples last ON last.series_id = s.id AND last.ts = (
+                    SELECT MAX(ts) FROM samples WHERE series_id = s.id)
+                ORDER BY s.name""")]
+        finally:
+            conn.close()
+
+    def choose_resolution(self, interval: float, start: int, end: int, max_points: int) -> int:
+        """Najdrobniejsza rozdzielczość mieszcząca zakres w max_points i objęta retencją"""
+        now = int(time.time())
+        for resolution in (0,) + ROLLUP_RESOLUTIONS:
+            step = resolution or interval
+            keep = self.retention.get(resolution)
+            if (end - start) / step <= max_points and (keep is None or start >= now - keep):
+                return resolution
+        return ROLLUP_RESOLUTIONS[-1]
+
+    def query(self, name: str, start: Optional[int] = None, end: Optional[int] = None,
+              resolution: str = 'auto', max_points: int = DEFAULT_MAX_POINTS) -> Optional[Dict[str, Any]]:
+        """Punkty serii w zakresie [start, end) - {'t', 'avg', 'min', 'max', 'count'}.
+
+        Domyślnie ostatnia doba. None gdy seria nie istnieje.
+        """
+        end = int(time.time()) + 1 if end is None else end
+        start = end - 86400 if start is None else start
+        if resolution != 'auto' and resolution not in RESOLUTION_NAMES:
+            raise ValueError(f"Nieznana rozdzielczość: {resolution}")
+
+        conn = self.pool.acquire()
+        try:
+            series = conn.execute("SELECT * FROM series WHERE name = ?", (name,)).fetchone()
+            if series is None:
+                return None
+            if resolution == 'auto':
+                step = self.choose_resolution(series['interval'], start, end, max_points)
+            else:
+                step = RESOLUTION_NAMES[resolution]
+
+            if step == 0:
+                rows = conn.execute(
+                    """SELECT ts AS t, value AS avg, value AS min, value AS max, 1 AS count
+                    FROM samples WHERE series_id = ? AND ts >= ? AND ts < ? ORDER BY ts""",
+                    (series['id'], start, end)).fetchall()
+            else:
+                rows = conn.execute(
+                    """SELECT bucket AS t, sum / count AS avg, min, max, count
+                    FROM rollups WHERE resolution = ? AND series_id = ? AND bucket >= ? AND bucket < ?
+                    ORDER BY bucket""",
+                    (step, series['id'], start - start % step, end)).fetchall()
+        finally:
+            conn.close()
+
+        return {
+            'series': series['name'],
+            'unit': series['unit'],
+            'resolution': next(key for key, value in RESOLUTION_NAMES.items() if value == step),
+            'from': start,
+            'to': end,
+            'points': rows,
+        }
+
+    def get_rows(self, name: str, start: int, end: int,
+                 resolution: int = 0) -> Tuple[Optional[sqlite3.Row], List[tuple]]:
+        """Seria i jej wiersze jako krotki do obliczeń kolumnowych (analytics).
+
+        Surowe: (ts, value); agregaty: (bucket, count, sum, min, max).
+        """
+        conn = self.pool.acquire()
+        try:
+            series = conn.execute("SELECT * FROM series WHERE name = ?", (name,)).fetchone()
+            if series is None:
+                return None, []
+            cursor = conn.cursor()
+            cursor.row_factory = None
+            if resolution == 0:
+                cursor.execute("SELECT ts, value FROM samples WHERE series_id = ? AND ts >= ? AND ts < ? ORDER BY ts",
+                               (series['id'], start, end))
+            else:
+                cursor.execute(
+                    """SELECT bucket, count, sum, min, max FROM rollups
+                    WHERE resolution = ? AND series_id = ? AND bucket >= ? AND bucket < ? ORDER BY bucket""",
+                    (resolution, series['id'], start - start % resolution, end))
+            return series, cursor.fetchall()
+        finally:
+            conn.close()
+
+    def stats(self) -> Dict[str, Any]:
+        stats = dict(self._stats)
+        conn = self.pool.acquire()
+        try:
+            stats['series'] = conn.execute("SELECT COUNT(*) FROM series").fetchone()[0]
+        finally:
+            conn.close()
+        stats['pending'] = self._queue.qsize()
+        stats['running'] = self._thread is not None and self._thread.is_alive()
+        stats['retention_days'] = {name: (self.retention[value] / 86400 if self.retention[value] else None)
+                                   for name, value in RESOLUTION_NAMES.items()}
+        return stats
@@ -0,0 +1,6 @@
+"""Testy uruchamiane w katalogu tymczasowym: import database tworzy globalną instancję
+DashboardDB() w bieżącym katalogu - nie może zmieniać dashboard.db z repozytorium."""
+import os
+import tempfile
+
+os.chdir(tempfile.mkdtemp(prefix='dashboard-tests-'))
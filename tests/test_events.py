@@ -0,0 +1,48 @@
+"""Odtwarzanie zaległych zdarzeń SSE od Last-Event-ID (porcjami, reset po retencji)"""
+import os
+import sys
+from itertools import islice
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import DashboardDB
+from events import EventBroker, NOTE_REMINDER
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = DashboardDB(str(tmp_path / 'dashboard.db'), checkpoint_interval=0)
+    yield db
+    db.close()
+
+
+def replayed_ids(broker, last_event_id, count):
+    stream = broker.stream(last_event_id, heartbeat=0.05)
+    try:
+        frames = [frame for frame in islice(stream, count + 1) if frame.startswith('id: ')]
+    finally:
+        stream.close()
+    return [(int(frame.split('\n')[0][4:]), frame.split('\n')[1][7:]) for frame in frames]
+
+
+def test_replay_pages_past_limit(db):
+    first = db.get_last_event_id()
+    published = [db.publish_event(NOTE_REMINDER, i) for i in range(10)]
+    broker = EventBroker(db, replay_limit=3)
+    events = replayed_ids(broker, first, len(published))
+    assert [event_id for event_id, _ in events] == published
+
+
+def test_reset_when_events_pruned(db):
+    published = [db.publish_event(NOTE_REMINDER, i) for i in range(3)]
+    conn = db.get_connection()
+    try:
+        conn.execute("DELETE FROM events WHERE id <= ?", (published[1],))
+        conn.commit()
+    finally:
+        conn.close()
+    broker = EventBroker(db)
+    events = replayed_ids(broker, published[0] - 1, 2)
+    assert events == [(published[1], 'reset'), (published[2], NOTE_REMINDER)]
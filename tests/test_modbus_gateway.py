@@ -0,0 +1,185 @@
+"""Bramka Modbus RTU na symulatorze (ws:// i tcp://): CRC, łączenie ramek, timeouty, reconnect"""
+import os
+import sys
+import time
+import struct
+import asyncio
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modbus_gateway import ModbusGateway, ModbusSimulator, ModbusError, ModbusTimeout, with_crc
+
+
+class CorruptSimulator(ModbusSimulator):
+    """Slave odpowiadający ramką z uszkodzonym CRC"""
+
+    def handle(self, frame):
+        response = super().handle(frame)
+        return response[:-1] + bytes([response[-1] ^ 0xFF]) if response else response
+
+
+def read_frame(slave, address, count=1):
+    return with_crc(struct.pack('>BBHH', slave, 3, address, count))
+
+
+@pytest.fixture(scope='module')
+def loop():
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    yield loop
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join(timeout=5)
+
+
+@pytest.fixture(params=['ws', 'tcp'])
+def scheme(request):
+    return request.param
+
+
+def start_simulator(loop, simulator, port=0):
+    return asyncio.run_coroutine_threadsafe(simulator.start(port=port), loop).result(timeout=5)
+
+
+def stop_simulator(loop, simulator):
+    asyncio.run_coroutine_threadsafe(simulator.close(), loop).result(timeout=5)
+
+
+@pytest.fixture
+def simulator(loop):
+    simulator = ModbusSimulator(slave_ids=(1,))
+    simulator.registers[1].update({0: 111, 5: 555})
+    simulator.port = start_simulator(loop, simulator)
+    yield simulator
+    stop_simulator(loop, simulator)
+
+
+def make_gateway(scheme, port, **kwargs):
+    return ModbusGateway({'default': f'{scheme}://127.0.0.1:{port}'}, frame_gap=0.0, **kwargs)
+
+
+def bus_stats(gateway):
+    return gateway.stats()['buses']['default']
+
+
+def test_read_registers(simulator, scheme):
+    gateway = make_gateway(scheme, simulator.port, timeout=0.5)
+    result = gateway.request(read_frame(1, 5))
+    assert result['response'] == '010302022BF93B'
+    assert result['exception'] is None
+    # Wynik wskazuje zdarzenie strumienia z tą samą odpowiedzią
+    event = next(e for e in gateway.history if e['id'] == result['event_id'])
+    assert (event['type'], event['response']) == ('response', result['response'])
+
+
+def test_bad_crc_rejected(loop, scheme):
+    simulator = CorruptSimulator(slave_ids=(1,))
+    port = start_simulator(loop, simulator)
+    try:
+        gateway = make_gateway(scheme, port, timeout=0.5)
+        with pytest.raises(ModbusError, match='CRC'):
+            gateway.request(read_frame(1, 0))
+        assert bus_stats(gateway)['crc_errors'] == 1
+    finally:
+        stop_simulator(loop, simulator)
+
+
+def test_duplicate_frames_coalesced(simulator, scheme):
+    simulator.delay = 0.2
+    gateway = make_gateway(scheme, simulator.port, timeout=1.0)
+    frame = read_frame(1, 5)
+    gateway.request(frame)  # połączenie nawiązane przed pomiarem
+    requests_before = simulator.requests
+
+    async def burst():
+        return await asyncio.gather(*(gateway.submit(frame) for _ in range(5)))
+
+    results = asyncio.run_coroutine_threadsafe(burst(), gateway.loop).result(timeout=5)
+    assert {result['response'] for result in results} == {'010302022BF93B'}
+    assert simulator.requests - requests_before == 1
+    assert bus_stats(gateway)['coalesced'] == 4
+
+
+def test_timeout_for_missing_slave(simulator, scheme):
+    gateway = make_gateway(scheme, simulator.port, timeout=0.3)
+    with pytest.raises(ModbusTimeout):
+        gateway.request(read_frame(7, 0))
+    assert bus_stats(gateway)['timeouts'] == 1
+    # Magistrala działa dalej
+    assert gateway.request(read_frame(1, 0))['response'] == '010302006FF868'
+
+
+def test_late_reply_not_returned_for_next_request(simulator, scheme):
+    simulator.delay = 0.8
+    gateway = make_gateway(scheme, simulator.port, timeout=0.5)
+    with pytest.raises(ModbusTimeout):
+        gateway.request(read_frame(1, 0))
+    simulator.delay = 0.0
+    # Spóźniona odpowiedź z rejestru 0 (111) nie może zostać odpowiedzią na odczyt rejestru 5
+    assert gateway.request(read_frame(1, 5))['response'] == '010302022BF93B'
+    assert bus_stats(gateway)['stale'] >= 1
+
+
+def test_reply_must_match_request(simulator, scheme):
+    gateway = make_gateway(scheme, simulator.port, timeout=0.5)
+    original = simulator.handle
+    # Slave odpowiada na odczyt 2 rejestrów danymi tylko jednego
+    simulator.handle = lambda frame: original(read_frame(1, 0, 1))
+    try:
+        with pytest.raises(ModbusTimeout):
+            gateway.request(read_frame(1, 0, 2))
+    finally:
+        simulator.handle = original
+    assert bus_stats(gateway)['stale'] >= 1
+
+
+def test_reconnect_after_controller_restart(loop, simulator, scheme):
+    gateway = make_gateway(scheme, simulator.port, timeout=0.5)
+    assert gateway.request(read_frame(1, 0))['response'] == '010302006FF868'
+    stop_simulator(loop, simulator)
+    start_simulator(loop, simulator, simulator.port)
+    time.sleep(0.2)
+    assert gateway.request(read_frame(1, 5))['response'] == '010302022BF93B'
+    assert bus_stats(gateway)['reconnects'] == 2
+
+
+def test_request_wait_covers_slow_bus(simulator):
+    gateway = make_gateway('tcp', simulator.port, timeout=0.1, queue_timeout=0.1)
+    # Drain po timeoucie i połączenie trwają dłużej niż sam timeout odpowiedzi
+    assert gateway.request_timeout >= gateway.queue_timeout + 5 * gateway.timeout
+
+    async def hang(frame, bus='default'):
+        await asyncio.sleep(60)
+
+    gateway.submit = hang
+    with pytest.raises(ModbusTimeout):
+        gateway.request(read_frame(1, 0))
+
+
+def wait_for(condition, timeout=3.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.05)
+    return condition()
+
+
+def test_second_worker_forwards_to_leader(simulator, tmp_path):
+    lock_path = str(tmp_path / 'modbus_gateway.lock')
+    leader = make_gateway('tcp', simulator.port, timeout=0.5, lock_path=lock_path)
+    worker = make_gateway('tcp', simulator.port, timeout=0.5, lock_path=lock_path)
+    assert leader.request(read_frame(1, 0))['response'] == '010302006FF868'
+    assert worker.request(read_frame(1, 5))['response'] == '010302022BF93B'
+    assert leader.leader and not worker.leader
+    # Jedno połączenie z kontrolerem dla obu workerów
+    assert simulator.max_connections == 1
+    # Błędy lidera docierają jako te same wyjątki
+    with pytest.raises(ModbusTimeout) as error:
+        worker.request(read_frame(7, 0))
+    assert error.value.event_id is not None
+    # Ruch lidera trafia do historii (i strumieni) drugiego workera
+    assert wait_for(lambda: any(e['type'] == 'response' and e['request'] == read_frame(1, 5).hex().upper()
+                                for e in worker.history))
+    assert worker.stats()['buses']['default']['responses'] == 2
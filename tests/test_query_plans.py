@@ -0,0 +1,45 @@
+"""Plany zapytań faktycznie wykonywanych przez DashboardDB (przechwycone set_trace_callback)"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import DashboardDB, QUERY_PLAN_CALLS
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = DashboardDB(str(tmp_path / 'dashboard.db'), checkpoint_interval=0)
+    yield db
+    db.close()
+
+
+def test_query_plans_use_indexes(db):
+    report = db.check_query_plans()
+    failing = [f"{entry['query']}: {entry.get('error') or entry['plan']}" for entry in report if not entry['ok']]
+    assert not failing, '\n'.join(failing)
+
+
+def test_every_call_is_explained(db):
+    explained = {entry['query'] for entry in db.check_query_plans() if entry['sql']}
+    missing = [name for name, _, _, _ in QUERY_PLAN_CALLS if name not in explained]
+    assert not missing
+
+
+def test_combined_filters_are_checked(db):
+    queries = {entry['query']: entry['sql'] for entry in db.check_query_plans()}
+    sql = queries['get_alerts(unread_only, priority, cursor)']
+    assert 'is_read = FALSE' in sql and 'priority = 1' in sql and '(created_at, id) <' in sql
+
+
+def test_index_scan_is_reported(db):
+    conn = db.get_connection()
+    try:
+        conn.execute("DROP INDEX idx_alerts_priority")
+    finally:
+        conn.close()
+    entries = [entry for entry in db.check_query_plans() if entry['query'] == 'get_alerts(priority)']
+    assert entries and not entries[0]['ok']
+    assert entries[0]['index_scan'] or entries[0]['full_scan']
@@ -0,0 +1,221 @@
+# thumbnails.py
+"""Miniatury obrazów z katalogu FILES dla galerii.
+
+Miniatury są generowane na żądanie w puli procesów (dekodowanie i skalowanie
+nie blokuje wątków serwera) i zapisywane w cache na dysku. Nazwa pliku w cache
+to hash ścieżki, mtime i rozmiaru oryginału oraz parametrów miniatury - zmiana
+oryginału daje nowy klucz, a nieużywane wpisy są usuwane wg LRU (mtime pliku
+w cache = ostatnie użycie) po przekroczeniu limitu miejsca.
+"""
+import os
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, Future
+from typing import Dict, Optional, Any
+import logging
+
+try:
+    from PIL import Image, ImageOps, features
+except ImportError:  # Pillow jest opcjonalny - bez niego serwowane są oryginały
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+THUMBNAIL_DIRECTORY = 'cache/thumbnails'
+THUMBNAIL_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.gif', '.bmp', '.webp'}
+# Zmiana sposobu generowania miniatur unieważnia cały cache
+THUMBNAIL_VERSION = 1
+# Użycie wpisu jest zapisywane na dysku (utime) najwyżej raz na tyle sekund
+TOUCH_INTERVAL = 3600
+
+def _render(source: str, target: str, max_size: int, image_format: str, quality: int) -> int:
+    """Wygeneruj miniaturę (wykonywane w procesie puli); zwraca rozmiar pliku"""
+    with Image.open(source) as image:
+        # JPEG dekodowany od razu w zmniejszonej skali (1/2, 1/4, 1/8)
+        image.draft('RGB', (max_size, max_size))
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((max_size, max_size), Image.LANCZOS)
+        if image.mode not in ('RGB', 'RGBA'):
+            has_alpha = image.mode in ('LA', 'PA') or 'transparency' in image.info
+            image = image.convert('RGBA' if has_alpha else 'RGB')
+        if image_format == 'JPEG' and image.mode == 'RGBA':
+            image = image.convert('RGB')
+
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        temp_path = f"{target}.{os.getpid()}.tmp"
+        try:
+            image.save(temp_path, image_format, quality=quality)
+            os.replace(temp_path, target)
+        except Exception:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+    return os.path.getsize(target)
+
+class ThumbnailService:
+    """Cache miniatur na dysku z generowaniem w puli procesów.
+
+    Równoczesne żądania tej samej miniatury czekają na jedno zadanie w puli.
+    Indeks LRU jest budowany ze skanu katalogu cache przy pierwszym użyciu;
+    przy kilku workerach każdy egzekwuje limit wg własnego widoku cache.
+    """
+
+    def __init__(self, root: str = THUMBNAIL_DIRECTORY, max_size: int = 320, quality: int = 80,
+                 max_bytes: int = 256 * 1024 * 1024, workers: Optional[int] = None, timeout: float = 30):
+        self.root = root
+        self.max_size = max_size
+        self.quality = quality
+        self.max_bytes = max_bytes
+        self.workers = workers or min(4, os.cpu_count() or 1)
+        self.timeout = timeout
+        if Image is not None and features.check('webp'):
+            self.format, self.extension, self.mimetype = 'WEBP', '.webp', 'image/webp'
+        else:
+            self.format, self.extension, self.mimetype = 'JPEG', '.jpg', 'image/jpeg'
+        self._entries: 'OrderedDict[str, int]' = OrderedDict()
+        self._bytes = 0
+        self._loaded = False
+        self._pending: Dict[str, Future] = {}
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._stats = {
+            'hits': 0,
+            'generated': 0,
+            'errors': 0,
+            'evicted': 0,
+        }
+
+    @property
+    def available(self) -> bool:
+        return Image is not None
+
+    def key(self, path: str, stat: os.stat_result) -> str:
+        """Klucz miniatury (także ETag) - zależy tylko od metadanych oryginału"""
+        source = (f"{os.path.abspath(path)}\0{stat.st_mtime_ns}\0{stat.st_size}\0"
+                  f"{self.max_size}\0{self.quality}\0{self.format}\0{THUMBNAIL_VERSION}")
+        return hashlib.sha256(source.encode('utf-8', 'surrogateescape')).hexdigest()[:32]
+
+    def _path_for(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], key + self.extension)
+
+    def _load(self):
+        """Odtwórz kolejność LRU z czasów modyfikacji plików w cache"""
+        found = []
+        for dirpath, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                if filename.endswith('.tmp'):
+                    # Pozostałość po przerwanym generowaniu
+                    if time.time() - stat.st_mtime > TOUCH_INTERVAL:
+                        self._remove(path)
+                    continue
+                key, extension = os.path.splitext(filename)
+                if extension == self.extension:
+                    found.append((stat.st_mtime, key, stat.st_size))
+        found.sort()
+        for _, key, size in found:
+            self._entries[key] = size
+            self._bytes += size
+        self._loaded = True
+        logger.info(f"✅ Cache miniatur: {len(found)} plików, {self._bytes // 1024} KB")
+
+    def _ensure_executor(self) -> ProcessPoolExecutor:
+        # Pula po fork() workera należy do rodzica - tworzymy nową
+        if self._executor is None or self._pid != os.getpid():
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            self._pid = os.getpid()
+            self._pending = {}
+        return self._executor
+
+    @staticmethod
+    def _remove(path: str):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def _add(self, key: str, size: int):
+        self._bytes -= self._entries.pop(key, 0)
+        self._entries[key] = size
+        self._bytes += size
+        while self._bytes > self.max_bytes and len(self._entries) > 1:
+            old_key, old_size = self._entries.popitem(last=False)
+            self._bytes -= old_size
+            self._remove(self._path_for(old_key))
+            self._stats['evicted'] += 1
+
+    def _lookup(self, key: str, target: str, now: float) -> bool:
+        """Trafienie w cache (wołane pod blokadą); odświeża pozycję LRU"""
+        try:
+            stat = os.stat(target)
+        except FileNotFoundError:
+            # Usunięty przez inny proces
+            self._bytes -= self._entries.pop(key, 0)
+            return False
+        if now - stat.st_mtime > TOUCH_INTERVAL:
+            try:
+                os.utime(target)
+            except OSError:
+                pass
+        if key in self._entries:
+            self._entries.move_to_end(key)
+        else:
+            # Wygenerowany przez inny worker
+            self._add(key, stat.st_size)
+        self._stats['hits'] += 1
+        return True
+
+    def get(self, path: str, stat: os.stat_result) -> Optional[str]:
+        """Ścieżka pliku miniatury (generowanej w razie potrzeby); None przy błędzie"""
+        if Image is None:
+            return None
+        key = self.key(path, stat)
+        target = self._path_for(key)
+        now = time.time()
+        with self._lock:
+            if not self._loaded:
+                self._load()
+            if self._lookup(key, target, now):
+                return target
+            executor = self._ensure_executor()
+            future = self._pending.get(key)
+            if future is None:
+                future = executor.submit(_render, path, target, self.max_size, self.format, self.quality)
+                self._pending[key] = future
+
+        try:
+            size = future.result(timeout=self.timeout)
+        except Exception as e:
+            self._stats['errors'] += 1
+            logger.error(f"❌ Błąd generowania miniatury {path}: {e}")
+            return None
+        finally:
+            with self._lock:
+                if self._pending.get(key) is future:
+                    del self._pending[key]
+
+        with self._lock:
+            if key not in self._entries:
+                self._add(key, size)
+                self._stats['generated'] += 1
+        return target
+
+    def stats(self) -> Dict[str, Any]:
+        stats = dict(self._stats)
+        stats.update({
+            'available': self.available,
+            'format': self.format if self.available else None,
+            'entries': len(self._entries),
+            'bytes': self._bytes,
+            'max_bytes': self.max_bytes,
+            'pending': len(self._pending),
+            'workers': self.workers,
+        })
+        return stats
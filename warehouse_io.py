@@ -0,0 +1,283 @@
+# warehouse_io.py
+import io
+import csv
+import json
+import sqlite3
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Any
+import logging
+
+logger = logging.getLogger(__name__)
+
+IMPORT_FORMATS = ('csv', 'ndjson', 'json')
+EXPORT_FORMATS = ('csv', 'ndjson', 'json')
+EXPORT_COLUMNS = ('id', 'name', 'code', 'quantity', 'note', 'created_at', 'updated_at')
+
+# Maksymalna liczba błędów zwracanych szczegółowo (reszta jest tylko liczona)
+MAX_REPORTED_ERRORS = 1000
+
+# Wiersz wejściowy: (numer wiersza, dane lub None, komunikat błędu lub None)
+ParsedRow = Tuple[int, Optional[Dict[str, Any]], Optional[str]]
+
+def validate_item(raw: Any) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+    """Sprawdź i znormalizuj jeden element magazynu"""
+    if not isinstance(raw, dict):
+        return None, 'Row must be an object'
+
+    name = str(raw.get('name') or '').strip()
+    code = str(raw.get('code') or '').strip()
+    if not name:
+        return None, 'Name is required'
+    if not code:
+        return None, 'Code is required'
+    if len(name) > 255:
+        return None, 'Name too long (max 255 characters)'
+
+    quantity = raw.get('quantity')
+    if quantity in (None, ''):
+        quantity = 0
+    try:
+        quantity = int(quantity)
+    except (ValueError, TypeError):
+        return None, 'Quantity must be a number'
+    if quantity < 0:
+        return None, 'Quantity cannot be negative'
+
+    return {
+        'name': name,
+        'code': code,
+        'quantity': quantity,
+        'note': str(raw.get('note') or '')
+    }, None
+
+def _validated(rows: Iterable[Tuple[int, Any]]) -> Iterator[ParsedRow]:
+    for line_no, raw in rows:
+        item, error = validate_item(raw)
+        yield line_no, item, error
+
+def parse_csv(stream: io.BufferedIOBase, encoding: str = 'utf-8-sig') -> Iterator[ParsedRow]:
+    """Parsuj CSV z nagłówkiem (name,code,quantity,note) wiersz po wierszu"""
+    text = io.TextIOWrapper(stream, encoding=encoding, newline='')
+    sample = text.read(4096)
+    try:
+        dialect = csv.Sniffer().sniff(sample, delimiters=',;\t')
+    except csv.Error:
+        dialect = csv.excel
+    reader = csv.DictReader(_chain_sample(sample, text), dialect=dialect)
+    # Numer wiersza w pliku (nagłówek to wiersz 1)
+    yield from _validated((reader.line_num, row) for row in reader)
+
+def _chain_sample(sample: str, text: io.TextIOBase) -> Iterator[str]:
+    """Odtwórz strumień linii po odczytaniu próbki do wykrycia separatora"""
+    rest = io.StringIO(sample + text.readline())
+    for line in rest:
+        yield line
+    for line in text:
+        yield line
+
+def parse_ndjson(stream: io.BufferedIOBase) -> Iterator[ParsedRow]:
+    """Parsuj NDJSON - jeden obiekt JSON w każdej linii"""
+    for line_no, line in enumerate(io.TextIOWrapper(stream, encoding='utf-8'), start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            raw = json.loads(line)
+        except ValueError as e:
+            yield line_no, None, f'Invalid JSON: {e}'
+            continue
+        item, error = validate_item(raw)
+        yield line_no, item, error
+
+def parse_json_array(stream: io.BufferedIOBase, chunk_size: int = 64 * 1024) -> Iterator[ParsedRow]:
+    """Parsuj tablicę JSON przyrostowo - w pamięci trzymany jest tylko bieżący fragment"""
+    decoder = json.JSONDecoder()
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig')
+    buffer = ''
+    position = 0
+    index = 0
+    started = False
+    finished = False
+    eof = False
+
+    while not finished:
+        if not eof and len(buffer) - position < chunk_size:
+            chunk = text.read(chunk_size)
+            if chunk:
+                buffer = buffer[position:] + chunk
+                position = 0
+            else:
+                eof = True
+
+        # Pomiń białe znaki i separatory między elementami
+        while position < len(buffer) and buffer[position] in ' \t\r\n,':
+            position += 1
+        if position >= len(buffer):
+            if eof:
+                if not started:
+                    yield 0, None, 'Expected a JSON array'
+                elif not finished:
+                    yield index, None, 'Unexpected end of JSON array'
+                return
+            continue
+
+        if not started:
+            if buffer[position] != '[':
+                yield 0, None, 'Expected a JSON array'
+                return
+            started = True
+            position += 1
+            continue
+
+        if buffer[position] == ']':
+            finished = True
+            break
+
+        try:
+            raw, end = decoder.raw_decode(buffer, position)
+        except ValueError as e:
+            if not eof:
+                # Element przecięty granicą fragmentu - doczytaj więcej
+                chunk = text.read(chunk_size)
+                if chunk:
+                    buffer = buffer[position:] + chunk
+                    position = 0
+                    continue
+                eof = True
+            yield index + 1, None, f'Invalid JSON: {e}'
+            return
+
+        index += 1
+        position = end
+        item, error = validate_item(raw)
+        yield index, item, error
+
+PARSERS = {
+    'csv': parse_csv,
+    'ndjson': parse_ndjson,
+    'json': parse_json_array,
+}
+
+def detect_format(content_type: Optional[str], filename: Optional[str] = None) -> Optional[str]:
+    """Ustal format importu na podstawie Content-Type lub rozszerzenia pliku"""
+    content_type = (content_type or '').split(';')[0].strip().lower()
+    if content_type in ('text/csv', 'application/csv'):
+        return 'csv'
+    if content_type in ('application/x-ndjson', 'application/ndjson', 'application/jsonl'):
+        return 'ndjson'
+    if content_type == 'application/json':
+        return 'json'
+    if filename:
+        extension = filename.rsplit('.', 1)[-1].lower()
+        if extension in ('jsonl', 'ndjson'):
+            return 'ndjson'
+        if extension in IMPORT_FORMATS:
+            return extension
+    return None
+
+def import_items(db, rows: Iterable[ParsedRow], batch_size: int = 1000) -> Iterator[Dict[str, Any]]:
+    """Zapisz poprawne wiersze partiami; po każdej partii zwraca raport postępu.
+
+    Ostatni zwrócony słownik ma type='summary' i zawiera listę błędów wierszy.
+    """
+    report = {
+        'type': 'progress',
+        'processed': 0,
+        'inserted': 0,
+        'updated': 0,
+        'failed': 0,
+        'batches': 0,
+    }
+    errors: List[Dict[str, Any]] = []
+    batch: List[Tuple[int, Dict[str, Any]]] = []
+
+    def record_error(line_no: int, error: str):
+        report['failed'] += 1
+        if len(errors) < MAX_REPORTED_ERRORS:
+            errors.append({'line': line_no, 'error': error})
+
+    def save_rows():
+        """Partia odrzucona przez bazę - zapis wiersz po wierszu, by wskazać błędne linie"""
+        fatal = None
+        for line_no, item in batch:
+            if fatal is not None:
+                record_error(line_no, fatal)
+                continue
+            try:
+                inserted, updated = db.upsert_warehouse_items([item])
+            except sqlite3.OperationalError as e:
+                # Baza zablokowana lub niedostępna - nie zależy od wiersza, reszty partii nie ponawiamy
+                fatal = str(e)
+                record_error(line_no, fatal)
+                continue
+            except Exception as e:
+                record_error(line_no, str(e))
+                continue
+            report['inserted'] += inserted
+            report['updated'] += updated
+
+    def flush():
+        try:
+            inserted, updated = db.upsert_warehouse_items([item for _, item in batch])
+            report['inserted'] += inserted
+            report['updated'] += updated
+        except Exception as e:
+            logger.warning(f"⚠️ Import magazynu: partia odrzucona ({e}), zapis wiersz po wierszu")
+            save_rows()
+        report['batches'] += 1
+        batch.clear()
+
+    for line_no, item, error in rows:
+        report['processed'] += 1
+        if error is not None:
+            record_error(line_no, error)
+            continue
+        batch.append((line_no, item))
+        if len(batch) >= batch_size:
+            flush()
+            yield dict(report)
+
+    if batch:
+        flush()
+
+    summary = dict(report)
+    summary['type'] = 'summary'
+    summary['errors'] = errors
+    summary['errors_truncated'] = report['failed'] > len(errors)
+    logger.info(f"✅ Import magazynu: {summary['inserted']} nowych, {summary['updated']} zaktualizowanych, "
+                f"{summary['failed']} błędnych")
+    yield summary
+
+def export_items(rows: Iterable[Dict[str, Any]], fmt: str, chunk_rows: int = 500) -> Iterator[str]:
+    """Koduj wiersze magazynu do CSV/NDJSON/JSON fragmentami (bez budowania całości w pamięci)"""
+    if fmt == 'csv':
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(EXPORT_COLUMNS)
+        count = 0
+        for row in rows:
+            writer.writerow([row.get(column) for column in EXPORT_COLUMNS])
+            count += 1
+            if count % chunk_rows == 0:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue()
+        return
+
+    parts = []
+    first = True
+    if fmt == 'json':
+        parts.append('[')
+    for row in rows:
+        encoded = json.dumps({column: row.get(column) for column in EXPORT_COLUMNS}, ensure_ascii=False)
+        if fmt == 'json':
+            parts.append(encoded if first else ',' + encoded)
+        else:
+            parts.append(encoded + '\n')
+        first = False
+        if len(parts) >= chunk_rows:
+            yield ''.join(parts)
+            parts.clear()
+    if fmt == 'json':
+        parts.append(']')
+    yield ''.join(parts)